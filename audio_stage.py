@@ -0,0 +1,107 @@
+import os
+import hashlib
+import subprocess
+
+import numpy as np
+
+from frame_cache import evict_least_recently_used
+from frame_engine import discard_partial_output, get_ffmpeg_binary, muxer_for, partial_output_path
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# Fade lengths in seconds, shortened for very short slideshows
+FADE_IN_SECONDS = 0.5
+FADE_OUT_SECONDS = 1.5
+
+AUDIO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+class AudioStage:
+    """
+    Prepares background music once instead of once per slideshow.
+
+    A music file is decoded to 16-bit PCM a single time and cached on disk by content
+    hash. For each slideshow duration the PCM is cut (or looped, for short tracks) to
+    length, faded in and out, and encoded to AAC; those tracks are cached too, so the
+    render only has to stream-copy the audio into the video.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._hashes = {}
+        self._pcm = {}
+
+    def _track_hash(self, music_path):
+        stat = os.stat(music_path)
+        memo_key = (os.path.abspath(music_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._hashes:
+            self._hashes[memo_key] = hash_file(music_path)
+        return self._hashes[memo_key]
+
+    def _decoded_pcm(self, music_path, track_hash):
+        """Returns the track as an int16 array of shape (samples, CHANNELS), decoding it only if not cached."""
+        if track_hash in self._pcm:
+            return self._pcm[track_hash]
+        pcm_path = os.path.join(self.cache_dir, track_hash + ".npy")
+        try:
+            pcm = np.load(pcm_path)
+            os.utime(pcm_path)
+        except (OSError, ValueError):
+            command = [get_ffmpeg_binary(), "-loglevel", "error", "-i", music_path, "-vn",
+                       "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "-"]
+            result = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True)
+            if result.returncode != 0:
+                raise IOError(f"ffmpeg could not decode {music_path}: {result.stderr.decode(errors='replace').strip()}")
+            pcm = np.frombuffer(result.stdout, dtype=np.int16).reshape(-1, CHANNELS)
+            temp_path = f"{pcm_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, pcm)
+            os.replace(temp_path, pcm_path)
+        self._pcm[track_hash] = pcm
+        return pcm
+
+    def prepare(self, music_path, duration):
+        """Returns the path of an AAC track of exactly duration seconds made from music_path."""
+        track_hash = self._track_hash(music_path)
+        track_path = os.path.join(self.cache_dir, f"{track_hash}_{int(round(duration * 1000))}ms.m4a")
+        if os.path.exists(track_path):
+            os.utime(track_path)
+            return track_path
+
+        pcm = self._decoded_pcm(music_path, track_hash)
+        sample_count = int(round(duration * SAMPLE_RATE))
+        if len(pcm) == 0:
+            samples = np.zeros((sample_count, CHANNELS), dtype=np.float32)
+        else:
+            # np.resize repeats the track from the start when it is shorter than the slideshow
+            samples = np.resize(pcm, (sample_count, CHANNELS)).astype(np.float32)
+
+        fade_in = min(int(FADE_IN_SECONDS * SAMPLE_RATE), sample_count // 4)
+        fade_out = min(int(FADE_OUT_SECONDS * SAMPLE_RATE), sample_count // 4)
+        if fade_in:
+            samples[:fade_in] *= np.linspace(0.0, 1.0, fade_in, dtype=np.float32)[:, None]
+        if fade_out:
+            samples[-fade_out:] *= np.linspace(1.0, 0.0, fade_out, dtype=np.float32)[:, None]
+
+        # Not ending in .m4a, so eviction in another process never deletes it while it is written
+        temp_path = partial_output_path(track_path)
+        command = [get_ffmpeg_binary(), "-y", "-loglevel", "error",
+                   "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "-",
+                   "-c:a", "aac", "-f", muxer_for(track_path), temp_path]
+        result = subprocess.run(command, input=samples.astype(np.int16).tobytes(), capture_output=True)
+        if result.returncode != 0:
+            discard_partial_output(temp_path)
+            raise IOError(f"ffmpeg could not encode {track_path}: {result.stderr.decode(errors='replace').strip()}")
+        os.replace(temp_path, track_path)
+
+        evict_least_recently_used(self.cache_dir, ".m4a", AUDIO_CACHE_MAX_BYTES / 2)
+        evict_least_recently_used(self.cache_dir, ".npy", AUDIO_CACHE_MAX_BYTES / 2)
+        return track_path
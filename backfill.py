@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import datetime
+
+from pipeline_stats import PipelineStats
+
+# Journal statuses of jobs that do not need to run again when an interrupted backfill is resumed.
+# Every other job is checked again, so that the manifests decide whether its slideshow is stale.
+FINISHED_STATUSES = ("rendered",)
+
+def plan_backfill(start_date, end_date, years_back):
+    """Returns every (day, year_offset) job from start_date to end_date inclusive, in date order."""
+    jobs = []
+    day = start_date
+    while day <= end_date:
+        jobs.extend((day, year_offset) for year_offset in years_back)
+        day += datetime.timedelta(days=1)
+    return jobs
+
+class BackfillJournal:
+    """
+    Append-only record of the jobs of one backfill, one JSON line per finished job.
+
+    Every line is flushed to disk as soon as its job ends, so a backfill that is
+    interrupted resumes after the last job it finished. A line cut short by the
+    interruption is ignored and its job runs again.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.statuses = {}
+        os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        if os.path.exists(journal_path):
+            with open(journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.statuses[(entry["date"], entry["year_offset"])] = entry["status"]
+
+    def is_finished(self, day, year_offset):
+        return self.statuses.get((day.isoformat(), year_offset)) in FINISHED_STATUSES
+
+    def record(self, day, year_offset, status, seconds=None):
+        entry = {"date": day.isoformat(), "year_offset": year_offset, "status": status, "seconds": seconds}
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.statuses[(entry["date"], year_offset)] = status
+
+def run_backfill(generator, config_file_path, start_date, end_date, render_workers=1, memory_budget_bytes=None, force=False):
+    """
+    Generates the slideshows of every day from start_date to end_date for every configured
+    year offset, as if the app had run on each of those days, with one loaded photo index
+    and one pool of render workers for the whole range.
+
+    Progress is kept in a journal in the MoviePy temp folder; running the same range again
+    after an interruption skips the slideshows it already rendered, unless force is set.
+    The journal is removed once every job has succeeded, so a later run of the same range
+    checks every day against its manifest again. Throughput is printed in videos per hour.
+    """
+    from render_pool import render_slideshows
+
+    journal_path = os.path.join(generator.moviepy_temp_dir, "backfill",
+                                f"backfill_{start_date.isoformat()}_{end_date.isoformat()}.jsonl")
+    journal = BackfillJournal(journal_path)
+    planned = plan_backfill(start_date, end_date, generator.years_back)
+    remaining = [(day, year_offset) for day, year_offset in planned if force or not journal.is_finished(day, year_offset)]
+    if len(remaining) < len(planned):
+        print(f"Resuming backfill: {len(planned) - len(remaining)} of {len(planned)} jobs already finished.")
+    print(f"Backfill from {start_date} to {end_date}: {len(remaining)} jobs to check.")
+
+    jobs = []
+    job_days = []
+    for day, year_offset in remaining:
+        photos = generator.select_photos_for_year(year_offset, day=day)
+        if not photos:
+            journal.record(day, year_offset, "no_photos")
+            continue
+        output_filename = generator.slideshow_filename(year_offset)
+        seed = generator.slideshow_seed(year_offset, day)
+        if not force and generator.is_slideshow_up_to_date(photos, output_filename, seed, day):
+            journal.record(day, year_offset, "up_to_date")
+            continue
+        jobs.append((photos, output_filename, seed, day, generator.estimate_render_memory(len(photos))))
+        job_days.append((day, year_offset))
+    print(f"{len(jobs)} slideshows to render.")
+
+    started = time.perf_counter()
+    finished = 0
+    rendered = 0
+    def finish(job_index, status, seconds=None):
+        nonlocal finished, rendered
+        day, year_offset = job_days[job_index]
+        journal.record(day, year_offset, status, seconds)
+        finished += 1
+        if status == "rendered":
+            rendered += 1
+        elapsed = time.perf_counter() - started
+        print(f"Backfill progress: {finished}/{len(jobs)} jobs, {rendered} rendered, "
+              f"{rendered * 3600 / elapsed:.1f} videos/hour.")
+
+    if render_workers > 1 and len(jobs) > 1:
+        render_slideshows(config_file_path, jobs, min(render_workers, len(jobs)), memory_budget_bytes,
+                          on_finished=lambda job_index, stats: finish(job_index, "rendered" if stats is not None else "failed"))
+    else:
+        for job_index, (photos, output_filename, seed, day, _) in enumerate(jobs):
+            job_started = time.perf_counter()
+            try:
+                output_path = generator.create_slideshow(photos, output_filename=output_filename, stats=PipelineStats(), seed=seed, day=day)
+                status = "rendered" if output_path else "no_valid_photos"
+            except Exception as e:
+                print(f"Error rendering {output_filename} for {day}: {e}")
+                status = "failed"
+            finish(job_index, status, time.perf_counter() - job_started)
+
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for day, year_offset in job_days if journal.statuses.get((day.isoformat(), year_offset)) == "failed")
+    print(f"Backfill finished: {rendered} slideshows rendered in {elapsed / 60:.1f} minutes "
+          f"({rendered * 3600 / elapsed if elapsed else 0:.1f} videos/hour), {failed} failed.")
+    if failed:
+        print(f"Run the same backfill again to retry the failed slideshows. Journal: {journal_path}")
+    elif os.path.exists(journal_path):
+        os.remove(journal_path)
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import datetime
+import platform
+import argparse
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Resolutions of the full-size photos in the library, as (width, height)
+REALISTIC_RESOLUTIONS = [(4000, 3000), (3000, 4000), (4032, 3024), (3024, 4032), (6000, 4000), (1920, 1080), (1080, 1920)]
+
+# Written to the library root so an existing library with the same parameters is reused
+LIBRARY_MARKER = "benchmark_library.json"
+
+# Bump when the generated photos change so libraries made by older versions are generated again
+LIBRARY_VERSION = 2
+
+# JPEG quality of the synthetic photos, about what phone cameras save
+JPEG_QUALITY = 90
+
+def _photo_date(rng, years):
+    today = datetime.date.today()
+    return today - datetime.timedelta(days=rng.randrange(365 * years))
+
+def _photo_pixels(size, seed):
+    """
+    Returns distinct photo-like content for a seed: smooth random shapes, so every photo
+    has its own dHash, with fine grain on top, so it compresses and decodes like a photo.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    shapes = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)).resize(size, Image.BICUBIC)
+    grain = rng.normal(0, 12, (height, width, 1)).astype(np.float32)
+    return Image.fromarray(np.clip(np.asarray(shapes, dtype=np.float32) + grain, 0, 255).astype(np.uint8))
+
+def _save_photo(path, size, seed, capture_date, date_source):
+    """Writes one photo whose capture date is carried by EXIF, its file name or only its mtime."""
+    img = _photo_pixels(size, seed)
+    if path.endswith(".jpg"):
+        exif = Image.Exif()
+        if date_source == "exif":
+            exif.get_ifd(0x8769)[0x9003] = capture_date.strftime("%Y:%m:%d 12:00:00")
+        img.save(path, quality=JPEG_QUALITY, exif=exif)
+    else:
+        img.save(path)
+    timestamp = datetime.datetime.combine(capture_date, datetime.time(12)).timestamp()
+    os.utime(path, (timestamp, timestamp))
+
+def generate_library(library_path, photo_count, full_size_count=50, years=15, seed=1234):
+    """
+    Generates a synthetic photo library of photo_count files in year/month (and some
+    deeper event) folders, mixing JPEG and PNG and spreading capture dates over the
+    given number of years. Capture dates come from EXIF, file names or mtimes.
+
+    Only full_size_count photos have realistic camera resolutions; the rest are small
+    thumbnails so that libraries of a million files fit on disk and generate quickly.
+    Returns the paths of the full-size photos, which the frame and render benchmarks use.
+    """
+    marker_path = os.path.join(library_path, LIBRARY_MARKER)
+    parameters = {"photo_count": photo_count, "full_size_count": full_size_count, "years": years, "seed": seed,
+                  "version": LIBRARY_VERSION}
+    if os.path.exists(marker_path):
+        with open(marker_path) as f:
+            marker = json.load(f)
+        if marker["parameters"] == parameters:
+            print(f"Reusing synthetic library at {library_path}")
+            return marker["full_size_photos"]
+
+    print(f"Generating synthetic library of {photo_count} photos at {library_path}...")
+    rng = random.Random(seed)
+    full_size_indexes = set(rng.sample(range(photo_count), min(full_size_count, photo_count)))
+    full_size_photos = []
+    start = time.perf_counter()
+    for i in range(photo_count):
+        capture_date = _photo_date(rng, years)
+        folder = os.path.join(library_path, str(capture_date.year), f"{capture_date.month:02d}")
+        if rng.random() < 0.2:
+            folder = os.path.join(folder, f"event_{rng.randrange(5)}")
+        os.makedirs(folder, exist_ok=True)
+
+        extension = ".jpg" if rng.random() < 0.8 else ".png"
+        date_source = rng.choice(["exif", "exif", "filename", "mtime"]) if extension == ".jpg" else rng.choice(["filename", "mtime"])
+        name = f"IMG_{capture_date.strftime('%Y%m%d')}_{i}" if date_source == "filename" else f"DSC{i:07d}"
+        path = os.path.join(folder, name + extension)
+        photo_seed = rng.randrange(2 ** 32)
+        if i in full_size_indexes:
+            _save_photo(path, rng.choice(REALISTIC_RESOLUTIONS), photo_seed, capture_date, date_source)
+            full_size_photos.append(path)
+        else:
+            _save_photo(path, (64, 48), photo_seed, capture_date, date_source)
+        if (i + 1) % 10000 == 0:
+            print(f"  {i + 1} photos ({(i + 1) / (time.perf_counter() - start):.0f}/s)")
+
+    with open(marker_path, "w") as f:
+        json.dump({"parameters": parameters, "full_size_photos": full_size_photos}, f)
+    return full_size_photos
+
+def write_config(config_path, library_path, work_path, render_engine, video_resolution, fps):
+    with open(config_path, "w") as f:
+        f.write("[AppConfig]\n")
+        f.write(f"photo_folder_path = {library_path}\n")
+        f.write("years_back = 1\n")
+        f.write("random_photos_limit = 10\n")
+        f.write("photo_display_seconds = 3\n")
+        f.write(f"slideshow_output_folder = {os.path.join(work_path, 'output')}\n")
+        f.write("\n[VideoConfig]\n")
+        f.write("video_format = mp4\n")
+        f.write("video_codec = libx264\n")
+        f.write(f"video_fps = {fps}\n")
+        f.write("video_bitrate = 5000k\n")
+        f.write(f"video_resolution = {video_resolution}\n")
+        f.write(f"render_engine = {render_engine}\n")
+        f.write("\n[AudioConfig]\n")
+        f.write("music_file_path = \n")
+        f.write("\n[MoviePyConfig]\n")
+        f.write(f"moviepy_temp_dir = {os.path.join(work_path, 'temp')}\n")
+        f.write("\n[IndexConfig]\n")
+        f.write(f"index_db_path = {os.path.join(work_path, 'photo_index.sqlite3')}\n")
+        f.write("\n[CacheConfig]\n")
+        f.write("frame_cache_max_mb = 0\n")
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its finished children (ffmpeg), in MB."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def benchmark_index(config_path, index_db_path):
+    from slideshow_generator import SlideshowGenerator
+
+    if os.path.exists(index_db_path):
+        os.remove(index_db_path)
+    start = time.perf_counter()
+    generator = SlideshowGenerator(config_path)
+    cold_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generator = SlideshowGenerator(config_path)
+    warm_seconds = time.perf_counter() - start
+    return generator, {"photos": len(generator.photo_index), "cold_build_seconds": cold_seconds, "warm_build_seconds": warm_seconds}
+
+def benchmark_queries(generator, query_count=2000, seed=1234):
+    """Times the date lookups select_photos_for_year relies on, over random dates."""
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    window_latencies = []
+    month_day_latencies = []
+    for _ in range(query_count):
+        target_date = today - datetime.timedelta(days=rng.randrange(365 * 15))
+        start = time.perf_counter()
+        generator.photo_index.latest_photos_in_window(target_date - datetime.timedelta(days=6), target_date)
+        window_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        generator.photo_index.photos_on_month_day(target_date.month, target_date.day)
+        month_day_latencies.append(time.perf_counter() - start)
+    return {
+        "queries": query_count,
+        "window_mean_us": sum(window_latencies) / query_count * 1e6,
+        "window_p95_us": _percentile(window_latencies, 0.95) * 1e6,
+        "month_day_mean_us": sum(month_day_latencies) / query_count * 1e6,
+        "month_day_p95_us": _percentile(month_day_latencies, 0.95) * 1e6,
+    }
+
+def benchmark_frames(generator, photo_paths):
+    """Measures frame preparation (decode, resize, letterbox) throughput without the frame cache."""
+    from frame_loader import FrameLoader
+
+    frame_loader = FrameLoader(generator.video_resolution, max_workers=generator.frame_workers)
+    start = time.perf_counter()
+    prepared = sum(1 for _, frame, _ in frame_loader.load_frames(photo_paths) if frame is not None)
+    seconds = time.perf_counter() - start
+    return {"photos": prepared, "seconds": seconds, "photos_per_second": prepared / seconds if seconds else None}
+
+def benchmark_frame_transfer(generator, photo_paths):
+    """
+    Compares handing prepared frames to the render stage from threads, from worker processes
+    that pickle them back, and from worker processes writing into shared memory. Every frame is
+    read once, as the encoder would, and the frame cache is not used.
+    """
+    from frame_loader import FrameLoader
+    from frame_slots import ProcessFrameLoader
+
+    width, height = generator.video_resolution
+    loaders = {
+        "threads": FrameLoader(generator.video_resolution, max_workers=generator.frame_workers),
+        "processes_copy": ProcessFrameLoader(generator.video_resolution, max_workers=generator.frame_workers, shared_memory=False),
+        "processes_shared_memory": ProcessFrameLoader(generator.video_resolution, max_workers=generator.frame_workers),
+    }
+    results = {}
+    for name, frame_loader in loaders.items():
+        start = time.perf_counter()
+        prepared = 0
+        checksum = 0
+        for _, frame, _ in frame_loader.load_frames(photo_paths):
+            if frame is not None:
+                prepared += 1
+                checksum += int(frame[::64, ::64].sum())
+        seconds = time.perf_counter() - start
+        results[name] = {"photos": prepared, "seconds": seconds,
+                         "photos_per_second": prepared / seconds if seconds else None,
+                         "mb_per_second": prepared * width * height * 3 / (1024 * 1024) / seconds if seconds else None,
+                         "checksum": checksum}
+    return results
+
+def benchmark_render(generator, photo_paths, render_engine, seed, output_filename=None):
+    """Times one slideshow render; the segment cache is emptied first so every segment is encoded."""
+    generator.render_engine = render_engine
+    shutil.rmtree(generator.segment_cache.cache_dir, ignore_errors=True)
+    os.makedirs(generator.segment_cache.cache_dir, exist_ok=True)
+    frame_count = len(photo_paths) * max(1, int(round(generator.photo_display_seconds * generator.video_fps)))
+    start = time.perf_counter()
+    output_path = generator.create_slideshow(photo_paths, output_filename=output_filename or f"benchmark_{render_engine}.mp4", seed=seed)
+    seconds = time.perf_counter() - start
+    return {"frames": frame_count, "seconds": seconds, "fps": frame_count / seconds,
+            "file_bytes": os.path.getsize(output_path) if output_path else None}
+
+def benchmark_encoder_profiles(generator, photo_paths, profile_names, seed):
+    """Times a render with each encoder profile on the numpy engine, and a preview render."""
+    from frame_engine import ENCODER_PROFILES
+    from slideshow_generator import SlideshowGenerator
+
+    configured_profile = generator.encoder_profile
+    results = {}
+    try:
+        for name in profile_names:
+            generator.encoder_profile = dict(ENCODER_PROFILES[name], name=name)
+            results[name] = benchmark_render(generator, photo_paths, "numpy", seed, f"benchmark_profile_{name}.mp4")
+    finally:
+        generator.encoder_profile = configured_profile
+
+    preview_generator = SlideshowGenerator(generator.config_file_path, load_index=False, preview=True)
+    preview = benchmark_render(preview_generator, photo_paths, "numpy", seed, "benchmark_preview.mp4")
+    preview["resolution"] = f"{preview_generator.video_resolution[0]}x{preview_generator.video_resolution[1]}"
+    preview["video_fps"] = preview_generator.video_fps
+    return results, preview
+
+def run_benchmark(args):
+    library_path = os.path.abspath(args.library)
+    work_path = os.path.abspath(args.work_dir)
+    os.makedirs(work_path, exist_ok=True)
+    full_size_photos = generate_library(library_path, args.photos, full_size_count=args.full_size_photos, seed=args.seed)
+
+    config_path = os.path.join(work_path, "benchmark_config.ini")
+    write_config(config_path, library_path, work_path, args.engines[0], args.resolution, args.fps)
+
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {"photos": args.photos, "full_size_photos": args.full_size_photos, "seed": args.seed,
+                       "resolution": args.resolution, "fps": args.fps, "render_photos": args.render_photos},
+    }
+    generator, results["index"] = benchmark_index(config_path, os.path.join(work_path, "photo_index.sqlite3"))
+    results["queries"] = benchmark_queries(generator, seed=args.seed)
+    results["frames"] = benchmark_frames(generator, full_size_photos)
+    results["frame_transfer"] = benchmark_frame_transfer(generator, full_size_photos)
+
+    render_photos = full_size_photos[:args.render_photos]
+    results["render"] = {}
+    for render_engine in args.engines:
+        results["render"][render_engine] = benchmark_render(generator, render_photos, render_engine, args.seed)
+    results["encoder_profiles"], results["preview"] = benchmark_encoder_profiles(generator, render_photos, args.encoder_profiles, args.seed)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the slideshow pipeline on a synthetic photo library.")
+    parser.add_argument("--photos", type=int, default=10000, help="Number of photos in the synthetic library (default 10000)")
+    parser.add_argument("--full-size-photos", type=int, default=50, help="How many of them have realistic camera resolutions (default 50)")
+    parser.add_argument("--render-photos", type=int, default=10, help="Photos per benchmark slideshow (default 10)")
+    parser.add_argument("--engines", type=lambda s: s.split(","), default=["moviepy", "numpy", "segments"], help="Comma-separated render engines to time")
+    parser.add_argument("--encoder-profiles", type=lambda s: s.split(","), default=["default", "fast", "balanced", "small"],
+                        help="Comma-separated encoder profiles to time on the numpy engine")
+    parser.add_argument("--resolution", default="1080x1920", help="Video resolution (default 1080x1920)")
+    parser.add_argument("--fps", type=int, default=24, help="Video frames per second (default 24)")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for the library and the queries")
+    parser.add_argument("--library", default="./benchmark_library", help="Where to generate or reuse the synthetic library")
+    parser.add_argument("--work-dir", default="./benchmark_work", help="Where to put the index, caches and rendered videos")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Benchmark results written to {args.output}")
@@ -1,21 +1,60 @@
+import os
+import hashlib
+import datetime
+import threading
 import configparser
+from contextlib import contextmanager
+
+_UNSET = object()
 
 class ConfigManager:
     def __init__(self, config_file_path):
         self.config_file_path = config_file_path
         self.config = configparser.ConfigParser()
+        self.batch_depth = 0
         self.read_config()
 
     def read_config(self):
         self.config.read(self.config_file_path)
 
-    def get_config(self, section, key):
-        return self.config.get(section, key)
+    def get_config(self, section, key, fallback=_UNSET):
+        if fallback is _UNSET:
+            return self.config.get(section, key)
+        return self.config.get(section, key, fallback=fallback)
 
     def set_config(self, section, key, value):
         self.config.set(section, key, value)
-        with open(self.config_file_path, 'w') as configfile:
+        if not self.batch_depth:
+            self._write()
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups set_config calls so that config.ini is written once, when the block ends.
+        If the block raises, none of its changes are kept.
+        """
+        backup = {section: dict(self.config[section]) for section in self.config.sections()}
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.config = configparser.ConfigParser()
+            self.config.read_dict(backup)
+            raise
+        finally:
+            self.batch_depth -= 1
+        if not self.batch_depth:
+            self._write()
+
+    def _write(self):
+        """Replaces config.ini atomically, so a crash mid-write never leaves it truncated."""
+        temp_path = f"{self.config_file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as configfile:
             self.config.write(configfile)
+            configfile.flush()
+            os.fsync(configfile.fileno())
+        os.replace(temp_path, self.config_file_path)
+        _forget_snapshot(self.config_file_path)
 
     def get_all_configs(self):
         all_configs = {}
@@ -23,5 +62,183 @@ class ConfigManager:
             all_configs[section] = {key: self.config.get(section, key) for key in self.config[section]}
         return all_configs
 
+class ConfigSnapshot:
+    """
+    Typed, validated settings of config.ini as they were when it was read.
+
+    Every value is parsed and checked up front, so a mistake in config.ini is reported
+    once, naming the setting, instead of surfacing as a bare int() error deep in a run.
+    Snapshots are shared through load_config and must be treated as read-only.
+    """
+
+    def __init__(self, parser, config_file_path=None):
+        self.config_file_path = config_file_path
+        self.values = {section: {key: parser.get(section, key).strip() for key in parser[section]}
+                       for section in parser.sections()}
+
+        # AppConfig
+        self.photo_folder_path = self._get("AppConfig", "photo_folder_path", required=True)
+        # (path, include globs, exclude globs) of every photo folder: photo_folder_path, then each [PhotoRoot ...] section
+        self.photo_roots = [(self.photo_folder_path, self._get_patterns("AppConfig", "photo_include"),
+                             self._get_patterns("AppConfig", "photo_exclude"))]
+        for section in self.values:
+            if section.startswith("PhotoRoot"):
+                self.photo_roots.append((self._get(section, "path", required=True), self._get_patterns(section, "include"),
+                                         self._get_patterns(section, "exclude")))
+        self.years_back = self._get_list("AppConfig", "years_back")
+        self.random_photos_limit = self._get_int("AppConfig", "random_photos_limit", required=True, minimum=1)
+        # Photos whose perceptual hashes differ in at most this many of 64 bits count as near-duplicates; 0 disables the filter
+        self.near_duplicate_distance = self._get_int("AppConfig", "near_duplicate_distance", 10, minimum=0)
+        self.photo_display_seconds = self._get_int("AppConfig", "photo_display_seconds", required=True, minimum=1)
+        self.slideshow_output_folder = self._get("AppConfig", "slideshow_output_folder", required=True)
+        self.schedule_time = self._get_time("AppConfig", "schedule_time", "18:00")
+        self.enable_scheduling = self._get_bool("AppConfig", "enable_scheduling")
+        self.enable_startup_folder_open = self._get_bool("AppConfig", "enable_startup_folder_open")
+        self.render_workers = self._get_int("AppConfig", "render_workers", 1, minimum=1)
+        self.render_memory_budget_mb = self._get_int("AppConfig", "render_memory_budget_mb", minimum=1)
+
+        # VideoConfig
+        self.video_format = self._get("VideoConfig", "video_format", required=True)
+        self.video_codec = self._get("VideoConfig", "video_codec", required=True)
+        self.video_fps = self._get_int("VideoConfig", "video_fps", required=True, minimum=1)
+        self.video_bitrate = self._get("VideoConfig", "video_bitrate", required=True)
+        self.video_resolution = self._get_resolution("VideoConfig", "video_resolution")
+        self.render_engine = self._get("VideoConfig", "render_engine", "moviepy").lower()
+        if self.render_engine not in ("moviepy", "numpy", "segments"):
+            raise self._invalid("VideoConfig", "render_engine", "moviepy, numpy or segments")
+        self.encoder_profile = self._get("VideoConfig", "encoder_profile", "default").lower()
+        # encoder_* settings that override the profile's values
+        self.encoder_overrides = {}
+        for key in ("preset", "tune"):
+            if self._get("VideoConfig", f"encoder_{key}"):
+                self.encoder_overrides[key] = self._get("VideoConfig", f"encoder_{key}")
+        for key in ("crf", "threads"):
+            value = self._get_int("VideoConfig", f"encoder_{key}", minimum=0)
+            if value is not None:
+                self.encoder_overrides[key] = value
+        self.frame_workers = self._get_int("VideoConfig", "frame_workers", minimum=1)
+        self.frame_loader = self._get("VideoConfig", "frame_loader", "threads").lower()
+        if self.frame_loader not in ("threads", "processes"):
+            raise self._invalid("VideoConfig", "frame_loader", "threads or processes")
+        # Extra copies of every slideshow, one per [OutputVariant <name>] section; unset values follow VideoConfig
+        self.output_variants = []
+        for section in self.values:
+            if section.startswith("OutputVariant"):
+                name = section[len("OutputVariant"):].strip()
+                if not name or not all(c.isalnum() or c in "-_" for c in name):
+                    raise ValueError(f"Invalid section [{section}]: expected [OutputVariant <name>], with a name of letters, digits, - and _")
+                self.output_variants.append({
+                    "name": name,
+                    "resolution": self._get_resolution(section, "resolution"),
+                    "codec": self._get(section, "codec", self.video_codec),
+                    "bitrate": self._get(section, "bitrate", self.video_bitrate),
+                    "format": self._get(section, "format", self.video_format),
+                    # None to use VideoConfig's profile, encoder_* overrides included
+                    "encoder_profile": self._get(section, "encoder_profile").lower() or None,
+                })
+
+        # AudioConfig
+        self.music_file_path = self._get("AudioConfig", "music_file_path")
+        self.music_playlist_folder = self._get("AudioConfig", "music_playlist_folder")
+
+        # MoviePyConfig, IndexConfig and CacheConfig
+        self.moviepy_temp_dir = self._get("MoviePyConfig", "moviepy_temp_dir")
+        self.index_db_path = self._get("IndexConfig", "index_db_path")
+        self.metadata_workers = self._get_int("IndexConfig", "metadata_workers", minimum=1)
+        self.scan_workers = self._get_int("IndexConfig", "scan_workers", minimum=1)
+        self.frame_cache_max_mb = self._get_int("CacheConfig", "frame_cache_max_mb", 2048, minimum=0)
+        self.segment_cache_max_mb = self._get_int("CacheConfig", "segment_cache_max_mb", 4096, minimum=0)
+
+    def _get(self, section, key, default="", required=False):
+        value = self.values.get(section, {}).get(key, "")
+        if not value and required:
+            raise ValueError(f"Missing setting {key} in [{section}] of {self.config_file_path or 'the configuration'}")
+        return value or default
+
+    def _invalid(self, section, key, expected):
+        return ValueError(f"Invalid {key} in [{section}]: {self.values[section][key]!r}, expected {expected}")
+
+    def _get_int(self, section, key, default=None, required=False, minimum=None):
+        value = self._get(section, key, required=required)
+        if not value:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise self._invalid(section, key, "a whole number") from None
+        if minimum is not None and number < minimum:
+            raise self._invalid(section, key, f"a number of at least {minimum}")
+        return number
+
+    def _get_bool(self, section, key):
+        value = self._get(section, key).lower()
+        if value not in configparser.ConfigParser.BOOLEAN_STATES and value:
+            raise self._invalid(section, key, "True or False")
+        return configparser.ConfigParser.BOOLEAN_STATES.get(value, False)
+
+    def _get_list(self, section, key):
+        try:
+            numbers = [int(item) for item in self._get(section, key, required=True).split(",")]
+        except ValueError:
+            raise self._invalid(section, key, "comma-separated whole numbers") from None
+        if any(number < 1 for number in numbers):
+            raise self._invalid(section, key, "numbers of at least 1")
+        return numbers
+
+    def _get_patterns(self, section, key):
+        return tuple(pattern.strip() for pattern in self._get(section, key).split(",") if pattern.strip())
+
+    def _get_time(self, section, key, default):
+        value = self._get(section, key, default)
+        try:
+            return datetime.datetime.strptime(value, "%H:%M").time()
+        except ValueError:
+            raise self._invalid(section, key, "a time as HH:MM") from None
+
+    def _get_resolution(self, section, key):
+        try:
+            width, height = (int(side) for side in self._get(section, key, required=True).lower().split("x"))
+        except ValueError:
+            raise self._invalid(section, key, "WIDTHxHEIGHT") from None
+        if width < 2 or height < 2:
+            raise self._invalid(section, key, "a width and height of at least 2")
+        return (width, height)
+
+    def fingerprint(self, *sections):
+        """
+        Returns a short hash of the settings in sections (all of them by default). It changes
+        whenever one of those settings does, so whatever was built from them can be refreshed.
+        """
+        digest = hashlib.sha1()
+        for section in sorted(sections or self.values):
+            for key, value in sorted(self.values.get(section, {}).items()):
+                digest.update(f"[{section}]{key}={value}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+# Snapshots by absolute config path, with the file's (mtime_ns, size) when it was read
+_snapshots = {}
+_snapshots_lock = threading.Lock()
 
+def load_config(config_file_path):
+    """
+    Returns the ConfigSnapshot of config_file_path. The file is parsed again only when it
+    changed since the last call, so every part of the app can call this freely and share
+    one snapshot. Raises ValueError if a setting is missing or invalid.
+    """
+    path = os.path.abspath(config_file_path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _snapshots_lock:
+        cached = _snapshots.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    snapshot = ConfigSnapshot(parser, config_file_path)
+    with _snapshots_lock:
+        _snapshots[path] = (signature, snapshot)
+    return snapshot
 
+def _forget_snapshot(config_file_path):
+    with _snapshots_lock:
+        _snapshots.pop(os.path.abspath(config_file_path), None)
@@ -0,0 +1,140 @@
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+# The cache folder can be shared by several processes, so its size is read from disk again
+# every time this share of max_bytes was written by this one
+RESCAN_FRACTION = 0.05
+
+def _cache_entries(cache_dir, suffix):
+    """Returns (mtime, size, path) of the files ending in suffix, skipping those another process just deleted."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(suffix):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+def evict_least_recently_used(cache_dir, suffix, target_bytes, max_bytes=None):
+    """
+    If the files ending in suffix take more than max_bytes (target_bytes by default),
+    deletes those with the oldest mtime until the rest fit in target_bytes.
+    Returns (remaining_bytes, evicted_count).
+    """
+    entries = sorted(_cache_entries(cache_dir, suffix))
+    remaining_bytes = sum(size for _, size, _ in entries)
+    evicted = 0
+    if remaining_bytes <= (target_bytes if max_bytes is None else max_bytes):
+        return remaining_bytes, evicted
+    for _, size, path in entries:
+        if remaining_bytes <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            remaining_bytes -= size
+            continue
+        except OSError:
+            continue
+        remaining_bytes -= size
+        evicted += 1
+    return remaining_bytes, evicted
+
+class FrameCache:
+    """
+    Content-addressed disk cache of prepared (resized, EXIF-rotated) photos.
+
+    Entries are keyed by the photo's path, size and mtime together with the target
+    resolution and resampling filter, and stored as raw .npy arrays so a hit is a single
+    sequential read with no decoding. Only the fitted photo is stored, not the black
+    letterbox padding around it. Every hit refreshes the entry's mtime, and once the
+    cache grows past max_bytes the least recently used entries are deleted. Other
+    processes may use the same folder, so its size is checked on disk from time to time
+    rather than only counted from this process's writes.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = sum(size for _, size, _ in _cache_entries(cache_dir, ".npy"))
+        # Written by this process since the size was last read from disk
+        self.unscanned_bytes = 0
+
+    def make_key(self, photo_path, video_resolution, resample):
+        stat = os.stat(photo_path)
+        key = f"{os.path.abspath(photo_path)}|{stat.st_size}|{stat.st_mtime_ns}|{video_resolution[0]}x{video_resolution[1]}|{resample}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def get(self, key):
+        """Returns the cached array for key, or None."""
+        entry_path = self._entry_path(key)
+        try:
+            frame = np.load(entry_path)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.save(f, frame)
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            print(f"Could not write frame cache entry {entry_path}: {e}")
+            return
+        with self.lock:
+            self.total_bytes += frame.nbytes
+            self.unscanned_bytes += frame.nbytes
+            if self.total_bytes > self.max_bytes or self.unscanned_bytes > self.max_bytes * RESCAN_FRACTION:
+                self._evict()
+
+    def _evict(self):
+        """
+        Reads the cache's size from disk and, if it is over max_bytes, deletes least recently
+        used entries until it is back under 90% of max_bytes.
+        """
+        self.total_bytes, evicted = evict_least_recently_used(self.cache_dir, ".npy", self.max_bytes * 0.9, self.max_bytes)
+        self.unscanned_bytes = 0
+        self.evictions += evicted
+
+    def merge_counts(self, counts):
+        """
+        Adds the hits, misses and evictions of a copy of this cache in a worker process,
+        as returned by its count_changes, and takes its size as the latest known.
+        """
+        with self.lock:
+            self.hits += counts["hits"]
+            self.misses += counts["misses"]
+            self.evictions += counts["evictions"]
+            self.total_bytes = counts["bytes"]
+
+    def count_changes(self, before):
+        """Returns how the counts changed since stats() returned before, for merge_counts."""
+        after = self.stats()
+        return {"hits": after["hits"] - before["hits"], "misses": after["misses"] - before["misses"],
+                "evictions": after["evictions"] - before["evictions"], "bytes": after["bytes"]}
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self.total_bytes}
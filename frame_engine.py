@@ -0,0 +1,248 @@
+import os
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+ANIMATION_TYPES = ["zoom_in", "zoom_out", "pan_left", "pan_right", "pan_up", "pan_down"]
+
+# Pan distance and maximum zoom, as a fraction of the frame size
+MOTION_AMOUNT = 0.05
+
+def oversized_resolution(video_resolution):
+    """Size of the source buffer a photo is prepared at so every crop window stays inside it."""
+    return (int(round(video_resolution[0] * (1 + MOTION_AMOUNT))),
+            int(round(video_resolution[1] * (1 + MOTION_AMOUNT))))
+
+def crop_windows(animation_type, frame_count, source_size, video_resolution):
+    """
+    Precomputes the crop window (left, top, width, height) in source pixels for every frame.
+
+    Zooms scale a centred window between the whole source buffer and one frame's worth
+    of pixels; pans slide a frame-sized window across the extra margin of the buffer.
+    """
+    source_width, source_height = source_size
+    out_width, out_height = video_resolution
+    progress = np.linspace(0.0, 1.0, frame_count) if frame_count > 1 else np.zeros(1)
+
+    if animation_type in ("zoom_in", "zoom_out"):
+        if animation_type == "zoom_out":
+            progress = progress[::-1]
+        # Zoom each side to exactly the frame size, which rounding the buffer size can put off 1 + MOTION_AMOUNT
+        widths = source_width / (1 + (source_width / out_width - 1) * progress)
+        heights = source_height / (1 + (source_height / out_height - 1) * progress)
+        lefts = (source_width - widths) / 2
+        tops = (source_height - heights) / 2
+    else:
+        widths = np.full(frame_count, float(out_width))
+        heights = np.full(frame_count, float(out_height))
+        max_left = source_width - out_width
+        max_top = source_height - out_height
+        lefts = np.full(frame_count, max_left / 2)
+        tops = np.full(frame_count, max_top / 2)
+        if animation_type == "pan_left":
+            lefts = max_left * progress
+        elif animation_type == "pan_right":
+            lefts = max_left * progress[::-1]
+        elif animation_type == "pan_up":
+            tops = max_top * progress
+        elif animation_type == "pan_down":
+            tops = max_top * progress[::-1]
+    return np.stack([lefts, tops, widths, heights], axis=1)
+
+def synthesize_frames(source, windows, video_resolution):
+    """
+    Yields one RGB uint8 frame per crop window from an oversized source frame.
+
+    Frame-sized windows are cut out with integer slicing and need no resampling; scaled
+    windows are resampled in a single bilinear pass over the sub-pixel box.
+    """
+    out_width, out_height = video_resolution
+    source_image = None
+    for left, top, width, height in windows:
+        if abs(width - out_width) < 0.5 and abs(height - out_height) < 0.5:
+            x = int(round(left))
+            y = int(round(top))
+            yield source[y:y + out_height, x:x + out_width]
+        else:
+            if source_image is None:
+                source_image = Image.fromarray(source)
+            box = (left, top, left + width, top + height)
+            yield np.asarray(source_image.resize(video_resolution, Image.BILINEAR, box=box))
+
+# Named encoder settings for [VideoConfig] encoder_profile. "default" keeps the codec's own
+# defaults at video_bitrate; the others trade encode time against file size with a constant
+# quality (CRF) instead of a bitrate. preset, crf and tune only apply to libx264 and libx265.
+ENCODER_PROFILES = {
+    "default": {},
+    "fast": {"preset": "veryfast", "crf": 23},
+    "balanced": {"preset": "medium", "crf": 21},
+    "small": {"preset": "slow", "crf": 26},
+    "quality": {"preset": "slow", "crf": 18},
+    "preview": {"preset": "ultrafast", "crf": 30, "tune": "fastdecode"},
+}
+
+def encoder_arguments(codec, bitrate=None, encoder_profile=None):
+    """Returns the ffmpeg video encoder arguments for a codec, bitrate and encoder profile dict."""
+    encoder_profile = encoder_profile or {}
+    arguments = ["-c:v", codec]
+    x26x = codec in ("libx264", "libx265")
+    if x26x and encoder_profile.get("preset"):
+        arguments += ["-preset", encoder_profile["preset"]]
+    if x26x and encoder_profile.get("tune"):
+        arguments += ["-tune", encoder_profile["tune"]]
+    if x26x and encoder_profile.get("crf") is not None:
+        arguments += ["-crf", str(encoder_profile["crf"])]
+    elif bitrate:
+        arguments += ["-b:v", bitrate]
+    if encoder_profile.get("threads"):
+        arguments += ["-threads", str(encoder_profile["threads"])]
+    return arguments
+
+def get_ffmpeg_binary():
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+# ffmpeg muxers whose name is not the file extension
+MUXERS = {".mkv": "matroska", ".m4v": "mp4", ".m4a": "ipod"}
+
+def muxer_for(path):
+    """Returns the ffmpeg muxer (-f) for the file extension of path."""
+    extension = os.path.splitext(path)[1].lower()
+    return MUXERS.get(extension, extension[1:])
+
+def partial_output_path(output_path):
+    """
+    Returns the temporary name a video is written under until it is complete. It does not
+    end in a video extension, so it is never taken for a finished video or cache entry.
+    """
+    return f"{output_path}.{os.getpid()}.partial"
+
+def discard_partial_output(partial_path):
+    try:
+        os.remove(partial_path)
+    except OSError:
+        pass
+
+# Codecs that keep every pixel and so are not switched to 4:2:0 chroma
+LOSSLESS_CODECS = ("rawvideo", "png", "ffv1", "huffyuv", "utvideo", "qtrle")
+
+# Containers that take the AAC track prepared by the audio stage as is; others get Opus
+AAC_CONTAINERS = (".mp4", ".m4v", ".mov")
+
+def _audio_arguments(audio_path, output_path, duration=None, copy_audio=False):
+    """
+    Maps the audio file as the second input, padded with silence and cut where the video
+    ends. With a stream-copied video ffmpeg cannot tell where that is, so pass its duration.
+    With copy_audio the track is already AAC of the right length and is muxed as is, unless
+    the output container cannot hold AAC (webm), in which case it is encoded to Opus.
+    """
+    aac_container = os.path.splitext(output_path)[1].lower() in AAC_CONTAINERS
+    if copy_audio and aac_container:
+        arguments = ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "copy"]
+    else:
+        arguments = ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "aac" if aac_container else "libopus", "-af", "apad"]
+    if duration is not None:
+        return arguments + ["-t", f"{duration:.3f}"]
+    return arguments + ["-shortest", "-fflags", "+shortest", "-max_interleave_delta", "0"]
+
+def concat_segments(segment_paths, output_path, duration, audio_path=None, copy_audio=False):
+    """
+    Joins encoded segments with ffmpeg's concat demuxer, copying the video stream without
+    re-encoding, and muxes in the audio track. All segments must share the same encoding settings.
+    output_path only appears once the join succeeded.
+    """
+    list_path = output_path + ".segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment_path in segment_paths:
+            escaped = os.path.abspath(segment_path).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        _copy_video(["-f", "concat", "-safe", "0", "-i", list_path], output_path, duration, audio_path, copy_audio,
+                    "joining segments into")
+    finally:
+        os.remove(list_path)
+
+def mux_audio(video_path, output_path, duration, audio_path, copy_audio=False):
+    """
+    Writes output_path from the video stream of video_path, copied without re-encoding, and
+    the audio track. output_path only appears once the mux succeeded.
+    """
+    _copy_video(["-i", video_path], output_path, duration, audio_path, copy_audio, "adding the audio to")
+
+def _copy_video(input_arguments, output_path, duration, audio_path, copy_audio, action):
+    command = [get_ffmpeg_binary(), "-y", "-loglevel", "error"] + input_arguments
+    if audio_path:
+        command += _audio_arguments(audio_path, output_path, duration, copy_audio)
+    partial_path = partial_output_path(output_path)
+    command += ["-c:v", "copy", "-f", muxer_for(output_path), partial_path]
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg failed while {action} {output_path}: {result.stderr.decode(errors='replace').strip()}")
+        os.replace(partial_path, output_path)
+    except Exception:
+        discard_partial_output(partial_path)
+        raise
+
+class FfmpegWriter:
+    """
+    Streams raw RGB frames into an ffmpeg subprocess that encodes them, optionally muxing an
+    audio file. The audio is padded with silence and cut where the video ends.
+
+    The video is written under a temporary name and renamed to output_path by close, so an
+    aborted or failed render leaves no partial video behind.
+    """
+
+    def __init__(self, output_path, video_resolution, fps, codec, bitrate=None, audio_path=None, copy_audio=False, encoder_profile=None):
+        width, height = video_resolution
+        command = [
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{width}x{height}", "-pix_fmt", "rgb24", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_path:
+            command += _audio_arguments(audio_path, output_path, copy_audio=copy_audio)
+        command += encoder_arguments(codec, bitrate, encoder_profile)
+        if codec not in LOSSLESS_CODECS and width % 2 == 0 and height % 2 == 0:
+            # From RGB input encoders otherwise pick 4:4:4 (or gbrp) profiles that many players cannot play
+            command += ["-pix_fmt", "yuv420p"]
+        self.output_path = output_path
+        self.partial_path = partial_output_path(output_path)
+        command += ["-f", muxer_for(output_path), self.partial_path]
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write_frame(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        except (BrokenPipeError, OSError):
+            self._raise_error()
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            self._raise_error()
+        os.replace(self.partial_path, self.output_path)
+
+    def abort(self):
+        """Stops ffmpeg and deletes the unfinished file, e.g. after an error while producing frames."""
+        self.process.kill()
+        self.process.wait()
+        discard_partial_output(self.partial_path)
+
+    def _raise_error(self):
+        self.abort()
+        error = self.process.stderr.read().decode(errors="replace").strip()
+        raise IOError(f"ffmpeg failed while writing {self.output_path}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,201 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from pipeline_stats import PipelineStats, clock
+
+# EXIF orientations that swap width and height (transpose, rotate 90/270, transverse)
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+
+def fit_size(image_size, video_resolution):
+    """Returns the (width, height) of an image scaled to fit inside the video frame, keeping its aspect ratio."""
+    img_width, img_height = image_size
+    video_aspect_ratio = video_resolution[0] / video_resolution[1]
+    img_aspect_ratio = img_width / img_height
+    if img_aspect_ratio > video_aspect_ratio: # Image is wider than video frame
+        new_width = video_resolution[0]
+        new_height = int(new_width / img_aspect_ratio)
+    else: # Image is taller than or same aspect ratio as video frame
+        new_height = video_resolution[1]
+        new_width = int(new_height * img_aspect_ratio)
+    return max(1, new_width), max(1, new_height)
+
+# Resampling filter used for fitting photos; part of the frame cache key
+RESAMPLE_FILTER = "lanczos"
+
+def fit_photos(photo_path, video_resolutions, stats=None):
+    """
+    Decodes a photo once, applies its EXIF orientation and resizes it to fit each of the
+    video_resolutions. Returns a list of RGB uint8 arrays of the fitted sizes, without padding.
+
+    JPEGs are decoded with draft mode, which lets libjpeg scale by 1/2, 1/4 or 1/8 while
+    decoding, to the smallest scale that is still at least as large as the largest fitted size.
+    """
+    started = clock()
+    with Image.open(photo_path) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        rotated = orientation in ROTATED_ORIENTATIONS
+        display_size = (img.height, img.width) if rotated else img.size
+        sizes = [fit_size(display_size, video_resolution) for video_resolution in video_resolutions]
+        new_width, new_height = max(sizes, key=lambda size: size[0] * size[1])
+
+        if img.format == "JPEG":
+            img.draft("RGB", (new_height, new_width) if rotated else (new_width, new_height))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.load()
+        if stats is not None:
+            started = stats.record("decode", started, os.path.getsize(photo_path))
+        fitted = [np.asarray(img.resize(size, Image.LANCZOS)) for size in sizes]
+    if stats is not None:
+        stats.record("resize_pad", started)
+    return fitted
+
+def fit_photo(photo_path, video_resolution, stats=None):
+    """Decodes a photo and fits it to the video frame, see fit_photos."""
+    return fit_photos(photo_path, [video_resolution], stats)[0]
+
+def letterbox(fitted, video_resolution, out=None):
+    """Centres a fitted photo on a black frame of the video resolution, written into out if given."""
+    if out is None:
+        frame = np.zeros((video_resolution[1], video_resolution[0], 3), dtype=np.uint8)
+    else:
+        frame = out
+        frame.fill(0)
+    new_height, new_width = fitted.shape[:2]
+    padding_left = (video_resolution[0] - new_width) // 2
+    padding_top = (video_resolution[1] - new_height) // 2
+    frame[padding_top:padding_top + new_height, padding_left:padding_left + new_width] = fitted
+    return frame
+
+def prepare_frame(photo_path, video_resolution, frame_cache=None, stats=None):
+    """
+    Returns the letterboxed video frame for a photo as an RGB uint8 array of shape
+    (height, width, 3), reading the fitted photo from frame_cache when it is there.
+    """
+    return prepare_frames(photo_path, [video_resolution], frame_cache, stats)[0]
+
+def prepare_frames(photo_path, video_resolutions, frame_cache=None, stats=None, out=None):
+    """
+    Returns the letterboxed frames of a photo for each of the video_resolutions. The
+    photo is decoded at most once, for the resolutions that are not in frame_cache.
+    out optionally gives the arrays to write the frames into, one per resolution.
+    """
+    stats = stats or PipelineStats()
+    fitted = [None] * len(video_resolutions)
+    keys = []
+    if frame_cache is not None:
+        started = clock()
+        keys = [frame_cache.make_key(photo_path, video_resolution, RESAMPLE_FILTER) for video_resolution in video_resolutions]
+        fitted = [frame_cache.get(key) for key in keys]
+        cached_bytes = sum(photo.nbytes for photo in fitted if photo is not None)
+        if cached_bytes:
+            stats.record("frame_cache_read", started, cached_bytes)
+    missing = [i for i, photo in enumerate(fitted) if photo is None]
+    if missing:
+        for i, photo in zip(missing, fit_photos(photo_path, [video_resolutions[i] for i in missing], stats)):
+            fitted[i] = photo
+            if frame_cache is not None:
+                frame_cache.put(keys[i], photo)
+    started = clock()
+    out = out or [None] * len(video_resolutions)
+    frames = [letterbox(photo, video_resolution, frame) for photo, video_resolution, frame in zip(fitted, video_resolutions, out)]
+    stats.record("resize_pad", started)
+    return frames
+
+class FrameLoader:
+    """
+    Prepares letterboxed video frames for a list of photos on a pool of worker threads.
+
+    Pillow releases the GIL while decoding and resampling, so threads scale with cores
+    without copying frames between processes. Results are yielded in input order and at
+    most read_ahead photos are in flight at a time.
+    """
+
+    def __init__(self, video_resolution, max_workers=None, read_ahead=None, frame_cache=None, stats=None):
+        self.video_resolution = video_resolution
+        self.frame_cache = frame_cache
+        self.stats = stats or PipelineStats()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.read_ahead = read_ahead or self.max_workers * 2
+
+    def load_frames(self, photo_paths):
+        """Yields (photo_path, frame, error) for each photo in order; frame is None when loading failed."""
+        return self._load(photo_paths, prepare_frame, self.video_resolution)
+
+    def load_frame_sets(self, photo_paths, video_resolutions):
+        """
+        Yields (photo_path, frames, error) for each photo in order, with one frame per video
+        resolution, all prepared from a single decode; frames is None when loading failed.
+        """
+        return self._load(photo_paths, prepare_frames, video_resolutions)
+
+    def _load(self, photo_paths, prepare, resolution):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = deque()
+            photo_iter = iter(photo_paths)
+            for photo_path in photo_iter:
+                in_flight.append((photo_path, executor.submit(prepare, photo_path, resolution, self.frame_cache, self.stats)))
+                if len(in_flight) >= self.read_ahead:
+                    break
+            while in_flight:
+                photo_path, future = in_flight.popleft()
+                next_path = next(photo_iter, None)
+                if next_path is not None:
+                    in_flight.append((next_path, executor.submit(prepare, next_path, resolution, self.frame_cache, self.stats)))
+                try:
+                    yield photo_path, future.result(), None
+                except Exception as e:
+                    yield photo_path, None, e
+
+    def lazy_frames(self, photo_paths):
+        """Returns a LazyFrames over photo_paths that prepares frames only as they are requested."""
+        return LazyFrames(self, photo_paths)
+
+class LazyFrames:
+    """
+    Frames of a list of photos prepared on demand, for consumers that ask for them by
+    position, such as MoviePy clips evaluated by the encoder.
+
+    Requesting frame i starts preparing the next read_ahead photos in the background and
+    drops every frame before i, so only a window of frames is resident however many photos
+    there are. Frames are expected to be requested in (roughly) increasing order; asking
+    for a dropped frame again prepares it again, but not the photos after it, which are
+    already in flight or were prepared before.
+    """
+
+    def __init__(self, frame_loader, photo_paths):
+        self.frame_loader = frame_loader
+        self.photo_paths = list(photo_paths)
+        self.executor = ThreadPoolExecutor(max_workers=frame_loader.max_workers)
+        self.futures = {}
+        # The last photo handed to the executor, so reading ahead never submits a photo twice
+        self.submitted = -1
+
+    def __len__(self):
+        return len(self.photo_paths)
+
+    def get(self, index):
+        """Returns the frame of photo index, raising the error if it could not be prepared."""
+        for position in [position for position in self.futures if position < index]:
+            del self.futures[position]
+        loader = self.frame_loader
+        if index not in self.futures:
+            self.futures[index] = self._submit(index)
+        for position in range(max(index, self.submitted) + 1, min(len(self.photo_paths), index + 1 + loader.read_ahead)):
+            self.futures[position] = self._submit(position)
+        return self.futures[index].result()
+
+    def _submit(self, position):
+        loader = self.frame_loader
+        self.submitted = max(self.submitted, position)
+        return self.executor.submit(prepare_frame, self.photo_paths[position], loader.video_resolution, loader.frame_cache, loader.stats)
+
+    def close(self):
+        self.futures.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,195 @@
+import os
+import atexit
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_cache import FrameCache
+from frame_loader import prepare_frames
+from pipeline_stats import PipelineStats
+
+class FrameSlotPool:
+    """
+    A fixed number of equally sized frame buffers ("slots") in one shared memory block.
+
+    A worker process prepares a photo straight into a free slot and the render stage
+    reads it through numpy views of the same memory, so frames are never pickled or
+    copied between processes. Slots are handed out again once released, and the
+    loader only starts a photo when a slot is free, which bounds the memory in use.
+    """
+
+    def __init__(self, slot_count, slot_bytes):
+        self.slot_bytes = slot_bytes
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=max(1, slot_count * slot_bytes))
+        self.free = deque(range(slot_count))
+
+    @property
+    def name(self):
+        return self.shared_memory.name
+
+    def acquire(self):
+        """Returns a free slot, or None if all of them are in use."""
+        return self.free.popleft() if self.free else None
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def offset(self, slot):
+        return slot * self.slot_bytes
+
+    def views(self, slot, shapes):
+        """Returns uint8 arrays of the given shapes laid out one after another in slot, without copying."""
+        views = []
+        offset = self.offset(slot)
+        for shape in shapes:
+            views.append(np.ndarray(shape, dtype=np.uint8, buffer=self.shared_memory.buf, offset=offset))
+            offset += int(np.prod(shape))
+        return views
+
+    def close(self):
+        """Frees the shared memory once no view of it is left, see _close_retired_pools."""
+        self.shared_memory.unlink()
+        _retired_pools.append(self.shared_memory)
+        _close_retired_pools()
+
+# Shared memory that could not be unmapped yet because a consumer still held a view of its last frame
+_retired_pools = []
+
+def _close_retired_pools():
+    for memory in list(_retired_pools):
+        try:
+            memory.close()
+        except BufferError:
+            continue
+        _retired_pools.remove(memory)
+
+atexit.register(_close_retired_pools)
+
+# In a worker process: the shared memory block currently attached, and a frame cache per folder
+_attached_memory = None
+_worker_frame_caches = {}
+
+def _attach(name):
+    global _attached_memory
+    if _attached_memory is None or _attached_memory.name.lstrip("/") != name.lstrip("/"):
+        if _attached_memory is not None:
+            _attached_memory.close()
+        _attached_memory = shared_memory.SharedMemory(name=name)
+    return _attached_memory
+
+def _worker_frame_cache(cache_settings):
+    if cache_settings is None:
+        return None
+    cache_dir, max_bytes = cache_settings
+    if cache_dir not in _worker_frame_caches:
+        _worker_frame_caches[cache_dir] = FrameCache(cache_dir, max_bytes)
+    return _worker_frame_caches[cache_dir]
+
+def _prepare_into_slot(name, offset, photo_path, video_resolutions, cache_settings):
+    """
+    Runs in a worker process: prepares a photo's frames into the slot at offset and returns
+    the stage timings and how the frame cache counts changed (None without a cache).
+    """
+    stats = PipelineStats()
+    memory = _attach(name)
+    out = []
+    for width, height in video_resolutions:
+        out.append(np.ndarray((height, width, 3), dtype=np.uint8, buffer=memory.buf, offset=offset))
+        offset += width * height * 3
+    frame_cache = _worker_frame_cache(cache_settings)
+    before = frame_cache.stats() if frame_cache is not None else None
+    prepare_frames(photo_path, video_resolutions, frame_cache, stats, out=out)
+    return stats.to_dict(), frame_cache.count_changes(before) if frame_cache is not None else None
+
+def _prepare_and_return(photo_path, video_resolutions, cache_settings):
+    """Runs in a worker process: like _prepare_into_slot, but returns the frames themselves, pickled, first."""
+    stats = PipelineStats()
+    frame_cache = _worker_frame_cache(cache_settings)
+    before = frame_cache.stats() if frame_cache is not None else None
+    frames = prepare_frames(photo_path, video_resolutions, frame_cache, stats)
+    return frames, stats.to_dict(), frame_cache.count_changes(before) if frame_cache is not None else None
+
+class ProcessFrameLoader:
+    """
+    Prepares frames on a pool of worker processes instead of threads, for machines where
+    the Python parts of preparing a photo hold the GIL long enough to leave cores idle.
+    Takes the same arguments and has the same load_frames and load_frame_sets as FrameLoader.
+
+    Frames are passed back through a FrameSlotPool. A yielded frame is a view of its slot
+    and is only valid until the next one is requested; copy it to keep it longer. With
+    shared_memory=False frames are pickled back instead, which the benchmark compares against.
+    The workers' frame cache hits, misses and evictions are added to frame_cache's counts.
+    """
+
+    def __init__(self, video_resolution, max_workers=None, read_ahead=None, frame_cache=None, stats=None, shared_memory=True):
+        self.video_resolution = video_resolution
+        self.frame_cache = frame_cache
+        self.stats = stats or PipelineStats()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.read_ahead = read_ahead or self.max_workers * 2
+        self.shared_memory = shared_memory
+
+    def load_frames(self, photo_paths):
+        """Yields (photo_path, frame, error) for each photo in order; frame is None when loading failed."""
+        for photo_path, frames, error in self.load_frame_sets(photo_paths, [self.video_resolution]):
+            yield photo_path, frames[0] if frames is not None else None, error
+
+    def load_frame_sets(self, photo_paths, video_resolutions):
+        """
+        Yields (photo_path, frames, error) for each photo in order, with one frame per video
+        resolution, all prepared from a single decode; frames is None when loading failed.
+        """
+        shapes = [(height, width, 3) for width, height in video_resolutions]
+        cache_settings = (self.frame_cache.cache_dir, self.frame_cache.max_bytes) if self.frame_cache is not None else None
+        # One slot more than photos in flight, for the frame the consumer is reading
+        slots = FrameSlotPool(self.read_ahead + 1, sum(int(np.prod(shape)) for shape in shapes)) if self.shared_memory else None
+        photo_iter = iter(photo_paths)
+        in_flight = deque()
+
+        def submit(executor):
+            slot = None
+            if slots is not None:
+                slot = slots.acquire()
+                if slot is None:
+                    return False
+            photo_path = next(photo_iter, None)
+            if photo_path is None:
+                if slot is not None:
+                    slots.release(slot)
+                return False
+            if slot is None:
+                future = executor.submit(_prepare_and_return, photo_path, video_resolutions, cache_settings)
+            else:
+                future = executor.submit(_prepare_into_slot, slots.name, slots.offset(slot), photo_path, video_resolutions, cache_settings)
+            in_flight.append((photo_path, slot, future))
+            return True
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                while len(in_flight) < self.read_ahead and submit(executor):
+                    pass
+                while in_flight:
+                    photo_path, slot, future = in_flight.popleft()
+                    frames = error = None
+                    try:
+                        if slot is None:
+                            frames, stages, cache_counts = future.result()
+                        else:
+                            stages, cache_counts = future.result()
+                            frames = slots.views(slot, shapes)
+                        self.stats.merge(stages)
+                        if cache_counts is not None:
+                            self.frame_cache.merge_counts(cache_counts)
+                    except Exception as e:
+                        error = e
+                    submit(executor)
+                    yield photo_path, frames, error
+                    # The consumer asked for the next frame, so it is done with this slot
+                    frames = None
+                    if slot is not None:
+                        slots.release(slot)
+        finally:
+            if slots is not None:
+                slots.close()
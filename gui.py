@@ -1,7 +1,12 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog, QMessageBox, QCheckBox
-from config_manager import ConfigManager
+from functools import partial
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog, QMessageBox, QCheckBox, QProgressBar, QScrollArea
+from config_manager import ConfigManager, ConfigSnapshot
+from gui_calendar import CalendarHeatmap
+from gui_workers import THUMBNAIL_SIZE, GenerateWorker, LibraryCalendarLoader, ThumbnailLoader, slideshow_of
 from scheduler import Scheduler
 
 class MemoriesAppGUI(QWidget):
@@ -9,8 +14,13 @@ class MemoriesAppGUI(QWidget):
         super().__init__()
         self.config_manager = ConfigManager("config.ini")
         self.scheduler = Scheduler("config.ini")
+        self.generate_worker = None
+        self.thumbnail_loader = None
+        self.calendar_loader = None
+        self.day_thumbnail_loader = None
         self.init_ui()
         self.load_config()
+        self._start_calendar()
 
     def init_ui(self):
         self.setWindowTitle("Memories App Configuration")
@@ -92,8 +102,66 @@ class MemoriesAppGUI(QWidget):
         save_button.clicked.connect(self.save_config)
         main_layout.addWidget(save_button)
 
+        # Generate Now Section
+        generate_layout = QVBoxLayout()
+        generate_layout.addWidget(QLabel("<h2>Generate Now</h2>"))
+
+        generate_buttons_layout = QHBoxLayout()
+        self.generate_button = QPushButton("Generate Now")
+        self.generate_button.clicked.connect(self.start_generation)
+        generate_buttons_layout.addWidget(self.generate_button)
+        self.preview_checkbox = QCheckBox("Preview Only")
+        generate_buttons_layout.addWidget(self.preview_checkbox)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_generation)
+        generate_buttons_layout.addWidget(self.cancel_button)
+        generate_layout.addLayout(generate_buttons_layout)
+
+        self.progress_bar = QProgressBar()
+        generate_layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("")
+        generate_layout.addWidget(self.status_label)
+
+        # Thumbnails of the selected photos, filled in as they load
+        thumbnail_scroll_area, self.thumbnail_layout = self._create_thumbnail_strip()
+        generate_layout.addWidget(thumbnail_scroll_area)
+
+        main_layout.addLayout(generate_layout)
+
+        # Library Calendar Section
+        calendar_layout = QVBoxLayout()
+        calendar_layout.addWidget(QLabel("<h2>Library Calendar</h2>"))
+
+        self.calendar_heatmap = CalendarHeatmap()
+        self.calendar_heatmap.day_clicked.connect(self._pick_day_photos)
+        calendar_scroll_area = QScrollArea()
+        calendar_scroll_area.setWidget(self.calendar_heatmap)
+        calendar_scroll_area.setFixedHeight(200)
+        calendar_layout.addWidget(calendar_scroll_area)
+        self.calendar_label = QLabel("Loading the photo index...")
+        self.calendar_label.setWordWrap(True)
+        calendar_layout.addWidget(self.calendar_label)
+
+        # Thumbnails of the photos the clicked day's slideshow would show
+        day_thumbnail_scroll_area, self.day_thumbnail_layout = self._create_thumbnail_strip()
+        calendar_layout.addWidget(day_thumbnail_scroll_area)
+
+        main_layout.addLayout(calendar_layout)
+
         self.setLayout(main_layout)
 
+    def _create_thumbnail_strip(self):
+        """Returns a scroll area for a row of thumbnails, and the layout to add them to."""
+        thumbnail_strip = QWidget()
+        thumbnail_layout = QHBoxLayout(thumbnail_strip)
+        thumbnail_layout.setAlignment(Qt.AlignLeft)
+        thumbnail_scroll_area = QScrollArea()
+        thumbnail_scroll_area.setWidget(thumbnail_strip)
+        thumbnail_scroll_area.setWidgetResizable(True)
+        thumbnail_scroll_area.setFixedHeight(THUMBNAIL_SIZE[1] + 40)
+        return thumbnail_scroll_area, thumbnail_layout
+
     def _create_text_input_row(self, label_text, config_key, section="AppConfig"):
         layout = QHBoxLayout()
         label = QLabel(label_text)
@@ -150,30 +218,41 @@ class MemoriesAppGUI(QWidget):
         self.findChild(QLineEdit, "MoviePyConfig_moviepy_temp_dir").setText(self.config_manager.get_config("MoviePyConfig", "moviepy_temp_dir"))
 
     def save_config(self):
-        # AppConfig
-        self.config_manager.set_config("AppConfig", "photo_folder_path", self.findChild(QLineEdit, "AppConfig_photo_folder_path").text())
-        self.config_manager.set_config("AppConfig", "years_back", self.findChild(QLineEdit, "AppConfig_years_back").text())
-        self.config_manager.set_config("AppConfig", "random_photos_limit", self.findChild(QLineEdit, "AppConfig_random_photos_limit").text())
-        self.config_manager.set_config("AppConfig", "photo_display_seconds", self.findChild(QLineEdit, "AppConfig_photo_display_seconds").text())
-        self.config_manager.set_config("AppConfig", "slideshow_output_folder", self.findChild(QLineEdit, "AppConfig_slideshow_output_folder").text())
-        self.config_manager.set_config("AppConfig", "schedule_time", self.findChild(QLineEdit, "AppConfig_schedule_time").text())
-        self.config_manager.set_config("AppConfig", "enable_scheduling", str(self.enable_scheduling_checkbox.isChecked()))
-        self.config_manager.set_config("AppConfig", "enable_startup_folder_open", str(self.enable_startup_folder_open_checkbox.isChecked()))
-
-        # VideoConfig
-        self.config_manager.set_config("VideoConfig", "video_format", self.findChild(QLineEdit, "VideoConfig_video_format").text())
-        self.config_manager.set_config("VideoConfig", "video_codec", self.findChild(QLineEdit, "VideoConfig_video_codec").text())
-        self.config_manager.set_config("VideoConfig", "video_fps", self.findChild(QLineEdit, "VideoConfig_video_fps").text())
-        self.config_manager.set_config("VideoConfig", "video_bitrate", self.findChild(QLineEdit, "VideoConfig_video_bitrate").text())
-        self.config_manager.set_config("VideoConfig", "video_resolution", self.findChild(QLineEdit, "VideoConfig_video_resolution").text())
-
-        # AudioConfig
-        self.config_manager.set_config("AudioConfig", "music_file_path", self.findChild(QLineEdit, "AudioConfig_music_file_path").text())
-
-        # MoviePyConfig
-        self.config_manager.set_config("MoviePyConfig", "moviepy_temp_dir", self.findChild(QLineEdit, "MoviePyConfig_moviepy_temp_dir").text())
+        # All settings are written in one atomic update, and only if they are valid
+        try:
+            with self.config_manager.batch():
+                # AppConfig
+                self.config_manager.set_config("AppConfig", "photo_folder_path", self.findChild(QLineEdit, "AppConfig_photo_folder_path").text())
+                self.config_manager.set_config("AppConfig", "years_back", self.findChild(QLineEdit, "AppConfig_years_back").text())
+                self.config_manager.set_config("AppConfig", "random_photos_limit", self.findChild(QLineEdit, "AppConfig_random_photos_limit").text())
+                self.config_manager.set_config("AppConfig", "photo_display_seconds", self.findChild(QLineEdit, "AppConfig_photo_display_seconds").text())
+                self.config_manager.set_config("AppConfig", "slideshow_output_folder", self.findChild(QLineEdit, "AppConfig_slideshow_output_folder").text())
+                self.config_manager.set_config("AppConfig", "schedule_time", self.findChild(QLineEdit, "AppConfig_schedule_time").text())
+                self.config_manager.set_config("AppConfig", "enable_scheduling", str(self.enable_scheduling_checkbox.isChecked()))
+                self.config_manager.set_config("AppConfig", "enable_startup_folder_open", str(self.enable_startup_folder_open_checkbox.isChecked()))
+
+                # VideoConfig
+                self.config_manager.set_config("VideoConfig", "video_format", self.findChild(QLineEdit, "VideoConfig_video_format").text())
+                self.config_manager.set_config("VideoConfig", "video_codec", self.findChild(QLineEdit, "VideoConfig_video_codec").text())
+                self.config_manager.set_config("VideoConfig", "video_fps", self.findChild(QLineEdit, "VideoConfig_video_fps").text())
+                self.config_manager.set_config("VideoConfig", "video_bitrate", self.findChild(QLineEdit, "VideoConfig_video_bitrate").text())
+                self.config_manager.set_config("VideoConfig", "video_resolution", self.findChild(QLineEdit, "VideoConfig_video_resolution").text())
+
+                # AudioConfig
+                self.config_manager.set_config("AudioConfig", "music_file_path", self.findChild(QLineEdit, "AudioConfig_music_file_path").text())
+
+                # MoviePyConfig
+                self.config_manager.set_config("MoviePyConfig", "moviepy_temp_dir", self.findChild(QLineEdit, "MoviePyConfig_moviepy_temp_dir").text())
+
+                # Raises ValueError naming the first invalid setting, which discards the changes
+                ConfigSnapshot(self.config_manager.config, self.config_manager.config_file_path)
+        except ValueError as e:
+            QMessageBox.critical(self, "Invalid Configuration", f"The configuration was not saved: {e}")
+            return
 
         QMessageBox.information(self, "Configuration Saved", "Configuration has been saved successfully!")
+        # The photo folders or the index may have moved
+        self._start_calendar()
 
         # Handle scheduling based on checkbox
         if self.enable_scheduling_checkbox.isChecked():
@@ -209,6 +288,126 @@ class MemoriesAppGUI(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Startup Folder Error", f"Failed to delete startup folder script: {e}")
 
+    def start_generation(self):
+        """Starts rendering today's slideshows in the background with the saved configuration."""
+        self._clear_thumbnails(self.thumbnail_loader, self.thumbnail_layout)
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Starting...")
+        self.generate_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.generate_worker = GenerateWorker("config.ini", preview=self.preview_checkbox.isChecked(), parent=self)
+        self.generate_worker.stage_changed.connect(self.status_label.setText)
+        self.generate_worker.progress_changed.connect(self._show_progress)
+        self.generate_worker.photos_selected.connect(self._load_thumbnails)
+        self.generate_worker.finished_rendering.connect(self._generation_finished)
+        self.generate_worker.failed.connect(self.status_label.setText)
+        self.generate_worker.finished.connect(self._generation_stopped)
+        self.generate_worker.start()
+
+    def cancel_generation(self):
+        if self.generate_worker is not None and self.generate_worker.isRunning():
+            self.generate_worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+
+    def _show_progress(self, done, total, eta_seconds):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        if eta_seconds >= 0 and done < total:
+            minutes, seconds = divmod(int(eta_seconds), 60)
+            self.progress_bar.setFormat(f"%v/%m photos, {minutes}:{seconds:02d} left")
+        else:
+            self.progress_bar.setFormat("%v/%m photos")
+
+    def _generation_finished(self, output_paths):
+        if output_paths:
+            self.status_label.setText(f"Created {', '.join(os.path.basename(path) for path in output_paths)}.")
+        else:
+            self.status_label.setText("Today's slideshows are up to date.")
+
+    def _generation_stopped(self):
+        self.generate_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def _clear_thumbnails(self, loader, layout):
+        if loader is not None:
+            loader.cancel()
+            try:
+                loader.thumbnail_loaded.disconnect()
+            except TypeError:
+                pass # Already cleared
+        while layout.count():
+            layout.takeAt(0).widget().deleteLater()
+
+    def _start_thumbnail_loader(self, photo_paths, moviepy_temp_dir, layout):
+        """Starts loading thumbnails of photo_paths into layout and returns the loader."""
+        loader = ThumbnailLoader(photo_paths, os.path.join(moviepy_temp_dir, "thumbnails"), parent=self)
+        loader.thumbnail_loaded.connect(partial(self._add_thumbnail, layout))
+        loader.start()
+        return loader
+
+    def _load_thumbnails(self, photo_paths):
+        if photo_paths:
+            self.thumbnail_loader = self._start_thumbnail_loader(photo_paths, self.generate_worker.moviepy_temp_dir, self.thumbnail_layout)
+
+    def _add_thumbnail(self, layout, index, photo_path, image):
+        label = QLabel()
+        label.setPixmap(QPixmap.fromImage(image))
+        label.setToolTip(photo_path)
+        layout.addWidget(label)
+
+    def _start_calendar(self):
+        """(Re)starts the loader behind the library calendar with the saved configuration."""
+        if self.calendar_loader is not None:
+            self.calendar_loader.counts_loaded.disconnect()
+            self.calendar_loader.photos_picked.disconnect()
+            self.calendar_loader.failed.disconnect()
+            self.calendar_loader.cancel()
+            self.calendar_loader.wait()
+        self.calendar_loader = LibraryCalendarLoader("config.ini", parent=self)
+        self.calendar_loader.counts_loaded.connect(self._show_day_counts)
+        self.calendar_loader.photos_picked.connect(self._show_day_photos)
+        self.calendar_loader.failed.connect(self.calendar_label.setText)
+        self.calendar_loader.start()
+
+    def _show_day_counts(self, counts):
+        self.calendar_heatmap.set_counts(counts)
+        if self.calendar_heatmap.selected_date is None:
+            self.calendar_label.setText(f"{sum(counts.values())} photos on {len(counts)} days. "
+                                        "Click a day to see the photos its slideshow would show.")
+
+    def _pick_day_photos(self, date):
+        self._clear_thumbnails(self.day_thumbnail_loader, self.day_thumbnail_layout)
+        self.day_thumbnail_loader = None
+        self.calendar_label.setText(f"Selecting the photos of {date:%d %B %Y}...")
+        self.calendar_loader.pick_photos(date)
+
+    def _show_day_photos(self, date, photo_paths):
+        if date != self.calendar_heatmap.selected_date:
+            return # An earlier click
+        count = self.calendar_heatmap.counts.get(date.toordinal(), 0)
+        year_offset, day = slideshow_of(date)
+        text = f"{date:%d %B %Y}: {count} photo{'s' if count != 1 else ''}. "
+        if not photo_paths:
+            text += "No slideshow would be made for it."
+        elif count:
+            text += f"The slideshow of {day:%d %B %Y} ({year_offset} year(s) back) would show {len(photo_paths)} of them:"
+        else:
+            text += (f"The slideshow of {day:%d %B %Y} ({year_offset} year(s) back) would show {len(photo_paths)} photos "
+                     "of an earlier day that week:")
+        self.calendar_label.setText(text)
+        if photo_paths:
+            self.day_thumbnail_loader = self._start_thumbnail_loader(photo_paths, self.calendar_loader.moviepy_temp_dir,
+                                                                     self.day_thumbnail_layout)
+
+    def closeEvent(self, event):
+        # Let a running render discard its partial video before the window goes away
+        for worker in (self.generate_worker, self.thumbnail_loader, self.calendar_loader, self.day_thumbnail_loader):
+            if worker is not None and worker.isRunning():
+                worker.cancel()
+                worker.wait()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MemoriesAppGUI()
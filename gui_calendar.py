@@ -0,0 +1,127 @@
+import math
+import datetime
+
+from PyQt5.QtCore import QRect, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QToolTip, QWidget
+
+# Size of a day's square and the space around it, the width of the year labels, and the gap between years
+CELL_SIZE = 11
+CELL_SPACING = 2
+LABEL_WIDTH = 52
+YEAR_GAP = 10
+
+EMPTY_COLOR = QColor(235, 237, 240)
+FULL_COLOR = QColor(33, 110, 57)
+SELECTED_COLOR = QColor(220, 50, 47)
+
+def _first_monday(year):
+    """The Monday of the week of 1 January, where the first column of a year starts."""
+    january_first = datetime.date(year, 1, 1)
+    return january_first - datetime.timedelta(days=january_first.weekday())
+
+class CalendarHeatmap(QWidget):
+    """
+    One row of weeks per year, newest year first, with each day shaded by how many photos
+    were taken on it. Painting only looks up the counts of the visible days, so it is as
+    fast for a million photos as for a hundred. Clicking a day emits day_clicked.
+    """
+
+    day_clicked = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.counts = {}
+        self.years = []
+        self.max_count = 0
+        self.selected_date = None
+        self.setMouseTracking(True)
+
+    def set_counts(self, counts):
+        """Shows counts, a {date ordinal: photo count} dict, replacing the previous ones."""
+        self.counts = counts
+        self.max_count = max(counts.values(), default=0)
+        if counts:
+            first_year = datetime.date.fromordinal(min(counts)).year
+            last_year = max(datetime.date.fromordinal(max(counts)).year, datetime.date.today().year)
+            self.years = list(range(last_year, first_year - 1, -1))
+        else:
+            self.years = []
+        self.updateGeometry()
+        self.adjustSize()
+        self.update()
+
+    def select_date(self, date):
+        self.selected_date = date
+        self.update()
+
+    def _year_height(self):
+        return 7 * (CELL_SIZE + CELL_SPACING) + YEAR_GAP
+
+    def sizeHint(self):
+        return QSize(LABEL_WIDTH + 54 * (CELL_SIZE + CELL_SPACING), max(1, len(self.years)) * self._year_height())
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def _cell_rect(self, date, row=None):
+        if row is None:
+            row = self.years.index(date.year)
+        week = (date - _first_monday(date.year)).days // 7
+        return QRect(LABEL_WIDTH + week * (CELL_SIZE + CELL_SPACING),
+                     row * self._year_height() + date.weekday() * (CELL_SIZE + CELL_SPACING), CELL_SIZE, CELL_SIZE)
+
+    def date_at(self, x, y):
+        """Returns the day under the point (x, y), or None if there is none."""
+        row, offset = divmod(y, self._year_height())
+        weekday, in_cell_y = divmod(offset, CELL_SIZE + CELL_SPACING)
+        week, in_cell_x = divmod(x - LABEL_WIDTH, CELL_SIZE + CELL_SPACING)
+        if not 0 <= row < len(self.years) or weekday > 6 or x < LABEL_WIDTH or in_cell_x >= CELL_SIZE or in_cell_y >= CELL_SIZE:
+            return None
+        date = _first_monday(self.years[row]) + datetime.timedelta(weeks=week, days=weekday)
+        return date if date.year == self.years[row] else None
+
+    def _color(self, count):
+        if not count:
+            return EMPTY_COLOR
+        # Logarithmic, so a day with a few photos still stands out next to a wedding or a holiday
+        strength = 0.25 + 0.75 * math.log1p(count) / math.log1p(self.max_count)
+        return QColor(round(EMPTY_COLOR.red() + (FULL_COLOR.red() - EMPTY_COLOR.red()) * strength),
+                      round(EMPTY_COLOR.green() + (FULL_COLOR.green() - EMPTY_COLOR.green()) * strength),
+                      round(EMPTY_COLOR.blue() + (FULL_COLOR.blue() - EMPTY_COLOR.blue()) * strength))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        visible = event.rect()
+        colors = {}
+        first_row = max(0, visible.top() // self._year_height())
+        last_row = min(len(self.years) - 1, visible.bottom() // self._year_height())
+        for row in range(first_row, last_row + 1):
+            year = self.years[row]
+            top = row * self._year_height()
+            painter.setPen(self.palette().windowText().color())
+            painter.drawText(QRect(0, top, LABEL_WIDTH - 6, 7 * (CELL_SIZE + CELL_SPACING)), Qt.AlignRight | Qt.AlignVCenter, str(year))
+            painter.setPen(Qt.NoPen)
+            first_ordinal = datetime.date(year, 1, 1).toordinal()
+            for ordinal in range(first_ordinal, datetime.date(year + 1, 1, 1).toordinal()):
+                count = self.counts.get(ordinal, 0)
+                if count not in colors:
+                    colors[count] = self._color(count)
+                painter.fillRect(self._cell_rect(datetime.date.fromordinal(ordinal), row), colors[count])
+        if self.selected_date is not None and self.selected_date.year in self.years:
+            painter.setPen(SELECTED_COLOR)
+            painter.drawRect(self._cell_rect(self.selected_date).adjusted(-1, -1, 0, 0))
+
+    def mouseMoveEvent(self, event):
+        date = self.date_at(event.x(), event.y())
+        if date is None:
+            QToolTip.hideText()
+            return
+        count = self.counts.get(date.toordinal(), 0)
+        QToolTip.showText(event.globalPos(), f"{date:%a %d %b %Y}: {count} photo{'s' if count != 1 else ''}", self)
+
+    def mousePressEvent(self, event):
+        date = self.date_at(event.x(), event.y())
+        if event.button() == Qt.LeftButton and date is not None:
+            self.select_date(date)
+            self.day_clicked.emit(date)
@@ -0,0 +1,213 @@
+import os
+import time
+import queue
+import datetime
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from frame_cache import FrameCache
+from frame_loader import FrameLoader
+from pipeline_stats import PipelineStats
+
+# Size of the photos in the GUI's thumbnail strip, and disk space for their cache
+THUMBNAIL_SIZE = (128, 128)
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+
+# How often the library calendar checks whether the photo index changed
+CALENDAR_POLL_SECONDS = 5
+
+class RenderCancelled(Exception):
+    """Raised from the progress callback to stop a render the user cancelled."""
+
+class GenerateWorker(QThread):
+    """
+    Generates today's slideshows in a background thread so the GUI stays responsive.
+
+    Slideshows are rendered one after another in this thread rather than in the render
+    pool, so that a cancel takes effect within one photo: the progress callback raises
+    RenderCancelled and the engine discards the partial video.
+    """
+
+    stage_changed = pyqtSignal(str)
+    # Photos rendered, photos in total, estimated seconds left (-1 while unknown)
+    progress_changed = pyqtSignal(int, int, float)
+    photos_selected = pyqtSignal(list)
+    finished_rendering = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, config_file_path, preview=False, force=False, parent=None):
+        super().__init__(parent)
+        self.config_file_path = config_file_path
+        self.preview = preview
+        self.force = force
+        self.cancel_requested = False
+        # Known once the configuration is loaded; the thumbnail cache is kept under it
+        self.moviepy_temp_dir = None
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def _check_cancelled(self):
+        if self.cancel_requested:
+            raise RenderCancelled()
+
+    def run(self):
+        try:
+            self.finished_rendering.emit(self._generate())
+        except RenderCancelled:
+            self.failed.emit("Cancelled.")
+        except Exception as e:
+            self.failed.emit(f"Error generating slideshows: {e}")
+
+    def _generate(self):
+        from slideshow_generator import SlideshowGenerator
+
+        self.stage_changed.emit("Loading photo index...")
+        generator = SlideshowGenerator(self.config_file_path, preview=self.preview)
+        self.moviepy_temp_dir = generator.moviepy_temp_dir
+        self._check_cancelled()
+
+        self.stage_changed.emit("Selecting photos...")
+        jobs = []
+        selected = []
+        for year_offset in generator.years_back:
+            photos = generator.select_photos_for_year(year_offset)
+            if not photos:
+                continue
+            selected.extend(photos)
+            output_filename = generator.slideshow_filename(year_offset)
+            seed = generator.slideshow_seed(year_offset)
+            if not self.force and generator.is_slideshow_up_to_date(photos, output_filename, seed):
+                continue
+            jobs.append((photos, output_filename, seed))
+        self.photos_selected.emit(selected)
+        self._check_cancelled()
+
+        total = sum(len(photos) for photos, _, _ in jobs)
+        started = time.perf_counter()
+        finished = 0
+        output_paths = []
+        for number, (photos, output_filename, seed) in enumerate(jobs, 1):
+            self.stage_changed.emit(f"Rendering {output_filename} ({number}/{len(jobs)})...")
+
+            def progress(done, _, finished=finished):
+                self._check_cancelled()
+                done += finished
+                elapsed = time.perf_counter() - started
+                eta = elapsed / done * (total - done) if done else -1.0
+                self.progress_changed.emit(done, total, eta)
+
+            progress(0, len(photos))
+            output_path = generator.create_slideshow(photos, output_filename=output_filename, stats=PipelineStats(),
+                                                     seed=seed, progress=progress)
+            finished += len(photos)
+            if output_path:
+                output_paths.append(output_path)
+        self.progress_changed.emit(total, total, 0.0)
+        return output_paths
+
+class ThumbnailLoader(QThread):
+    """
+    Loads small thumbnails of photos in a background thread, through the same frame
+    loader as the renders and a small disk cache of its own, and emits each one as
+    soon as it is ready.
+    """
+
+    thumbnail_loaded = pyqtSignal(int, str, QImage)
+
+    def __init__(self, photo_paths, cache_dir, parent=None):
+        super().__init__(parent)
+        self.photo_paths = list(photo_paths)
+        self.cache_dir = cache_dir
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def run(self):
+        frame_cache = FrameCache(self.cache_dir, THUMBNAIL_CACHE_BYTES)
+        frame_loader = FrameLoader(THUMBNAIL_SIZE, frame_cache=frame_cache)
+        for index, (photo_path, frame, error) in enumerate(frame_loader.load_frames(self.photo_paths)):
+            if self.cancel_requested:
+                break
+            if error is not None:
+                continue
+            height, width = frame.shape[:2]
+            # QImage only wraps the array, so copy it before the array goes away
+            image = QImage(frame.tobytes(), width, height, 3 * width, QImage.Format_RGB888).copy()
+            self.thumbnail_loaded.emit(index, photo_path, image)
+
+def slideshow_of(target_date):
+    """
+    Returns the (year_offset, day) of the slideshow that shows target_date: the one made
+    on the same calendar day this year, or in the last leap year for 29 February.
+    """
+    year = datetime.date.today().year
+    while True:
+        try:
+            return year - target_date.year, target_date.replace(year=year)
+        except ValueError:
+            year -= 1
+
+class LibraryCalendarLoader(QThread):
+    """
+    Feeds the GUI's library calendar from the photo index in a background thread, without
+    scanning the photo folders. It emits the photo count of every day, read from the counts
+    the index keeps per day, and again whenever the index file changes, e.g. after a run.
+    Days passed to pick_photos are answered with the photos their slideshow would show.
+    """
+
+    counts_loaded = pyqtSignal(dict)
+    # The clicked day, and the photos select_photos_for_year picks for it
+    photos_picked = pyqtSignal(object, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, config_file_path, parent=None):
+        super().__init__(parent)
+        self.config_file_path = config_file_path
+        self.requests = queue.Queue()
+        # Known once the configuration is loaded; the thumbnail cache is kept under it
+        self.moviepy_temp_dir = None
+
+    def pick_photos(self, target_date):
+        self.requests.put(target_date)
+
+    def cancel(self):
+        self.requests.put(None)
+
+    def run(self):
+        from photo_index import PhotoIndex
+        from slideshow_generator import SlideshowGenerator
+
+        try:
+            generator = SlideshowGenerator(self.config_file_path, load_index=False)
+            store = PhotoIndex(generator.photo_roots, generator.index_db_path)
+        except Exception as e:
+            self.failed.emit(f"Calendar unavailable: {e}")
+            return
+        self.moviepy_temp_dir = generator.moviepy_temp_dir
+        # Selection only needs the photos of a week, which the database looks up without loading the index
+        generator.photo_index = store
+        index_version = None
+        try:
+            while True:
+                stat = os.stat(generator.index_db_path)
+                if (stat.st_mtime_ns, stat.st_size) != index_version:
+                    index_version = (stat.st_mtime_ns, stat.st_size)
+                    self.counts_loaded.emit(store.day_counts())
+                try:
+                    target_date = self.requests.get(timeout=CALENDAR_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if target_date is None:
+                    break
+                year_offset, day = slideshow_of(target_date)
+                try:
+                    self.photos_picked.emit(target_date, generator.select_photos_for_year(year_offset, day=day))
+                except Exception as e:
+                    self.failed.emit(f"Error selecting the photos of {target_date}: {e}")
+        finally:
+            store.close()
+            if generator.photo_hashes is not None:
+                generator.photo_hashes.close()
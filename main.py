@@ -1,44 +1,209 @@
 import os
 import sys
+import multiprocessing
 import datetime
-from PyQt5.QtWidgets import QApplication
-from config_manager import ConfigManager
-from slideshow_generator import SlideshowGenerator
-from gui import MemoriesAppGUI
+
+# PyQt5, the GUI and the slideshow pipeline are imported inside the functions that use
+# them, so the scheduled --run-slideshow task never loads Qt and the GUI never loads MoviePy.
 
 def run_gui():
     """
     Run the GUI application for configuration.
     """
+    from PyQt5.QtWidgets import QApplication
+    from gui import MemoriesAppGUI
+
     app = QApplication(sys.argv)
     window = MemoriesAppGUI()
     window.show()
     sys.exit(app.exec_())
 
-def generate_slideshows_for_years():
+def generate_slideshows_for_years(rebuild_index=False, profile=False, force=False, generator=None, preview=False):
     """
     Generate slideshows based on the current configuration for each year back.
+    Pass rebuild_index=True to discard the persistent photo index and rescan everything,
+    or a generator whose photo index is already loaded (as the service does) to skip the scan.
+    Slideshows already rendered today from the same photos and settings are skipped
+    unless force=True. With preview=True small, quickly encoded *_preview videos are made
+    instead, to check the photo selection.
+
+    Stage timings of the run are written as a JSON report to the day's output folder.
+    With profile=True the whole run is also profiled with cProfile and the stats are
+    dumped next to the report (renders in parallel worker processes are not profiled).
     """
-    config_manager = ConfigManager("config.ini")
-    generator = SlideshowGenerator("config.ini")
+    from slideshow_generator import SlideshowGenerator
+    from render_pool import render_slideshows
+    from pipeline_stats import PipelineStats, write_report
+
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if generator is None:
+        generator = SlideshowGenerator("config.ini", rebuild_index=rebuild_index, preview=preview)
     
-    years_back = [int(y) for y in config_manager.get_config("AppConfig", "years_back").split(",")]
+    years_back = generator.years_back
+    render_workers = generator.config.render_workers
+    memory_budget_mb = generator.config.render_memory_budget_mb
     today = datetime.date.today()
 
+    jobs = []
+    slideshow_stats = {}
     for year_offset in years_back:
-        photos = generator.select_photos_for_year(year_offset)
+        stats = PipelineStats()
+        photos = generator.select_photos_for_year(year_offset, stats=stats)
         if photos:
-            # New Naming convention: [Memories_This_Week_X_year(s)_back]
-            year_suffix = "year" if year_offset == 1 else "years"
-            output_filename = f"Memories_This_Week_{year_offset}_{year_suffix}_back.mp4"
-            generator.create_slideshow(photos, output_filename=output_filename)
+            output_filename = generator.slideshow_filename(year_offset)
+            seed = generator.slideshow_seed(year_offset)
+            if not force and generator.is_slideshow_up_to_date(photos, output_filename, seed):
+                print(f"{output_filename} is up to date, skipping.")
+                continue
+            slideshow_stats[output_filename] = stats
+            if render_workers > 1:
+                jobs.append((photos, output_filename, seed, None, generator.estimate_render_memory(len(photos))))
+            else:
+                generator.create_slideshow(photos, output_filename=output_filename, stats=stats, seed=seed)
         else:
             print(f"No photos found for {year_offset} year(s) back.")
 
+    if jobs:
+        memory_budget_bytes = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        job_stats = render_slideshows("config.ini", jobs, min(render_workers, len(jobs)), memory_budget_bytes,
+                                      preview=generator.preview)
+        for job_index, stages in job_stats.items():
+            slideshow_stats[jobs[job_index][1]].merge(stages)
+
+    output_dir = generator.get_output_dir()
+    report_path = write_report(output_dir, generator.run_stats.to_dict(),
+                               {output_filename: stats.to_dict() for output_filename, stats in slideshow_stats.items()})
+    print(f"Pipeline report written to: {report_path}")
+
+    if profiler is not None:
+        profiler.disable()
+        profile_path = os.path.splitext(report_path)[0].replace("pipeline_report", "pipeline_profile") + ".prof"
+        profiler.dump_stats(profile_path)
+        print(f"Profile written to: {profile_path} (open with python -m pstats or snakeviz)")
+
+def backfill_slideshows(start_date, end_date, rebuild_index=False, force=False):
+    """
+    Generate the slideshows of every day from start_date to end_date, as the daily run
+    would have on each of those days. An interrupted backfill resumes when run again.
+    """
+    from slideshow_generator import SlideshowGenerator
+    from backfill import run_backfill
+
+    generator = SlideshowGenerator("config.ini", rebuild_index=rebuild_index)
+    memory_budget_mb = generator.config.render_memory_budget_mb
+    memory_budget_bytes = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+    run_backfill(generator, "config.ini", start_date, end_date, generator.config.render_workers, memory_budget_bytes, force=force)
+
+def run_service(rebuild_index=False):
+    """
+    Keep running, with the photo index loaded and kept up to date, and generate the
+    slideshows at the configured schedule time every day.
+    """
+    from memories_service import MemoriesService
+
+    service = MemoriesService("config.ini", lambda generator: generate_slideshows_for_years(generator=generator),
+                              rebuild_index=rebuild_index)
+    service.run_forever()
+
+def install_service(install=True):
+    """
+    Registers (or with install=False removes) the Windows task that starts --service when
+    the user logs on. The daily --run-slideshow task is removed, since the service renders
+    at the schedule time itself.
+    """
+    from scheduler import Scheduler
+
+    scheduler = Scheduler("config.ini")
+    # The same launcher as the daily task, which runs the app from its install folder
+    bat_file_path = os.path.splitext(os.path.abspath(sys.argv[0]))[0] + ".bat"
+    try:
+        if install:
+            scheduler.create_service_task("MemoriesAppService", bat_file_path)
+            scheduler.delete_task("MemoriesAppDailySlideshow")
+            print("The service will start when you log on. Leave \"Enable Daily Slideshow Scheduling\" unticked in the configuration.")
+        else:
+            scheduler.delete_task("MemoriesAppService")
+            print("The service will no longer start when you log on.")
+    except Exception as e:
+        print(e)
+
+def run_farm(argv):
+    """
+    Runs the render farm part named in argv: a coordinator, workers, or a client that
+    submits the day's slideshows of one or more configs and waits for them.
+    Returns False if the arguments are incomplete or invalid.
+    """
+    import render_farm
+
+    position = next(i for i, arg in enumerate(argv) if arg.startswith("--farm-"))
+    command = argv[position]
+    values = []
+    for arg in argv[position + 1:]:
+        if arg.startswith("--"):
+            break
+        values.append(arg)
+    if not values:
+        return False
+    address = values[0]
+
+    if command == "--farm-coordinator" and len(values) == 1:
+        coordinator = render_farm.RenderCoordinator(address)
+        try:
+            coordinator.serve_forever()
+        finally:
+            coordinator.close()
+    elif command == "--farm-worker" and len(values) <= 2:
+        if len(values) == 2 and not values[1].isdigit():
+            return False
+        render_farm.run_workers(address, int(values[1]) if len(values) == 2 else 1)
+    elif command == "--farm-submit" and len(values) >= 2:
+        day = datetime.date.today()
+        if "--date" in argv:
+            try:
+                day = datetime.date.fromisoformat(argv[argv.index("--date") + 1])
+            except (IndexError, ValueError):
+                return False
+        job_specs = []
+        for config_file_path in values[1:]:
+            job_specs.extend(render_farm.daily_jobs(config_file_path, day, force="--force" in argv))
+        print(f"Submitting {len(job_specs)} jobs to {address}...")
+        started = datetime.datetime.now()
+        for job in render_farm.submit_jobs(address, job_specs):
+            print(f"{job['config_path']} {job['year_offset']} year(s) back: {job['status']}"
+                  + (f" on {job['worker']} in {job['render_seconds']:.1f} s" if job['render_seconds'] is not None else "")
+                  + (f", after {job['attempts']} attempts" if job['attempts'] > 1 else "")
+                  + (f" ({job['error']})" if job['error'] else ""))
+        print(f"All jobs finished in {(datetime.datetime.now() - started).total_seconds():.1f} s.")
+    else:
+        return False
+    return True
+
+def parse_backfill_dates(argv):
+    """Returns the (start, end) dates following --backfill in argv, or None if they are missing or invalid."""
+    position = argv.index("--backfill")
+    try:
+        start_date = datetime.date.fromisoformat(argv[position + 1])
+        end_date = datetime.date.fromisoformat(argv[position + 2])
+    except (IndexError, ValueError):
+        return None
+    return (start_date, end_date) if start_date <= end_date else None
+
 def main():
     """
     Main entry point for the application.
     """
+    # The render farm does not use the config.ini of the current folder
+    if any(arg.startswith("--farm-") for arg in sys.argv):
+        if not run_farm(sys.argv):
+            print("Usage: --farm-coordinator ADDRESS, --farm-worker ADDRESS [COUNT], or "
+                  "--farm-submit ADDRESS CONFIG... [--date YYYY-MM-DD] [--force], with ADDRESS as HOST:PORT or a Unix socket path.")
+        return
+
     # Check if config.ini exists
     if not os.path.exists("config.ini"):
         print("Configuration file not found. Running GUI for initial setup.")
@@ -46,15 +211,31 @@ def main():
         return
 
     # Check command line arguments
-    if len(sys.argv) > 1 and sys.argv[1] == "--gui":
+    rebuild_index = "--rebuild-index" in sys.argv
+    profile = "--profile" in sys.argv
+    force = "--force" in sys.argv
+    preview = "--preview" in sys.argv
+    if "--backfill" in sys.argv:
+        dates = parse_backfill_dates(sys.argv)
+        if dates is None:
+            print("Usage: --backfill START END, with dates as YYYY-MM-DD and START not after END.")
+            return
+        backfill_slideshows(*dates, rebuild_index=rebuild_index, force=force)
+    elif "--install-service" in sys.argv or "--uninstall-service" in sys.argv:
+        install_service(install="--install-service" in sys.argv)
+    elif "--service" in sys.argv:
+        run_service(rebuild_index=rebuild_index)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--gui":
         run_gui()
     elif len(sys.argv) > 1 and sys.argv[1] == "--run-slideshow":
-        generate_slideshows_for_years()
+        generate_slideshows_for_years(rebuild_index=rebuild_index, profile=profile, force=force, preview=preview)
     else:
         # Default behavior if no specific argument is given, run slideshows
         # This is for when the scheduler calls it without arguments
-        generate_slideshows_for_years()
+        generate_slideshows_for_years(rebuild_index=rebuild_index, profile=profile, force=force, preview=preview)
 
 if __name__ == "__main__":
+    # Required for process pools in the frozen (PyInstaller) Windows executable
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,127 @@
+import datetime
+
+from config_manager import load_config
+from photo_index import PhotoIndex
+from photo_watcher import PollingWatcher, create_watcher
+from pipeline_stats import PipelineStats
+from slideshow_generator import SlideshowGenerator
+
+# How often the polling fallback checks the photo folder for changes
+DEFAULT_POLL_SECONDS = 300
+
+class MemoriesService:
+    """
+    Long-running alternative to the scheduled --run-slideshow task.
+
+    The photo index stays loaded between runs and is kept up to date as photos are
+    added or removed, through inotify on Linux or by polling elsewhere. inotify reports
+    the changed directories, so only those are listed again; a full refresh is only done
+    when the polling fallback is active or events were lost. At the configured
+    schedule_time the daily slideshows are rendered straight away, without starting
+    Python or scanning the photo folder first.
+    """
+
+    def __init__(self, config_file_path, render_daily, poll_seconds=DEFAULT_POLL_SECONDS, rebuild_index=False):
+        self.config_file_path = config_file_path
+        self.render_daily = render_daily
+        self.poll_seconds = poll_seconds
+        self.generator = SlideshowGenerator(config_file_path, load_index=False)
+        self.store = None
+        self.watcher = create_watcher(poll_seconds)
+        self._open_index(rebuild_index)
+        self.last_run_date = None
+
+    def _open_index(self, rebuild=False):
+        """Opens the generator's photo index, brings it up to date and watches its directories."""
+        self.store = PhotoIndex(self.generator.photo_roots, self.generator.index_db_path,
+                                metadata_workers=self.generator.metadata_workers, scan_workers=self.generator.scan_workers)
+        print("Building photo index...")
+        self.store.refresh(rebuild=rebuild)
+        self.generator.photo_index = self.store.load_date_index()
+        print(f"Photo index built with {len(self.generator.photo_index)} items.")
+        self._watch_directories()
+
+    def _watch_directories(self):
+        try:
+            self.watcher.watch(self.store.directories())
+        except OSError as e:
+            # Typically the inotify watch limit (fs.inotify.max_user_watches) on very large libraries
+            print(f"{e}. Polling for new photos instead.")
+            self.watcher.close()
+            self.watcher = PollingWatcher(DEFAULT_POLL_SECONDS)
+
+    def schedule_time(self):
+        """Returns today's configured schedule time, re-read so that changes made in the GUI apply."""
+        return datetime.datetime.combine(datetime.date.today(), load_config(self.config_file_path).schedule_time)
+
+    def reload_settings(self):
+        """
+        Swaps in a generator with the current settings if config.ini changed since the last
+        run. The loaded photo index is kept unless the photo folders or index moved.
+        """
+        if load_config(self.config_file_path).fingerprint() == self.generator.config.fingerprint():
+            return
+        print("Configuration changed, reloading settings.")
+        previous = self.generator
+        self.generator = SlideshowGenerator(self.config_file_path, load_index=False)
+        if (self.generator.config.photo_roots, self.generator.index_db_path) == (previous.config.photo_roots, previous.index_db_path):
+            self.generator.photo_index = previous.photo_index
+        else:
+            self.store.close()
+            self.watcher.close()
+            self.watcher = create_watcher(self.poll_seconds)
+            self._open_index()
+
+    def update_index(self, dirty_directories=(), only_dirty=False):
+        """
+        Rescans changed directories and swaps in a new in-memory index if any photo changed.
+        With only_dirty only dirty_directories are rescanned, otherwise every directory is
+        checked for a changed mtime. New directories are watched even if they hold no photos
+        yet, so photos copied into them later are noticed.
+        """
+        started = datetime.datetime.now()
+        known = set(self.store.directories()) if only_dirty else None
+        self.store.refresh(dirty_directories=dirty_directories, only_dirty=only_dirty)
+        changed, removed_photos = self.store.changed, self.store.removed_photos
+        self._watch_directories()
+        if only_dirty:
+            # Photos copied into a new directory before its watch was added raised no event, so list it again
+            new_directories = set(self.store.directories()) - known
+            if new_directories:
+                self.store.refresh(dirty_directories=new_directories, only_dirty=True)
+                changed, removed_photos = changed or self.store.changed, removed_photos + self.store.removed_photos
+        if removed_photos:
+            self.generator.prune_photo_hashes()
+        if changed:
+            self.generator.photo_index = self.store.load_date_index()
+            print(f"Photo index updated in {(datetime.datetime.now() - started).total_seconds():.1f} s, "
+                  f"{len(self.generator.photo_index)} items.")
+
+    def run_forever(self):
+        """Renders the daily slideshows at schedule_time every day, and once at startup if that time has passed."""
+        print("Memories service started.")
+        try:
+            while True:
+                now = datetime.datetime.now()
+                run_at = self.schedule_time()
+                if now >= run_at and self.last_run_date != now.date():
+                    self.last_run_date = now.date()
+                    try:
+                        self.reload_settings()
+                        # Watcher events keep the index current; without them, check every directory's mtime
+                        if self.watcher.missed_changes():
+                            self.update_index()
+                        self.generator.run_stats = PipelineStats()
+                        self.render_daily(self.generator)
+                    except Exception as e:
+                        print(f"Error generating today's slideshows: {e}")
+                    continue
+
+                if now >= run_at:
+                    run_at += datetime.timedelta(days=1)
+                dirty_directories = self.watcher.wait((run_at - now).total_seconds())
+                if dirty_directories is not None:
+                    self.update_index(dirty_directories, only_dirty=not self.watcher.missed_changes())
+        finally:
+            self.watcher.close()
+            self.store.close()
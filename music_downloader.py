@@ -1,18 +1,37 @@
 import os
-import requests
-from config_manager import ConfigManager
+import datetime
+from config_manager import load_config
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".aac", ".ogg", ".flac")
 
 class MusicDownloader:
     def __init__(self, config_file_path):
-        self.config_manager = ConfigManager(config_file_path)
+        self.config = load_config(config_file_path)
+
+    def get_music_file_path(self, day=None):
+        """
+        Returns the music file of day (today by default). When a playlist folder is configured,
+        its tracks are used in rotation, one per day; otherwise the single configured music
+        file is used.
+        """
+        playlist_folder = self.config.music_playlist_folder
+        if playlist_folder:
+            tracks = self.get_playlist_tracks(playlist_folder)
+            if tracks:
+                return tracks[(day or datetime.date.today()).toordinal() % len(tracks)]
+            print(f"No music files found in playlist folder: {playlist_folder}. Falling back to the music file path.")
 
-    def get_music_file_path(self):
-        music_file_path = self.config_manager.get_config("AudioConfig", "music_file_path")
+        music_file_path = self.config.music_file_path
         if os.path.exists(music_file_path):
             return music_file_path
         else:
             print(f"Music file not found at: {music_file_path}. Please ensure the path is correct in config.ini")
             return None
 
+    def get_playlist_tracks(self, playlist_folder):
+        if not os.path.isdir(playlist_folder):
+            return []
+        return sorted(os.path.join(playlist_folder, file) for file in os.listdir(playlist_folder)
+                      if file.lower().endswith(AUDIO_EXTENSIONS))
 
 
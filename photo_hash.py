@@ -0,0 +1,125 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from photo_index import BUSY_TIMEOUT_SECONDS
+
+# dHash compares HASH_SIZE + 1 columns of HASH_SIZE rows, giving a 64-bit hash
+HASH_SIZE = 8
+
+# Largest SQLite parameter count used per query, below the limit of older SQLite builds
+_QUERY_CHUNK = 500
+
+def dhash_thumbnail(photo_path):
+    """
+    Returns the tiny grayscale thumbnail dHash is computed from, as an int16 array of
+    shape (HASH_SIZE, HASH_SIZE + 1), or None if the photo cannot be read. JPEGs are
+    decoded at 1/8 scale, so this is much cheaper than preparing a video frame.
+    """
+    try:
+        with Image.open(photo_path) as img:
+            img.draft("L", (HASH_SIZE + 1, HASH_SIZE))
+            thumbnail = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+        return np.asarray(thumbnail, dtype=np.int16)
+    except Exception:
+        return None
+
+def dhashes(thumbnails):
+    """Computes the 64-bit dHashes of a stack of thumbnails at once, as an int64 array."""
+    thumbnails = np.asarray(thumbnails)
+    # A bit is set where brightness increases from one column to the next
+    bits = (thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(thumbnails), -1)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64).view(np.int64)
+
+def hamming_distances(photo_hash, hashes):
+    """Returns the Hamming distances between the int64 photo_hash and each of the int64 hashes."""
+    differing = np.asarray(hashes, dtype=np.int64).view(np.uint64) ^ np.int64(photo_hash).view(np.uint64)
+    if hasattr(np, "bitwise_count"): # numpy 2.0+
+        return np.bitwise_count(differing)
+    return np.unpackbits(differing.view(np.uint8).reshape(len(differing), 8), axis=1).sum(axis=1)
+
+def drop_near_duplicates(photo_paths, hashes, max_distance):
+    """
+    Keeps photos in order, dropping each one within max_distance bits of a photo already
+    kept. Photos without a hash (None) are always kept. Each photo is only compared with
+    the kept ones, so memory stays linear in the number of photos.
+    """
+    kept_hashes = np.empty(len(hashes), dtype=np.int64)
+    kept_count = 0
+    kept_paths = []
+    for photo_path, photo_hash in zip(photo_paths, hashes):
+        if photo_hash is not None:
+            if kept_count and hamming_distances(photo_hash, kept_hashes[:kept_count]).min() <= max_distance:
+                continue
+            kept_hashes[kept_count] = photo_hash
+            kept_count += 1
+        kept_paths.append(photo_path)
+    return kept_paths
+
+class PhotoHashCache:
+    """
+    Perceptual hashes of photos, stored in the photo index database.
+
+    Hashes are computed on demand, for the photos of the days that are actually
+    selected, in batches on a thread pool, and stored keyed by path, size and mtime.
+    Once a day's photos are hashed, looking them up again is a single query.
+    """
+
+    def __init__(self, index_db_path, max_workers=None):
+        self.connection = sqlite3.connect(index_db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS photo_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                dhash INTEGER
+            )
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def prune(self):
+        """Deletes the hashes of photos that are no longer in the photo index."""
+        self.connection.execute("DELETE FROM photo_hashes WHERE path NOT IN (SELECT path FROM photos)")
+        self.connection.commit()
+
+    def get_hashes(self, photo_paths):
+        """Returns the dHash of each photo in order, or None for photos that cannot be read."""
+        file_stats = {}
+        for photo_path in photo_paths:
+            try:
+                stat = os.stat(photo_path)
+                file_stats[photo_path] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                pass
+
+        cached = {}
+        paths = list(file_stats)
+        for i in range(0, len(paths), _QUERY_CHUNK):
+            chunk = paths[i:i + _QUERY_CHUNK]
+            query = f"SELECT path, size, mtime, dhash FROM photo_hashes WHERE path IN ({','.join('?' * len(chunk))})"
+            for path, size, mtime, dhash in self.connection.execute(query, chunk):
+                if file_stats[path] == (size, mtime):
+                    cached[path] = dhash
+
+        missing = [path for path in paths if path not in cached]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                thumbnails = list(executor.map(dhash_thumbnail, missing))
+            readable = [i for i, thumbnail in enumerate(thumbnails) if thumbnail is not None]
+            computed = dict.fromkeys(missing)
+            if readable:
+                for i, dhash in zip(readable, dhashes([thumbnails[i] for i in readable])):
+                    computed[missing[i]] = int(dhash)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO photo_hashes (path, size, mtime, dhash) VALUES (?, ?, ?, ?)",
+                [(path,) + file_stats[path] + (dhash,) for path, dhash in computed.items()])
+            self.connection.commit()
+            cached.update(computed)
+        return [cached.get(photo_path) for photo_path in photo_paths]
@@ -0,0 +1,422 @@
+import os
+import fnmatch
+import sqlite3
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from photo_metadata import read_capture_dates
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+# Bump when the meaning of stored columns changes so existing indexes are rebuilt
+SCHEMA_VERSION = 2
+
+# How long a connection waits for another process (e.g. a render farm worker) to finish writing the index
+BUSY_TIMEOUT_SECONDS = 60
+
+# date.toordinal() of 1970-01-01, used to convert ordinals into numpy datetime64 days
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+class DateIndex:
+    """
+    Compact, date-sorted in-memory photo table.
+
+    Capture dates are kept as a sorted int32 array of date ordinals and paths as a single
+    UTF-8 blob with an offsets array, which is several times smaller than a list of
+    (path, date) tuples. Date windows are answered with a binary search over the sorted
+    ordinals, and a secondary month/day bucket table gives the photos taken on a given
+    calendar day in any year without scanning the index.
+    """
+
+    def __init__(self, paths, ordinals):
+        ordinals = np.asarray(ordinals, dtype=np.int32)
+        order = np.argsort(ordinals, kind="stable")
+        self.ordinals = ordinals[order]
+
+        encoded = [paths[i].encode("utf-8") for i in order]
+        self._path_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(p) for p in encoded), dtype=np.int64, count=len(encoded)),
+                  out=self._path_offsets[1:])
+        self._path_blob = b"".join(encoded)
+
+        # Bucket positions by month * 32 + day; the stable sort keeps each bucket in date order
+        days = (self.ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+        months = days.astype("datetime64[M]")
+        keys = (months.astype(np.int64) % 12 + 1) * 32 + (days - months).astype(np.int64) + 1
+        self._month_day_order = np.argsort(keys, kind="stable").astype(np.int32)
+        self._month_day_offsets = np.searchsorted(keys[self._month_day_order], np.arange(13 * 32 + 1))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def path(self, position):
+        return self._path_blob[self._path_offsets[position]:self._path_offsets[position + 1]].decode("utf-8")
+
+    def date(self, position):
+        return datetime.date.fromordinal(int(self.ordinals[position]))
+
+    def paths(self, positions):
+        return [self.path(int(position)) for position in positions]
+
+    def range_bounds(self, start_date, end_date):
+        """Returns the [lo, hi) positions of photos dated within [start_date, end_date]."""
+        lo = int(np.searchsorted(self.ordinals, start_date.toordinal(), side="left"))
+        hi = int(np.searchsorted(self.ordinals, end_date.toordinal(), side="right"))
+        return lo, max(lo, hi)
+
+    def photos_between(self, start_date, end_date):
+        """Returns the paths of all photos dated within [start_date, end_date]."""
+        lo, hi = self.range_bounds(start_date, end_date)
+        return self.paths(range(lo, hi))
+
+    def photos_on_date(self, target_date):
+        return self.photos_between(target_date, target_date)
+
+    def latest_photos_in_window(self, start_date, end_date):
+        """Returns the photos of the most recent day within [start_date, end_date] that has any."""
+        lo, hi = self.range_bounds(start_date, end_date)
+        if lo == hi:
+            return []
+        first = int(np.searchsorted(self.ordinals, self.ordinals[hi - 1], side="left"))
+        return self.paths(range(max(lo, first), hi))
+
+    def month_day_positions(self, month, day):
+        key = month * 32 + day
+        return self._month_day_order[self._month_day_offsets[key]:self._month_day_offsets[key + 1]]
+
+    def photos_on_month_day(self, month, day):
+        """Returns the paths of photos taken on the given calendar day in any year, oldest first."""
+        return self.paths(self.month_day_positions(month, day))
+
+def _matches(patterns, relative_path):
+    """
+    Tells whether relative_path (with / separators) matches one of the glob patterns,
+    ignoring case. Patterns without a / are matched against the last path component only.
+    """
+    name = relative_path.rsplit("/", 1)[-1].lower()
+    for pattern in patterns:
+        target = relative_path.lower() if "/" in pattern else name
+        if fnmatch.fnmatchcase(target, pattern.lower()):
+            return True
+    return False
+
+class PhotoRoot:
+    """
+    A folder of photos to index, with optional include and exclude glob patterns. Photos
+    must match an include pattern if there are any; excluded folders are not scanned at all.
+    """
+
+    def __init__(self, path, include=(), exclude=()):
+        self.path = os.path.abspath(path)
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.path).replace(os.sep, "/")
+
+    def includes_directory(self, path):
+        return path == self.path or not _matches(self.exclude, self._relative(path))
+
+    def includes_file(self, path):
+        relative_path = self._relative(path)
+        if self.include and not _matches(self.include, relative_path):
+            return False
+        return not _matches(self.exclude, relative_path)
+
+    def __repr__(self):
+        return f"PhotoRoot({self.path!r}, include={self.include!r}, exclude={self.exclude!r})"
+
+def _scan_directory(root, directory, known, relist):
+    """
+    Reads one directory of root on the scan thread pool, without touching the database.
+    Returns (mtime, subdirectories, photos). photos is None when the directory is unchanged
+    since known = (mtime, subdirs) and relist is false, in which case it is not listed;
+    otherwise it holds the (path, size, mtime) of the photos root includes.
+    """
+    dir_mtime = os.stat(directory).st_mtime
+    if known is not None and known[0] == dir_mtime and not relist:
+        return dir_mtime, [d for d in known[1].split("\n") if d], None
+
+    subdirs = []
+    photos = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                # The entry's file type comes with the listing, so telling folders from files costs no syscall
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not root.includes_file(entry.path):
+                    continue
+                # Already known from the listing on Windows, a single stat elsewhere
+                stat = entry.stat()
+                photos.append((entry.path, stat.st_size, stat.st_mtime))
+            except OSError as e:
+                print(f"Error processing file {entry.name} for index: {e}")
+    return dir_mtime, subdirs, photos
+
+class PhotoIndex:
+    """
+    On-disk photo index backed by SQLite.
+
+    Every scanned directory is stored with its mtime and its child directories, and
+    every photo with its size, mtime and capture date. On refresh only directories whose
+    mtime changed (a file or subfolder was added, removed or renamed) are listed again;
+    unchanged directories cost a single stat. Edits made in place to an existing file do
+    not touch the directory mtime, so use rebuild=True (--rebuild-index) after those.
+
+    Photos can come from several roots. Directories are read on a thread pool, so a
+    slow network share is scanned alongside the local folders instead of before or
+    after them; the database is only written from the calling thread, in one short
+    transaction at the end, so the scan and the date extraction do not lock out other
+    processes using the same index.
+
+    The stored rows double as the capture-date cache: a file whose (path, size, mtime)
+    is unchanged keeps its date, and only new or modified files are handed to the
+    metadata extraction stage, which runs across a process pool.
+    """
+
+    def __init__(self, photo_roots, index_db_path, metadata_workers=None, scan_workers=None):
+        # A single folder path is accepted for a library with one root
+        if isinstance(photo_roots, str):
+            photo_roots = [PhotoRoot(photo_roots)]
+        self.photo_roots = list(photo_roots)
+        self.index_db_path = index_db_path
+        self.metadata_workers = metadata_workers
+        self.scan_workers = scan_workers
+        os.makedirs(os.path.dirname(os.path.abspath(index_db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(index_db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        # INSERT OR REPLACE only fires the delete trigger that keeps day_counts right with this on
+        self.connection.execute("PRAGMA recursive_triggers = ON")
+        self._create_tables()
+
+    def _create_tables(self):
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript("""
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS photos;
+                DROP TABLE IF EXISTS day_counts;
+            """)
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                subdirs TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS photos (
+                path TEXT PRIMARY KEY,
+                directory TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                capture_date INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS photos_directory ON photos (directory);
+            CREATE INDEX IF NOT EXISTS photos_capture_date ON photos (capture_date);
+            CREATE TABLE IF NOT EXISTS scan_settings (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                roots TEXT NOT NULL
+            );
+        """)
+        # Photos per capture date, kept up to date by triggers so the calendar never counts the photos table
+        counted = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'day_counts'").fetchone()
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS day_counts (
+                capture_date INTEGER PRIMARY KEY,
+                photos INTEGER NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS photos_counted AFTER INSERT ON photos BEGIN
+                INSERT INTO day_counts (capture_date, photos) VALUES (NEW.capture_date, 1)
+                    ON CONFLICT (capture_date) DO UPDATE SET photos = photos + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS photos_uncounted AFTER DELETE ON photos BEGIN
+                UPDATE day_counts SET photos = photos - 1 WHERE capture_date = OLD.capture_date;
+                DELETE FROM day_counts WHERE capture_date = OLD.capture_date AND photos <= 0;
+            END;
+        """)
+        if not counted:
+            # An index from before the counts existed
+            self.connection.execute("INSERT INTO day_counts SELECT capture_date, COUNT(*) FROM photos GROUP BY capture_date")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def clear(self):
+        """Drops every stored directory and photo so the next refresh does a full scan."""
+        self.connection.execute("DELETE FROM directories")
+        self.connection.execute("DELETE FROM photos")
+        self.connection.execute("DELETE FROM day_counts")
+        self.connection.execute("DELETE FROM scan_settings")
+        self.connection.commit()
+
+    def directories(self):
+        """Returns the paths of every indexed directory."""
+        return [path for path, in self.connection.execute("SELECT path FROM directories")]
+
+    def refresh(self, rebuild=False, dirty_directories=(), only_dirty=False):
+        """
+        Brings the stored index up to date with the photo roots and returns the number of photos.
+
+        Directories whose mtime did not change are skipped, except for those in
+        dirty_directories, e.g. reported by a file watcher because a photo in them was
+        modified in place. With only_dirty, for a watcher that reports every change, only
+        dirty_directories and the folders new among their subdirectories are listed and
+        no other directory is even stat'ed. Afterwards self.changed tells whether any
+        photo was added, modified or removed, and self.removed_photos how many were
+        removed (every one of them after a rebuild).
+        """
+        self.removed_photos = 0
+        if rebuild:
+            self.removed_photos = self.connection.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+            self.clear()
+        dirty_directories = set(dirty_directories)
+        changes_before = self.connection.total_changes
+
+        # Changed roots or patterns can include or exclude photos in unchanged directories, so list them all again
+        roots_setting = repr(self.photo_roots)
+        stored = self.connection.execute("SELECT roots FROM scan_settings").fetchone()
+        relist_all = stored is None or stored[0] != roots_setting
+        only_dirty = only_dirty and not relist_all
+
+        known_dirs = {path: (mtime, subdirs) for path, mtime, subdirs in
+                      self.connection.execute("SELECT path, mtime, subdirs FROM directories")}
+        visited = set()
+        rescanned = 0
+        # With only_dirty, the directories that disappeared from a dirty directory, with everything under them
+        gone = []
+        self._pending_photos = []
+        self._pending_directories = []
+        self._deleted_photos = []
+
+        with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+            running = {}
+            def submit(root, directory):
+                if directory in visited or not root.includes_directory(directory):
+                    return
+                visited.add(directory)
+                relist = relist_all or directory in dirty_directories
+                running[executor.submit(_scan_directory, root, directory, known_dirs.get(directory), relist)] = (root, directory)
+
+            if only_dirty:
+                for directory in dirty_directories:
+                    root = self._root_of(directory)
+                    if root is None:
+                        continue
+                    if os.path.isdir(directory):
+                        submit(root, directory)
+                    elif directory != root.path:
+                        gone.append(directory)
+            else:
+                for root in self.photo_roots:
+                    if os.path.isdir(root.path):
+                        submit(root, root.path)
+                    else:
+                        # Keep the photos of a root that is unreachable for now, such as a disconnected drive or share
+                        print(f"Photo folder {root.path} is not available, keeping its indexed photos.")
+                        visited.update(path for path in known_dirs if path == root.path or path.startswith(root.path + os.sep))
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    root, directory = running.pop(future)
+                    try:
+                        dir_mtime, subdirs, photos = future.result()
+                    except OSError as e:
+                        print(f"Error reading directory {directory} for index: {e}")
+                        continue
+                    if photos is not None:
+                        self._update_directory(directory, dir_mtime, subdirs, photos)
+                        rescanned += 1
+                    if only_dirty and directory in known_dirs:
+                        gone.extend(set(known_dirs[directory][1].split("\n")) - set(subdirs) - {""})
+                    for subdir in subdirs:
+                        # Known subdirectories are up to date unless they were reported dirty themselves
+                        if not only_dirty or subdir not in known_dirs:
+                            submit(root, subdir)
+
+        self._store_scan_results()
+
+        if only_dirty:
+            removed = [path for path in known_dirs if path not in visited
+                       and any(path == directory or path.startswith(directory + os.sep) for directory in gone)]
+        else:
+            removed = [path for path in known_dirs if path not in visited]
+        for path in removed:
+            self.connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+            self.removed_photos += self.connection.execute("DELETE FROM photos WHERE directory = ?", (path,)).rowcount
+        # Each rescan rewrites its directory's row; any further change touched photos or removed directories
+        self.changed = self.connection.total_changes - changes_before > rescanned
+        self.connection.execute("INSERT OR REPLACE INTO scan_settings (id, roots) VALUES (0, ?)", (roots_setting,))
+        self.connection.commit()
+
+        count = self.connection.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+        directories = self.connection.execute("SELECT COUNT(*) FROM directories").fetchone()[0]
+        print(f"Photo index refreshed: {rescanned} of {directories} directories rescanned, "
+              f"{len(removed)} removed, {count} photos.")
+        return count
+
+    def _root_of(self, directory):
+        for root in self.photo_roots:
+            if directory == root.path or directory.startswith(root.path + os.sep):
+                return root
+        return None
+
+    def _update_directory(self, directory, dir_mtime, subdirs, photos):
+        """Queues a freshly listed directory to be stored, and its new or modified photos for date extraction."""
+        existing = {path: (size, mtime) for path, size, mtime in self.connection.execute(
+            "SELECT path, size, mtime FROM photos WHERE directory = ?", (directory,))}
+        seen = set()
+        for path, size, mtime in photos:
+            seen.add(path)
+            if existing.get(path) != (size, mtime):
+                self._pending_photos.append((path, directory, size, mtime))
+
+        self._deleted_photos.extend((path,) for path in existing if path not in seen)
+        self._pending_directories.append((directory, dir_mtime, "\n".join(subdirs)))
+
+    def _store_scan_results(self):
+        """
+        Extracts capture dates for every new or modified photo found by the scan, then
+        stores them with the rescanned directories. Nothing is written before the dates
+        are known, so the write lock is only taken for the writes themselves.
+        """
+        ordinals = []
+        if self._pending_photos:
+            print(f"Reading capture dates for {len(self._pending_photos)} new or modified photos...")
+            ordinals = read_capture_dates([(path, mtime) for path, _, _, mtime in self._pending_photos],
+                                          max_workers=self.metadata_workers)
+        self.removed_photos += self.connection.executemany("DELETE FROM photos WHERE path = ?", self._deleted_photos).rowcount
+        self.connection.executemany("INSERT OR REPLACE INTO directories (path, mtime, subdirs) VALUES (?, ?, ?)",
+                                    self._pending_directories)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO photos (path, directory, size, mtime, capture_date) VALUES (?, ?, ?, ?, ?)",
+            [row + (ordinal,) for row, ordinal in zip(self._pending_photos, ordinals)])
+        self._pending_photos = []
+        self._pending_directories = []
+        self._deleted_photos = []
+
+    def day_counts(self):
+        """Returns the number of photos taken on each day that has any, as {date ordinal: count}, without counting them."""
+        return dict(self.connection.execute("SELECT capture_date, photos FROM day_counts"))
+
+    def latest_photos_in_window(self, start_date, end_date):
+        """
+        Same as DateIndex.latest_photos_in_window, answered from the database, so a few
+        lookups can be made without loading the whole index into memory first.
+        """
+        latest, = self.connection.execute("SELECT MAX(capture_date) FROM day_counts WHERE capture_date BETWEEN ? AND ?",
+                                          (start_date.toordinal(), end_date.toordinal())).fetchone()
+        if latest is None:
+            return []
+        return [path for path, in self.connection.execute(
+            "SELECT path FROM photos WHERE capture_date = ? ORDER BY path", (latest,))]
+
+    def load_date_index(self):
+        """Loads every indexed photo into a compact DateIndex."""
+        paths = []
+        ordinals = []
+        for path, ordinal in self.connection.execute("SELECT path, capture_date FROM photos ORDER BY capture_date"):
+            paths.append(path)
+            ordinals.append(ordinal)
+        return DateIndex(paths, ordinals)
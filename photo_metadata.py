@@ -0,0 +1,83 @@
+import os
+import re
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+# EXIF tags holding the capture date, most reliable first
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME_DIGITIZED = 0x9004
+EXIF_DATETIME = 0x0132
+
+# Dates embedded in file names such as photo_20240610_4.png, IMG_20240610_181500.jpg or 2024-06-10 12.30.45.jpg
+FILENAME_DATE_PATTERN = re.compile(r"(?<!\d)((?:19|20)\d{2})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)")
+
+# Below this many files the process pool costs more to start than it saves
+MIN_FILES_FOR_POOL = 64
+
+def _parse_exif_datetime(value):
+    try:
+        return datetime.datetime.strptime(value.strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S").date()
+    except (AttributeError, ValueError):
+        return None
+
+def read_exif_date(file_path):
+    """Reads the EXIF capture date of an image, or None. Image.open only parses the file header."""
+    try:
+        with Image.open(file_path) as img:
+            if img.format == "PNG":
+                # PngImageFile.getexif decodes the pixels to find an eXIf chunk after them; only use the header's
+                exif = Image.Image.getexif(img)
+            else:
+                exif = img.getexif()
+            if not exif:
+                return None
+            exif_ifd = exif.get_ifd(EXIF_IFD_POINTER)
+            for value in (exif_ifd.get(EXIF_DATETIME_ORIGINAL), exif_ifd.get(EXIF_DATETIME_DIGITIZED), exif.get(EXIF_DATETIME)):
+                date = _parse_exif_datetime(value)
+                if date is not None:
+                    return date
+    except Exception:
+        pass
+    return None
+
+def parse_filename_date(file_path):
+    """Extracts a YYYYMMDD / YYYY-MM-DD style date from the file name, or None."""
+    match = FILENAME_DATE_PATTERN.search(os.path.basename(file_path))
+    if not match:
+        return None
+    try:
+        return datetime.date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+def read_capture_date(file_path, mtime):
+    """Returns the best known capture date: EXIF, then the file name, then the modification time."""
+    date = read_exif_date(file_path)
+    if date is None:
+        date = parse_filename_date(file_path)
+    if date is None:
+        date = datetime.datetime.fromtimestamp(mtime).date()
+    return date
+
+def _read_capture_ordinals(batch):
+    return [read_capture_date(file_path, mtime).toordinal() for file_path, mtime in batch]
+
+def read_capture_dates(files, max_workers=None):
+    """
+    Reads capture dates for a list of (path, mtime) pairs and returns their date ordinals in order.
+    Large batches are spread across a process pool in chunks.
+    """
+    if len(files) < MIN_FILES_FOR_POOL or max_workers == 1:
+        return _read_capture_ordinals(files)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(16, min(512, len(files) // (max_workers * 4)))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    ordinals = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_ordinals in executor.map(_read_capture_ordinals, chunks):
+            ordinals.extend(chunk_ordinals)
+    return ordinals
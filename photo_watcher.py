@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks, from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+# After the first change, wait until there has been none for SETTLE_SECONDS (but no longer
+# than SETTLE_MAX_SECONDS) so that copying a batch of photos leads to a single index refresh
+SETTLE_SECONDS = 2.0
+SETTLE_MAX_SECONDS = 30.0
+
+class PollingWatcher:
+    """
+    Reports every poll_seconds that the photo folder may have changed. Works everywhere;
+    PhotoIndex.refresh then only rescans directories whose mtime changed.
+    """
+
+    def __init__(self, poll_seconds):
+        self.poll_seconds = poll_seconds
+        self.next_poll = time.monotonic() + poll_seconds
+
+    def watch(self, directories):
+        pass
+
+    def missed_changes(self):
+        """A poll does not know what changed, so the index always needs a full refresh."""
+        return True
+
+    def wait(self, timeout):
+        """
+        Blocks for up to timeout seconds. Returns the set of directories known to have
+        changed, which is empty when a poll is due, or None if there is nothing to check.
+        """
+        remaining = self.next_poll - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(max(0, remaining))
+        self.next_poll = time.monotonic() + self.poll_seconds
+        return set()
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Watches the photo directories with Linux inotify through libc, so changes are
+    reported as they happen instead of being found by polling. inotify watches are
+    not recursive, so every indexed directory gets its own watch.
+    """
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.watched = {}
+        self.watch_descriptors = {}
+        self.overflowed = False
+
+    def watch(self, directories):
+        """Adds a watch for every directory not watched yet. Raises OSError when the watch limit is reached."""
+        for directory in directories:
+            if directory in self.watch_descriptors:
+                continue
+            descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise OSError(error, f"Cannot watch {directory}: {os.strerror(error)}")
+            self.watched[descriptor] = directory
+            self.watch_descriptors[directory] = descriptor
+
+    def _read_events(self, changed):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            directory = self.watched.get(descriptor)
+            if directory is None:
+                continue
+            changed.add(directory)
+            if mask & IN_IGNORED:
+                # The directory was deleted or moved away; the kernel already dropped the watch
+                del self.watched[descriptor]
+                self.watch_descriptors.pop(directory, None)
+
+    def missed_changes(self):
+        """
+        Returns whether the kernel dropped events of the last changes wait returned because
+        its queue overflowed, so that the index needs a full refresh instead of one of the
+        changed directories only.
+        """
+        return self.overflowed
+
+    def wait(self, timeout):
+        """
+        Blocks for up to timeout seconds. Returns the set of directories in which something
+        changed, or None if nothing did.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        changed = set()
+        self.overflowed = False
+        settle_until = time.monotonic() + SETTLE_MAX_SECONDS
+        while readable and time.monotonic() < settle_until:
+            self._read_events(changed)
+            readable, _, _ = select.select([self.fd], [], [], SETTLE_SECONDS)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(poll_seconds):
+    """Returns an InotifyWatcher on Linux when inotify is available, otherwise a PollingWatcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            print(f"File notifications are not available ({e}), polling for new photos instead.")
+    return PollingWatcher(poll_seconds)
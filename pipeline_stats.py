@@ -0,0 +1,82 @@
+import os
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+
+def clock():
+    """Returns (wall seconds, CPU seconds of the calling thread) to measure a stage from."""
+    return time.perf_counter(), time.thread_time()
+
+def _children_cpu_seconds():
+    # CPU time of finished child processes such as ffmpeg; always 0 on Windows
+    times = os.times()
+    return times.children_user + times.children_system
+
+class PipelineStats:
+    """
+    Accumulates wall time, CPU time and bytes read per pipeline stage.
+
+    Stages run on worker threads (decode, resize_pad) report their own thread's CPU time
+    through record(); stages timed with stage() on the calling thread also include the
+    CPU time of child processes that finished meanwhile, so encoding by ffmpeg is counted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, name, wall_seconds, cpu_seconds, bytes_read=0):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_read": 0, "calls": 0})
+            stage["wall_seconds"] += wall_seconds
+            stage["cpu_seconds"] += cpu_seconds
+            stage["bytes_read"] += bytes_read
+            stage["calls"] += 1
+
+    def merge(self, stages):
+        """Adds the stages of another PipelineStats.to_dict(), e.g. one returned by a worker process."""
+        with self.lock:
+            for name, other in stages.items():
+                stage = self.stages.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_read": 0, "calls": 0})
+                for field in stage:
+                    stage[field] += other[field]
+
+    def record(self, name, started, bytes_read=0):
+        """Adds the time elapsed since the clock() reading started and returns a new reading."""
+        now = clock()
+        self.add(name, now[0] - started[0], now[1] - started[1], bytes_read)
+        return now
+
+    @contextmanager
+    def stage(self, name, bytes_read=0):
+        started = clock()
+        children_started = _children_cpu_seconds()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - started[0]
+            cpu_seconds = time.thread_time() - started[1] + _children_cpu_seconds() - children_started
+            self.add(name, wall_seconds, cpu_seconds, bytes_read)
+
+    def to_dict(self):
+        with self.lock:
+            return {name: dict(stage) for name, stage in self.stages.items()}
+
+def write_report(output_dir, run_stats, slideshow_stats):
+    """
+    Writes the run's stage timings and those of every slideshow as a JSON report in
+    output_dir and returns its path. slideshow_stats maps output file names to stats dicts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    now = datetime.datetime.now()
+    report = {
+        "created": now.isoformat(timespec="seconds"),
+        "run": run_stats,
+        "slideshows": slideshow_stats,
+    }
+    report_path = os.path.join(output_dir, f"pipeline_report_{now.strftime('%H%M%S')}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report_path
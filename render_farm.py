@@ -0,0 +1,425 @@
+import os
+import json
+import time
+import socket
+import datetime
+import threading
+import multiprocessing
+from collections import deque
+
+from config_manager import load_config
+from pipeline_stats import PipelineStats
+
+# Workers report while rendering every HEARTBEAT_SECONDS; one silent for HEARTBEAT_TIMEOUT is considered dead
+HEARTBEAT_SECONDS = 5
+HEARTBEAT_TIMEOUT = 30
+
+# A job whose worker died is given to another worker until it has been started this many times
+MAX_ATTEMPTS = 3
+
+# How long a worker waits before connecting again after losing the coordinator
+RECONNECT_SECONDS = 5
+
+# Workers refresh the photo index of a library before a job if it is older than this
+INDEX_REFRESH_SECONDS = 300
+
+# Job statuses that will not change any more
+FINISHED_STATUSES = ("rendered", "up_to_date", "no_photos", "no_valid_photos", "failed")
+
+def parse_address(address):
+    """
+    Returns (socket family, address) for "host:port", or for the path of a Unix socket
+    (anything containing a slash, or prefixed with "unix:").
+    """
+    if address.startswith("unix:") or "/" in address:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError(f"Unix sockets are not available on this system, use HOST:PORT instead of {address!r}")
+        return socket.AF_UNIX, address[len("unix:"):] if address.startswith("unix:") else address
+    host, _, port = address.rpartition(":")
+    try:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    except ValueError:
+        raise ValueError(f"Invalid farm address {address!r}, expected HOST:PORT or the path of a Unix socket") from None
+
+def connect(address):
+    family, target = parse_address(address)
+    connection = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        connection.connect(target)
+    except OSError:
+        connection.close()
+        raise
+    return connection
+
+def send_message(connection, message):
+    """Sends one message, a JSON object on a line of its own."""
+    connection.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+class MessageReader:
+    """Reads the newline-delimited JSON messages of a connection, one at a time."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = b""
+
+    def read(self, timeout=None):
+        """
+        Returns the next message, or None once the other side has closed the connection.
+        Raises socket.timeout if no complete message arrives within timeout seconds.
+        """
+        self.connection.settimeout(timeout)
+        while b"\n" not in self.buffer:
+            data = self.connection.recv(65536)
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+def _job_label(job):
+    return f"{os.path.basename(job['config_path'])} {job['date']} {job['year_offset']}y"
+
+class RenderCoordinator:
+    """
+    Hands out render jobs to the workers connected to it, over TCP or a Unix socket.
+
+    A job is a config path, a date and a year offset: one slideshow, rendered by a
+    worker exactly as the daily run of that config would render it on that day. Each
+    worker takes one job at a time. While rendering it sends a heartbeat every few
+    seconds; if it disconnects or goes silent, its job goes back to the front of the
+    queue for another worker, up to MAX_ATTEMPTS starts. A job that fails with an error
+    is not retried. Every job records when it was queued, started and finished.
+
+    Clients submit jobs and wait for them on their own connections (see submit_jobs).
+    There is no authentication: listen on localhost or a trusted network only.
+    """
+
+    def __init__(self, address, heartbeat_timeout=HEARTBEAT_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.address = address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.jobs = {}
+        self.queue = deque()
+        self.next_job_id = 1
+        self.condition = threading.Condition()
+        self.closed = False
+        self.listener = None
+
+    def listen(self):
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.remove(target) # Left behind by a coordinator that did not shut down cleanly
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(target)
+            self.listener.listen()
+        else:
+            self.listener = socket.create_server(target)
+        return self.listener.getsockname()
+
+    def serve_forever(self):
+        """Accepts connections until close() is called, serving each on a thread of its own."""
+        if self.listener is None:
+            self.listen()
+        print(f"Render farm coordinator listening on {self.address}.")
+        while not self.closed:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.listener is not None:
+            family, target = parse_address(self.address)
+            self.listener.close()
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.remove(target)
+
+    def submit(self, job_specs):
+        """Queues jobs given as dicts of config_path, date (YYYY-MM-DD), year_offset and force; returns their ids."""
+        # Checked before any is queued, so a request with an invalid job queues none of them
+        specs = [(str(spec["config_path"]), datetime.date.fromisoformat(spec["date"]).isoformat(), int(spec["year_offset"]),
+                  bool(spec.get("force", False))) for spec in job_specs]
+        job_ids = []
+        with self.condition:
+            for config_path, date, year_offset, force in specs:
+                job = {
+                    "id": self.next_job_id,
+                    "config_path": config_path,
+                    "date": date,
+                    "year_offset": year_offset,
+                    "force": force,
+                    "status": "queued",
+                    "attempts": 0,
+                    "worker": None,
+                    "queued_at": time.time(),
+                    "started_at": None,
+                    "finished_at": None,
+                    "render_seconds": None,
+                    "output_paths": [],
+                    "error": None,
+                    "stages": {},
+                }
+                self.jobs[job["id"]] = job
+                self.queue.append(job["id"])
+                job_ids.append(job["id"])
+                self.next_job_id += 1
+            self.condition.notify_all()
+        return job_ids
+
+    def wait(self, job_ids):
+        """Blocks until every job of job_ids has finished and returns copies of them."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or all(self.jobs[job_id]["status"] in FINISHED_STATUSES for job_id in job_ids))
+            return [dict(self.jobs[job_id]) for job_id in job_ids]
+
+    def _serve_connection(self, connection):
+        reader = MessageReader(connection)
+        try:
+            hello = reader.read(timeout=self.heartbeat_timeout)
+            if hello is None:
+                return
+            if hello["type"] == "worker":
+                self._serve_worker(connection, reader, hello["name"])
+            elif hello["type"] == "submit":
+                job_ids = self.submit(hello["jobs"])
+                send_message(connection, {"type": "submitted", "job_ids": job_ids})
+                if hello.get("wait"):
+                    send_message(connection, {"type": "finished", "jobs": self.wait(job_ids)})
+            elif hello["type"] == "status":
+                with self.condition:
+                    jobs = [dict(job) for job in self.jobs.values()]
+                send_message(connection, {"type": "status", "jobs": jobs})
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Invalid render farm request: {e!r}")
+            try:
+                send_message(connection, {"type": "error", "error": f"invalid request: {e!r}"})
+            except OSError:
+                pass
+        except OSError as e:
+            print(f"Render farm connection dropped: {e}")
+        finally:
+            connection.close()
+
+    def _next_job(self):
+        """Waits for a queued job and marks it running; returns None when the coordinator closes or after a heartbeat interval."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or self.queue, timeout=HEARTBEAT_SECONDS)
+            if self.closed or not self.queue:
+                return None
+            job = self.jobs[self.queue.popleft()]
+            job["status"] = "running"
+            return dict(job)
+
+    def _serve_worker(self, connection, reader, worker_name):
+        print(f"Render farm worker {worker_name} connected.")
+        job_id = None
+        started = False
+        try:
+            while not self.closed:
+                job = self._next_job()
+                if job is None:
+                    # Idle workers are pinged so that one that went away is noticed
+                    send_message(connection, {"type": "ping"})
+                    continue
+                job_id = job["id"]
+                started = False
+                send_message(connection, {"type": "job", "job": job})
+                while True:
+                    message = reader.read(timeout=self.heartbeat_timeout)
+                    if message is None:
+                        raise ConnectionError("connection closed")
+                    if message["type"] == "started":
+                        started = True
+                        with self.condition:
+                            self.jobs[job_id].update(attempts=self.jobs[job_id]["attempts"] + 1, worker=worker_name,
+                                                     started_at=time.time())
+                    elif message["type"] == "result":
+                        self._finish(job_id, message)
+                        job_id = None
+                        break
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Render farm worker {worker_name} lost: {e or type(e).__name__}")
+            if job_id is not None:
+                self._requeue(job_id, started)
+
+    def _finish(self, job_id, result):
+        with self.condition:
+            job = self.jobs[job_id]
+            job.update(status=result["status"], finished_at=time.time(), render_seconds=result.get("seconds"),
+                       output_paths=result.get("output_paths", []), error=result.get("error"), stages=result.get("stages", {}))
+            self.condition.notify_all()
+        waited = job["started_at"] - job["queued_at"]
+        print(f"Job {job_id} ({_job_label(job)}) {job['status']} on {job['worker']} in {job['render_seconds'] or 0:.1f} s "
+              f"after waiting {waited:.1f} s (attempt {job['attempts']}).")
+
+    def _requeue(self, job_id, started):
+        """Puts the job of a lost worker back at the front of the queue, or fails it after max_attempts starts."""
+        with self.condition:
+            job = self.jobs[job_id]
+            if started and job["attempts"] >= self.max_attempts:
+                job.update(status="failed", finished_at=time.time(), error=f"worker lost {job['attempts']} times")
+                print(f"Job {job_id} ({_job_label(job)}) failed: its worker was lost {job['attempts']} times.")
+            else:
+                job["status"] = "queued"
+                self.queue.appendleft(job_id)
+                print(f"Job {job_id} ({_job_label(job)}) queued again.")
+            self.condition.notify_all()
+
+def _read_reply(reader):
+    reply = reader.read()
+    if reply is None:
+        raise ConnectionError("the coordinator closed the connection")
+    if reply["type"] == "error":
+        raise ValueError(reply["error"])
+    return reply
+
+def submit_jobs(address, job_specs, wait=True):
+    """
+    Submits jobs (see RenderCoordinator.submit) to the coordinator at address. With
+    wait=True, blocks until they have all finished and returns them with their timings;
+    otherwise returns their ids.
+    """
+    connection = connect(address)
+    try:
+        reader = MessageReader(connection)
+        send_message(connection, {"type": "submit", "jobs": job_specs, "wait": wait})
+        reply = _read_reply(reader)
+        if not wait:
+            return reply["job_ids"]
+        return _read_reply(reader)["jobs"]
+    finally:
+        connection.close()
+
+def daily_jobs(config_file_path, day, force=False):
+    """Returns the jobs of one day's slideshows of a config, one per year offset it is set up for."""
+    config_file_path = os.path.abspath(config_file_path)
+    return [{"config_path": config_file_path, "date": day.isoformat(), "year_offset": year_offset, "force": force}
+            for year_offset in load_config(config_file_path).years_back]
+
+class RenderWorker:
+    """
+    Connects to a coordinator and renders the jobs it hands out, one at a time, while a
+    background thread sends heartbeats. Config paths in jobs must be valid on this
+    machine. The generator of each config, with its photo index, is kept between jobs,
+    and rebuilt when the config changes or its index is older than INDEX_REFRESH_SECONDS.
+    Workers started together share index_lock, so one of them refreshes a library's
+    index while the others wait and then find it up to date.
+    """
+
+    def __init__(self, address, name=None, index_lock=None):
+        self.address = address
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.generators = {}
+        self.send_lock = threading.Lock()
+        self.index_lock = index_lock or threading.Lock()
+
+    def run_forever(self):
+        while True:
+            try:
+                connection = connect(self.address)
+            except OSError as e:
+                print(f"Render farm worker {self.name} cannot reach {self.address} ({e}), retrying in {RECONNECT_SECONDS} s.")
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            try:
+                self._serve(connection)
+            except (OSError, ValueError) as e:
+                print(f"Render farm worker {self.name} lost the coordinator ({e}).")
+            finally:
+                connection.close()
+            time.sleep(RECONNECT_SECONDS)
+
+    def _send(self, connection, message):
+        with self.send_lock:
+            send_message(connection, message)
+
+    def _serve(self, connection):
+        reader = MessageReader(connection)
+        self._send(connection, {"type": "worker", "name": self.name})
+        while True:
+            message = reader.read()
+            if message is None:
+                raise ConnectionError("connection closed")
+            if message["type"] != "job":
+                continue
+            job = message["job"]
+            self._send(connection, {"type": "started", "job_id": job["id"]})
+            finished = threading.Event()
+            heartbeat = threading.Thread(target=self._send_heartbeats, args=(connection, job["id"], finished), daemon=True)
+            heartbeat.start()
+            try:
+                result = self.render(job)
+            finally:
+                finished.set()
+                heartbeat.join()
+            self._send(connection, dict(result, type="result", job_id=job["id"]))
+
+    def _send_heartbeats(self, connection, job_id, finished):
+        while not finished.wait(HEARTBEAT_SECONDS):
+            try:
+                self._send(connection, {"type": "heartbeat", "job_id": job_id})
+            except OSError:
+                break
+
+    def _generator(self, config_file_path):
+        from slideshow_generator import SlideshowGenerator
+
+        cached = self.generators.get(config_file_path)
+        if (cached is None or load_config(config_file_path).fingerprint() != cached[0].config.fingerprint()
+                or time.monotonic() - cached[1] > INDEX_REFRESH_SECONDS):
+            with self.index_lock:
+                cached = (SlideshowGenerator(config_file_path), time.monotonic())
+            self.generators[config_file_path] = cached
+        return cached[0]
+
+    def render(self, job):
+        """Renders one job and returns its result: status, seconds, output_paths, error and stages."""
+        started = time.perf_counter()
+        stats = PipelineStats()
+        output_paths = []
+        error = None
+        try:
+            generator = self._generator(job["config_path"])
+            day = datetime.date.fromisoformat(job["date"])
+            year_offset = job["year_offset"]
+            photos = generator.select_photos_for_year(year_offset, stats=stats, day=day)
+            output_filename = generator.slideshow_filename(year_offset)
+            seed = generator.slideshow_seed(year_offset, day)
+            if not photos:
+                status = "no_photos"
+            elif not job["force"] and generator.is_slideshow_up_to_date(photos, output_filename, seed, day):
+                status = "up_to_date"
+            else:
+                output_path = generator.create_slideshow(photos, output_filename=output_filename, stats=stats, seed=seed, day=day)
+                status = "rendered" if output_path else "no_valid_photos"
+                if output_path:
+                    output_paths.append(output_path)
+        except Exception as e:
+            print(f"Error rendering job {job['id']} ({_job_label(job)}): {e}")
+            status = "failed"
+            error = str(e)
+        return {"status": status, "seconds": time.perf_counter() - started, "output_paths": output_paths,
+                "error": error, "stages": stats.to_dict()}
+
+def _run_worker(address, name, index_lock=None):
+    RenderWorker(address, name, index_lock).run_forever()
+
+def run_workers(address, count=1):
+    """Runs count workers connected to the coordinator at address, each in a process of its own, until interrupted."""
+    if count == 1:
+        _run_worker(address, None)
+        return
+    host = socket.gethostname()
+    index_lock = multiprocessing.Lock()
+    # Not daemonic, so that their renders can start process pools of their own
+    processes = [multiprocessing.Process(target=_run_worker, args=(address, f"{host}-{number}", index_lock))
+                 for number in range(1, count + 1)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,42 @@
+import os
+import json
+
+# Bump when rendering changes in a way that should replace slideshows rendered before
+RENDER_VERSION = 1
+
+def manifest_path(output_path):
+    return output_path + ".manifest.json"
+
+def build_manifest(photo_paths, seed, settings):
+    """
+    Describes everything a slideshow is rendered from: the photos with their size and
+    mtime, the random seed and the video/audio settings. Raises OSError if a photo is gone.
+    """
+    photos = []
+    for photo_path in photo_paths:
+        stat = os.stat(photo_path)
+        photos.append({"path": os.path.abspath(photo_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+    return {"version": RENDER_VERSION, "seed": seed, "settings": settings, "photos": photos}
+
+def is_up_to_date(output_path, manifest):
+    """
+    Returns whether output_path was rendered from exactly the inputs in manifest and has
+    not been replaced or truncated since, judged by the size and mtime stored with it.
+    """
+    try:
+        with open(manifest_path(output_path)) as f:
+            stored = json.load(f)
+        stat = os.stat(output_path)
+    except (OSError, ValueError):
+        return False
+    output = stored.pop("output", None)
+    return stored == manifest and output == {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def write_manifest(output_path, manifest):
+    """Stores manifest next to the freshly rendered output_path, together with its size and mtime."""
+    stat = os.stat(output_path)
+    stored = dict(manifest, output={"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+    temp_path = f"{manifest_path(output_path)}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(stored, f, indent=2)
+    os.replace(temp_path, manifest_path(output_path))
@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from slideshow_generator import SlideshowGenerator
+from pipeline_stats import PipelineStats
+
+# One generator per worker process, created without a photo index since jobs carry their photos
+_worker_generator = None
+
+def _init_worker(config_file_path, frame_workers, preview):
+    global _worker_generator
+    _worker_generator = SlideshowGenerator(config_file_path, load_index=False, preview=preview)
+    if _worker_generator.frame_workers is None:
+        _worker_generator.frame_workers = frame_workers
+
+def _render_job(photo_paths, output_filename, seed, day):
+    stats = PipelineStats()
+    _worker_generator.create_slideshow(photo_paths, output_filename=output_filename, stats=stats, seed=seed, day=day)
+    return stats.to_dict()
+
+def render_slideshows(config_file_path, jobs, max_workers, memory_budget_bytes=None, on_finished=None, preview=False):
+    """
+    Renders (photo_paths, output_filename, seed, day, estimated_bytes) jobs on a process pool.
+
+    A job is only started while the estimated memory of all running jobs plus its own
+    stays within memory_budget_bytes; one job is always allowed to run so an oversized
+    job still completes. Errors are reported per job and do not stop the others.
+    on_finished(job_index, stats) is called as each job ends, with stats None if it failed.
+    With preview=True the workers render previews (see SlideshowGenerator).
+    Returns the stage timings of every finished job, keyed by its index in jobs.
+    """
+    # Share the cores between the renders instead of giving each one a full decode pool
+    frame_workers = max(1, (os.cpu_count() or 1) // max_workers)
+    pending = list(enumerate(jobs))
+    running = {}
+    job_stats = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(config_file_path, frame_workers, preview)) as executor:
+        while pending or running:
+            in_use = sum(estimated_bytes for _, estimated_bytes in running.values())
+            while pending and len(running) < max_workers:
+                job_index, (photo_paths, output_filename, seed, day, estimated_bytes) = pending[0]
+                if running and memory_budget_bytes and in_use + estimated_bytes > memory_budget_bytes:
+                    break
+                pending.pop(0)
+                future = executor.submit(_render_job, photo_paths, output_filename, seed, day)
+                running[future] = (job_index, estimated_bytes)
+                in_use += estimated_bytes
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_index, _ = running.pop(future)
+                try:
+                    job_stats[job_index] = future.result()
+                except Exception as e:
+                    print(f"Error rendering {jobs[job_index][1]}: {e}")
+                if on_finished is not None:
+                    on_finished(job_index, job_stats.get(job_index))
+    return job_stats
@@ -44,6 +44,31 @@ class Scheduler:
         except FileNotFoundError:
             raise Exception("schtasks command not found. This feature is only available on Windows.")
 
+    def create_service_task(self, task_name, script_path):
+        """
+        Registers a task that starts the app in --service mode when the user logs on, as an
+        alternative to the daily --run-slideshow task. The service renders at schedule_time itself.
+        """
+        command = [
+            "schtasks",
+            "/create",
+            "/tn", task_name,
+            "/tr", f"\"{script_path}\" --service",
+            "/sc", "onlogon",
+            "/f",
+            "/rl", "HIGHEST"
+        ]
+
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, check=True, shell=True)
+            print(f"Task scheduling output: {result.stdout}")
+            if result.stderr:
+                print(f"Task scheduling error: {result.stderr}")
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Error scheduling task: {e.stderr}")
+        except FileNotFoundError:
+            raise Exception("schtasks command not found. This feature is only available on Windows.")
+
     def delete_task(self, task_name):
         command = [
             "schtasks",
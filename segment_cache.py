@@ -0,0 +1,49 @@
+import os
+import hashlib
+
+from frame_cache import evict_least_recently_used
+
+# Bump when the way segments are rendered changes so stale segments are not reused
+SEGMENT_FORMAT_VERSION = 1
+
+class SegmentCache:
+    """
+    Disk cache of encoded per-photo video segments.
+
+    A segment is keyed by the photo's path, size and mtime, its animation and every
+    setting that affects the encoded stream (resolution, fps, frame count, codec,
+    bitrate), so the same photo with the same animation is encoded only once across
+    year offsets and days. FfmpegWriter writes a segment under a temporary name that
+    eviction does not match and renames it when complete, so a crash never leaves a
+    truncated segment behind a valid key, and no process evicts one being written.
+    """
+
+    def __init__(self, cache_dir, max_bytes, video_format):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = "." + video_format
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, photo_path, animation_type, settings):
+        stat = os.stat(photo_path)
+        key = f"{os.path.abspath(photo_path)}|{stat.st_size}|{stat.st_mtime_ns}|{animation_type}|{settings}|{SEGMENT_FORMAT_VERSION}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def segment_path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def contains(self, key):
+        """Returns whether a finished segment exists for key, refreshing its mtime if it does."""
+        try:
+            os.utime(self.segment_path(key))
+        except OSError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def evict(self):
+        """Deletes least recently used segments until the cache is back under 90% of max_bytes."""
+        evict_least_recently_used(self.cache_dir, self.suffix, self.max_bytes * 0.9)
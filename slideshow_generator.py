@@ -1,36 +1,70 @@
 import os
 import datetime
 import random
-import numpy as np
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip
-from config_manager import ConfigManager
+from concurrent.futures import ThreadPoolExecutor, wait
+from config_manager import load_config
 from music_downloader import MusicDownloader
+from photo_index import PhotoIndex, PhotoRoot
+from photo_hash import PhotoHashCache, drop_near_duplicates
+from frame_loader import FrameLoader
+from frame_slots import ProcessFrameLoader
+from frame_cache import FrameCache
+from segment_cache import SegmentCache
+from audio_stage import AudioStage
+from render_manifest import build_manifest, is_up_to_date, write_manifest
+from pipeline_stats import PipelineStats, clock
+from frame_engine import (ANIMATION_TYPES, ENCODER_PROFILES, MOTION_AMOUNT, FfmpegWriter, concat_segments, crop_windows,
+                          discard_partial_output, mux_audio, muxer_for, oversized_resolution, partial_output_path,
+                          synthesize_frames)
 
+import numpy as np
 from PIL import Image
-from pkg_resources import parse_version
 
-# Handle Pillow 10.0.0+ compatibility for Image.ANTIALIAS
-if parse_version(Image.__version__) >= parse_version("10.0.0"):
+# Handle Pillow 10.0.0+ compatibility for Image.ANTIALIAS, which MoviePy's resize still uses
+if not hasattr(Image, "ANTIALIAS"):
     Image.ANTIALIAS = Image.LANCZOS
 
+# Interpreter, MoviePy and encoder memory that every render needs regardless of photo count
+RENDER_BASE_MEMORY = 300 * 1024 * 1024
+
+# Preview renders fit the video into this many pixels on its longer side, at no more than PREVIEW_FPS
+PREVIEW_MAX_SIDE = 640
+PREVIEW_FPS = 12
+
 class SlideshowGenerator:
-    def __init__(self, config_file_path):
-        self.config_manager = ConfigManager(config_file_path)
-        self.photo_folder_path = self.config_manager.get_config("AppConfig", "photo_folder_path")
-        self.years_back = [int(y) for y in self.config_manager.get_config("AppConfig", "years_back").split(",")]
-        self.random_photos_limit = int(self.config_manager.get_config("AppConfig", "random_photos_limit"))
-        self.photo_display_seconds = int(self.config_manager.get_config("AppConfig", "photo_display_seconds"))
-        self.slideshow_output_folder = self.config_manager.get_config("AppConfig", "slideshow_output_folder")
-        self.video_format = self.config_manager.get_config("VideoConfig", "video_format")
-        self.video_codec = self.config_manager.get_config("VideoConfig", "video_codec")
-        self.video_fps = int(self.config_manager.get_config("VideoConfig", "video_fps"))
-        self.video_bitrate = self.config_manager.get_config("VideoConfig", "video_bitrate")
-        resolution_str = self.config_manager.get_config("VideoConfig", "video_resolution").split("x")
-        self.video_resolution = (int(resolution_str[0]), int(resolution_str[1]))
+    def __init__(self, config_file_path, rebuild_index=False, load_index=True, preview=False):
+        self.config_file_path = config_file_path
+        self.config = load_config(config_file_path)
+        self.photo_folder_path = self.config.photo_folder_path
+        self.photo_roots = [PhotoRoot(path, include, exclude) for path, include, exclude in self.config.photo_roots]
+        self.years_back = self.config.years_back
+        self.random_photos_limit = self.config.random_photos_limit
+        self.photo_display_seconds = self.config.photo_display_seconds
+        self.near_duplicate_distance = self.config.near_duplicate_distance
+        self.slideshow_output_folder = self.config.slideshow_output_folder
+        self.video_format = self.config.video_format
+        self.video_codec = self.config.video_codec
+        self.video_fps = self.config.video_fps
+        self.video_bitrate = self.config.video_bitrate
+        self.video_resolution = self.config.video_resolution
+        self.render_engine = self.config.render_engine
+        self.frame_workers = self.config.frame_workers
+        self.frame_loader = self.config.frame_loader
+        self.encoder_profile = self._read_encoder_profile()
+        # Copies of every slideshow at other sizes or encodings, rendered from the same frames; not made for previews
+        self.output_variants = [] if preview else [self._read_output_variant(variant) for variant in self.config.output_variants]
+        self.preview = preview
+        if preview:
+            self._apply_preview_settings()
+        elif self.output_variants and self.render_engine != "numpy":
+            # Only the numpy engine can feed several encoders from one decode and animation pass
+            print(f"Output variants are configured, so slideshows are rendered with the numpy engine "
+                  f"instead of render_engine = {self.render_engine}.")
+            self.render_engine = "numpy"
         self.music_downloader = MusicDownloader(config_file_path)
         
         # Configure MoviePy temporary directory
-        self.moviepy_temp_dir = self.config_manager.get_config("MoviePyConfig", "moviepy_temp_dir")
+        self.moviepy_temp_dir = self.config.moviepy_temp_dir
         if not self.moviepy_temp_dir:
             # Default to a subfolder in slideshow_output_folder if not specified
             self.moviepy_temp_dir = os.path.join(self.slideshow_output_folder, "MoviePy_temp")
@@ -39,147 +73,590 @@ class SlideshowGenerator:
         os.environ["TEMP"] = self.moviepy_temp_dir
         os.environ["TMP"] = self.moviepy_temp_dir
 
-        # Build the photo index once upon initialization
-        self.photo_index = self._build_photo_index()
+        # Prepared photos are cached next to the MoviePy temp files; a size of 0 disables the cache
+        if self.config.frame_cache_max_mb > 0:
+            self.frame_cache = FrameCache(os.path.join(self.moviepy_temp_dir, "frame_cache"), self.config.frame_cache_max_mb * 1024 * 1024)
+        else:
+            self.frame_cache = None
+
+        # Encoded per-photo segments for the "segments" render engine
+        self.segment_cache = SegmentCache(os.path.join(self.moviepy_temp_dir, "segments"),
+                                          self.config.segment_cache_max_mb * 1024 * 1024, self.video_format)
+
+        # Decoded music and per-duration AAC tracks, shared by every slideshow of the run
+        self.audio_stage = AudioStage(os.path.join(self.moviepy_temp_dir, "audio_cache"))
+
+        # The persistent index lives next to the MoviePy temp files unless configured otherwise
+        self.index_db_path = self.config.index_db_path or os.path.join(self.moviepy_temp_dir, "photo_index.sqlite3")
+        self.metadata_workers = self.config.metadata_workers
+        self.scan_workers = self.config.scan_workers
+
+        # Build the photo index once upon initialization; render-only workers skip it
+        self.run_stats = PipelineStats()
+        self.photo_index = None
+        self.photo_hashes = None
+        if load_index:
+            with self.run_stats.stage("index_build"):
+                self.photo_index = self._build_photo_index(rebuild_index)
 
-    def _build_photo_index(self):
-        """Scans the photo directory and builds an in-memory index of photos and their dates."""
-        index = []
+    def _read_encoder_profile(self):
+        """Returns the configured encoder profile, with any encoder_* settings overriding its values."""
+        name = self.config.encoder_profile
+        if name not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown encoder_profile '{name}', expected one of: {', '.join(ENCODER_PROFILES)}")
+        return dict(ENCODER_PROFILES[name], name=name, **self.config.encoder_overrides)
+
+    def _read_output_variant(self, variant):
+        """Resolves an [OutputVariant] section's encoder profile name into its settings."""
+        name = variant["encoder_profile"]
+        if name is None:
+            return dict(variant, encoder_profile=self.encoder_profile)
+        if name not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown encoder_profile '{name}' in [OutputVariant {variant['name']}], "
+                             f"expected one of: {', '.join(ENCODER_PROFILES)}")
+        return dict(variant, encoder_profile=dict(ENCODER_PROFILES[name], name=name))
+
+    def _apply_preview_settings(self):
+        """Switches to a small, low frame rate, fast-encoding render for quickly checking the photo selection."""
+        width, height = self.video_resolution
+        scale = min(1.0, PREVIEW_MAX_SIDE / max(width, height))
+        # Even dimensions, which yuv420p needs
+        self.video_resolution = (max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2))
+        self.video_fps = min(self.video_fps, PREVIEW_FPS)
+        self.encoder_profile = dict(ENCODER_PROFILES["preview"], name="preview")
+        # Cutting frames out of the photos is the fastest engine, and previews do not need cached segments
+        self.render_engine = "numpy"
+
+    def _build_photo_index(self, rebuild=False):
+        """Refreshes the on-disk photo index and loads the photos and their dates into memory."""
         print("Building photo index...")
-        for root, _, files in os.walk(self.photo_folder_path):
-            for file in files:
-                try:
-                    # Check for common image file extensions
-                    if file.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif")):
-                        file_path = os.path.join(root, file)
-                        timestamp = os.path.getmtime(file_path)
-                        file_date = datetime.datetime.fromtimestamp(timestamp).date()
-                        index.append((file_path, file_date))
-                except Exception as e:
-                    print(f"Error processing file {file} for index: {e}")
+        store = PhotoIndex(self.photo_roots, self.index_db_path, metadata_workers=self.metadata_workers,
+                           scan_workers=self.scan_workers)
+        try:
+            store.refresh(rebuild=rebuild)
+            if store.removed_photos:
+                self.prune_photo_hashes()
+            index = store.load_date_index()
+        finally:
+            store.close()
         print(f"Photo index built with {len(index)} items.")
         return index
 
+    def prune_photo_hashes(self):
+        """Deletes the stored hashes of photos that are no longer in the photo index."""
+        photo_hashes = self.photo_hashes or PhotoHashCache(self.index_db_path)
+        try:
+            photo_hashes.prune()
+        finally:
+            if photo_hashes is not self.photo_hashes:
+                photo_hashes.close()
+
     def get_photos_for_date(self, target_date):
         """Gets photos for a specific date by querying the in-memory index."""
-        photos = []
-        for file_path, file_date in self.photo_index:
-            if file_date.year == target_date.year and file_date.month == target_date.month and file_date.day == target_date.day:
-                photos.append(file_path)
-        return photos
+        return self.photo_index.photos_on_date(target_date)
 
-    def select_photos_for_year(self, year_offset):
-        selected_photos = []
-        today = datetime.date.today()
+    def _target_date(self, year_offset, day=None):
+        day = day or datetime.date.today()
+        try:
+            return day.replace(year=day.year - year_offset)
+        except ValueError: # 29 February in a year that is not a leap year
+            return day.replace(year=day.year - year_offset, day=28)
+
+    def slideshow_seed(self, year_offset, day=None):
+        """
+        Random seed for the photo selection and animations of one year offset. It only
+        depends on the date, so reruns on the same day make the same slideshow.
+        """
+        return self._target_date(year_offset, day).toordinal()
 
-        target_date = today.replace(year=today.year - year_offset)
-        photos_found = []
-        days_offset = 0
-        while not photos_found and days_offset < 7: # Try up to 7 previous days for fallback
-            current_target_date = target_date - datetime.timedelta(days=days_offset)
-            photos_found = self.get_photos_for_date(current_target_date)
-            if not photos_found:
-                days_offset += 1
+    def slideshow_filename(self, year_offset):
+        # New Naming convention: [Memories_This_Week_X_year(s)_back]
+        year_suffix = "year" if year_offset == 1 else "years"
+        preview_suffix = "_preview" if self.preview else ""
+        return f"Memories_This_Week_{year_offset}_{year_suffix}_back{preview_suffix}.mp4"
+
+    def variant_filename(self, output_filename, variant):
+        """Returns the file name of an output variant's copy of output_filename, e.g. ..._back_landscape.mp4."""
+        return f"{os.path.splitext(output_filename)[0]}_{variant['name']}.{variant['format']}"
+
+    def select_photos_for_year(self, year_offset, stats=None, day=None):
+        """
+        Picks up to random_photos_limit photos taken year_offset years before day (today by
+        default), or in the 6 days before that if there are none on the day itself.
+        """
+        started = clock()
+        selected_photos = []
+        target_date = self._target_date(year_offset, day)
+        # Fall back up to 6 days earlier: take the most recent day in the window that has photos
+        photos_found = self.photo_index.latest_photos_in_window(target_date - datetime.timedelta(days=6), target_date)
 
         if photos_found:
-            random.shuffle(photos_found)
+            # Sorted first so the seeded shuffle does not depend on the order of the index
+            photos_found.sort()
+            random.Random(self.slideshow_seed(year_offset, day)).shuffle(photos_found)
+            if self.near_duplicate_distance > 0 and len(photos_found) > 1:
+                photos_found = self._drop_near_duplicates(photos_found)
             selected_photos.extend(photos_found[:self.random_photos_limit])
+        if stats is not None:
+            stats.record("selection", started)
         return selected_photos
 
-    def create_slideshow(self, photo_paths, output_filename, audio_query="popular tune"):
+    def _drop_near_duplicates(self, photo_paths):
+        """Drops photos that look nearly the same as one earlier in photo_paths, such as burst shots."""
+        if self.photo_hashes is None:
+            self.photo_hashes = PhotoHashCache(self.index_db_path, max_workers=self.frame_workers)
+        hashes = self.photo_hashes.get_hashes(photo_paths)
+        return drop_near_duplicates(photo_paths, hashes, self.near_duplicate_distance)
+
+    def estimate_render_memory(self, photo_count):
+        """Rough peak memory in bytes of one create_slideshow call, used to throttle parallel renders."""
+        frame_bytes = self.video_resolution[0] * self.video_resolution[1] * 3
+        # Every engine only keeps the loader's read-ahead window of frames resident
+        frame_workers = self.frame_workers or os.cpu_count() or 1
+        window = min(photo_count, frame_workers * 2 + 1)
+        if self.render_engine in ("numpy", "segments"):
+            # Oversized source frames
+            resident_bytes = window * frame_bytes * (1 + MOTION_AMOUNT) ** 2
+        else:
+            # Letterboxed frames, plus a resized and a composited copy of the current one
+            resident_bytes = (window + 2) * frame_bytes
+        for variant in self.output_variants:
+            # Each variant keeps its own oversized source frames in the same window
+            width, height = variant["resolution"]
+            resident_bytes += window * width * height * 3 * (1 + MOTION_AMOUNT) ** 2
+        return int(RENDER_BASE_MEMORY + resident_bytes)
+
+    def slideshow_manifest(self, photo_paths, seed, day=None):
+        """Returns the manifest of everything the slideshow of day of photo_paths rendered with seed depends on."""
+        audio_path = self.music_downloader.get_music_file_path(day)
+        audio = None
+        if audio_path and os.path.exists(audio_path):
+            stat = os.stat(audio_path)
+            audio = {"path": os.path.abspath(audio_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        settings = {
+            "render_engine": self.render_engine,
+            "photo_display_seconds": self.photo_display_seconds,
+            "video_format": self.video_format,
+            "video_codec": self.video_codec,
+            "video_fps": self.video_fps,
+            "video_bitrate": self.video_bitrate,
+            "video_resolution": f"{self.video_resolution[0]}x{self.video_resolution[1]}",
+            "encoder_profile": self.encoder_profile,
+            "audio": audio,
+        }
+        if self.output_variants:
+            settings["output_variants"] = [dict(variant, resolution=f"{variant['resolution'][0]}x{variant['resolution'][1]}")
+                                           for variant in self.output_variants]
+        return build_manifest(photo_paths, seed, settings)
+
+    def is_slideshow_up_to_date(self, photo_paths, output_filename, seed, day=None):
+        """
+        Returns whether output_filename in the day's output folder, and its copy for every
+        output variant, were already rendered from the same inputs.
+        """
+        try:
+            manifest = self.slideshow_manifest(photo_paths, seed, day)
+        except OSError:
+            return False
+        filenames = [output_filename] + [self.variant_filename(output_filename, variant) for variant in self.output_variants]
+        return all(is_up_to_date(os.path.join(self.get_output_dir(day), filename), manifest) for filename in filenames)
+
+    def create_slideshow(self, photo_paths, output_filename, audio_query="popular tune", stats=None, seed=None, day=None,
+                         progress=None):
+        """
+        Renders the photos into output_filename in the output folder of day (today by default)
+        and returns its path, or None if nothing could be rendered. Per-stage timings are added
+        to stats when given.
+
+        With a seed the animations are reproducible, and a manifest of the inputs is stored
+        next to the video so that is_slideshow_up_to_date can skip rendering it again.
+        A copy is rendered next to it for each output variant, from the same decoded photos.
+        progress(done, total) is called as photos are rendered; an exception raised from it
+        aborts the render, which is how a caller cancels one.
+        """
         if not photo_paths:
             print("No photos to create slideshow.")
-            return
+            return None
 
-        clips = []
+        stats = stats or PipelineStats()
+        manifest = None
+        if seed is not None:
+            try:
+                manifest = self.slideshow_manifest(photo_paths, seed, day)
+            except OSError as e:
+                print(f"Could not record the inputs of {output_filename}, it will be rendered again next time: {e}")
+        rng = random.Random(seed)
+        progress = progress or (lambda done, total: None)
+        output_path = self._get_output_path(output_filename, day)
+        variant_outputs = [self._output(self._get_output_path(self.variant_filename(output_filename, variant), day),
+                                        variant["resolution"], variant["codec"], variant["bitrate"], variant["encoder_profile"],
+                                        variant=True)
+                           for variant in self.output_variants]
+        if self.render_engine == "numpy":
+            output_path = self._create_slideshow_numpy(photo_paths, output_path, stats, rng, progress, day, variant_outputs)
+        elif self.render_engine == "segments":
+            output_path = self._create_slideshow_segments(photo_paths, output_path, stats, rng, progress, day)
+        else:
+            output_path = self._create_slideshow_moviepy(photo_paths, output_path, stats, rng, progress, day)
+        if output_path:
+            written = [output["path"] for output in variant_outputs if not output.get("failed")]
+            for path in [output_path] + written:
+                if manifest is not None:
+                    write_manifest(path, manifest)
+                print(f"Slideshow created at: {path}")
+        if self.frame_cache is not None:
+            cache_stats = self.frame_cache.stats()
+            print(f"Frame cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions, "
+                  f"{cache_stats['bytes'] / (1024 * 1024):.0f} MB used.")
+        return output_path
+
+    def get_output_dir(self, day=None):
+        """Returns the output folder of day (today by default), where slideshows and run reports are written."""
+        day = day or datetime.date.today()
+        return os.path.join(self.slideshow_output_folder, day.strftime("%d-%m-%Y"))
+
+    def _get_output_path(self, output_filename, day=None):
+        output_dir = self.get_output_dir(day)
+        os.makedirs(output_dir, exist_ok=True)
+        return os.path.join(output_dir, output_filename)
+
+    def _get_audio_track(self, duration, stats, day=None):
+        """
+        Returns the path of the music of day (today by default) prepared as an AAC track of the
+        given duration, or None when there is no music, in which case the slideshow is created silently.
+        """
+        audio_path = self.music_downloader.get_music_file_path(day)
+        if not (audio_path and os.path.exists(audio_path)):
+            print("Could not find or download audio, creating slideshow without music.")
+            return None
+        try:
+            with stats.stage("audio_prepare"):
+                return self.audio_stage.prepare(audio_path, duration)
+        except Exception as e:
+            print(f"Could not prepare audio {audio_path}, creating slideshow without music: {e}")
+            return None
+
+    def _lazy_frame_maker(self, frames, index, photo_path, progress):
+        """
+        Returns a MoviePy make_frame function that shows frame index of frames. A photo that
+        fails to load while encoding is reported once and shown as a black frame.
+        """
+        failed = []
+        reached = []
+        def make_frame(t):
+            if not reached:
+                # The encoder reached this photo, so every photo before it is done
+                reached.append(True)
+                progress(index, len(frames))
+            try:
+                return frames.get(index)
+            except Exception as e:
+                if not failed:
+                    print(f"Error processing image {photo_path}: {e}")
+                    failed.append(e)
+                return np.zeros((self.video_resolution[1], self.video_resolution[0], 3), dtype=np.uint8)
+        return make_frame
+
+    def _create_slideshow_moviepy(self, photo_paths, output_path, stats, rng, progress, day=None):
+        """
+        Renders the slideshow by composing animated MoviePy clips. The clips prepare their
+        photo only when the encoder reaches them, so just the loader's read-ahead window of
+        frames is held in memory, however many photos there are.
+        """
+        # MoviePy takes a long time to import, so only load it when this engine is used
+        from moviepy.editor import VideoClip, concatenate_videoclips
+
+        # Opening a photo only reads its header; photos that cannot be opened are left out up front
+        valid_paths = []
         for photo_path in photo_paths:
             try:
-                # Load image using PIL for more control
-                img = Image.open(photo_path)
-                img_width, img_height = img.size
-
-                # Calculate aspect ratios
-                video_aspect_ratio = self.video_resolution[0] / self.video_resolution[1]
-                img_aspect_ratio = img_width / img_height
-
-                # Determine new dimensions and padding
-                if img_aspect_ratio > video_aspect_ratio: # Image is wider than video frame
-                    new_width = self.video_resolution[0]
-                    new_height = int(new_width / img_aspect_ratio)
-                    padding_top = (self.video_resolution[1] - new_height) // 2
-                    padding_bottom = self.video_resolution[1] - new_height - padding_top
-                    padding_left = 0
-                    padding_right = 0
-                else: # Image is taller than or same aspect ratio as video frame
-                    new_height = self.video_resolution[1]
-                    new_width = int(new_height * img_aspect_ratio)
-                    padding_left = (self.video_resolution[0] - new_width) // 2
-                    padding_right = self.video_resolution[0] - new_width - padding_left
-                    padding_top = 0
-                    padding_bottom = 0
-                
-                # Resize image while maintaining aspect ratio
-                img = img.resize((new_width, new_height), Image.ANTIALIAS)
-
-                # Create a new blank image with the target video resolution (black background)
-                background = Image.new("RGB", self.video_resolution, (0, 0, 0))
-                background.paste(img, (padding_left, padding_top))
-
-                # Convert PIL Image to MoviePy ImageClip using numpy array
-                clip = ImageClip(np.array(background)).set_duration(self.photo_display_seconds)
-
-                # Add pan/zoom animation
-                # Randomly choose pan direction or zoom
-                animation_type = random.choice(["zoom_in", "zoom_out", "pan_left", "pan_right", "pan_up", "pan_down"])
-                
-                if animation_type == "zoom_in":
-                    clip = clip.resize(lambda t: 1 + 0.05 * t / clip.duration)
-                elif animation_type == "zoom_out":
-                    clip = clip.resize(lambda t: 1.05 - 0.05 * t / clip.duration)
-                elif animation_type == "pan_left":
-                    clip = clip.set_position(lambda t: (
-                        -clip.w * 0.05 * t / clip.duration, 
-                        "center"
-                    ))
-                elif animation_type == "pan_right":
-                    clip = clip.set_position(lambda t: (
-                        clip.w * 0.05 * t / clip.duration, 
-                        "center"
-                    ))
-                elif animation_type == "pan_up":
-                    clip = clip.set_position(lambda t: (
-                        "center", 
-                        -clip.h * 0.05 * t / clip.duration
-                    ))
-                elif animation_type == "pan_down":
-                    clip = clip.set_position(lambda t: (
-                        "center", 
-                        clip.h * 0.05 * t / clip.duration
-                    ))
-
-                clips.append(clip)
+                with Image.open(photo_path):
+                    valid_paths.append(photo_path)
             except Exception as e:
                 print(f"Error processing image {photo_path}: {e}")
 
+        clips = []
+        frame_loader = FrameLoader(self.video_resolution, max_workers=self.frame_workers, frame_cache=self.frame_cache, stats=stats)
+        frames = frame_loader.lazy_frames(valid_paths)
+        # Frames can be asked for again, e.g. by a resized clip, so only report progress that moves forward
+        reported = [0]
+        def report(done, total):
+            if done > reported[0]:
+                reported[0] = done
+                progress(done, total)
+
+        for index, photo_path in enumerate(valid_paths):
+            started = clock()
+            # A clip whose frame is prepared on demand; its size is known without loading it,
+            # so nothing here reads the photo and there is no per-photo error to catch
+            clip = VideoClip(duration=self.photo_display_seconds)
+            clip.make_frame = self._lazy_frame_maker(frames, index, photo_path, report)
+            clip.size = self.video_resolution
+
+            # Add pan/zoom animation
+            # Randomly choose pan direction or zoom
+            animation_type = rng.choice(ANIMATION_TYPES)
+            
+            if animation_type == "zoom_in":
+                clip = self._zoom_clip(clip, lambda t: 1 + 0.05 * t / clip.duration)
+            elif animation_type == "zoom_out":
+                clip = self._zoom_clip(clip, lambda t: 1.05 - 0.05 * t / clip.duration)
+            elif animation_type == "pan_left":
+                clip = clip.set_position(lambda t: (
+                    -clip.w * 0.05 * t / clip.duration, 
+                    "center"
+                ))
+            elif animation_type == "pan_right":
+                clip = clip.set_position(lambda t: (
+                    clip.w * 0.05 * t / clip.duration, 
+                    "center"
+                ))
+            elif animation_type == "pan_up":
+                clip = clip.set_position(lambda t: (
+                    "center", 
+                    -clip.h * 0.05 * t / clip.duration
+                ))
+            elif animation_type == "pan_down":
+                clip = clip.set_position(lambda t: (
+                    "center", 
+                    clip.h * 0.05 * t / clip.duration
+                ))
+
+            clips.append(clip)
+            stats.record("animation_setup", started)
+
         if not clips:
+            frames.close()
             print("No valid clips to create slideshow.")
-            return
+            return None
 
         final_clip = concatenate_videoclips(clips, method="compose")
 
-        audio_path = self.music_downloader.get_music_file_path()
-        if audio_path and os.path.exists(audio_path):
-            audio_clip = AudioFileClip(audio_path)
-            final_clip = final_clip.set_audio(audio_clip.set_duration(final_clip.duration))
-        else:
-            print("Could not find or download audio, creating slideshow without music.")
+        # MoviePy composes and encodes the video; the prepared track is then muxed in with a
+        # stream copy like in the other engines. Both steps write under temporary names, so a
+        # cancelled or failed render leaves no partial files.
+        video_path = partial_output_path(output_path) + ".video"
+        options = self._moviepy_encoder_options()
+        options["ffmpeg_params"] = (options["ffmpeg_params"] or []) + ["-f", muxer_for(output_path)]
+        try:
+            with stats.stage("encode"):
+                final_clip.write_videofile(video_path, fps=self.video_fps, codec=self.video_codec, audio=False,
+                                           logger=None, **options)
+            audio_path = self._get_audio_track(final_clip.duration, stats, day)
+            if audio_path:
+                with stats.stage("audio_mux", os.path.getsize(video_path)):
+                    mux_audio(video_path, output_path, final_clip.duration, audio_path, copy_audio=True)
+            else:
+                os.replace(video_path, output_path)
+        finally:
+            discard_partial_output(video_path)
+            frames.close()
+        return output_path
 
-        output_dir = os.path.join(self.slideshow_output_folder, datetime.date.today().strftime("%d-%m-%Y"))
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, output_filename)
+    def _zoom_clip(self, clip, scale):
+        """
+        Resizes clip by the factor scale(t), like clip.resize(scale) but with the size worked
+        out from scale(0): resize renders frame 0 to measure it, which would load the photo.
+        """
+        from moviepy.editor import VideoClip
+        from moviepy.video.fx.resize import resizer
+
+        width, height = clip.size
+        zoomed = VideoClip(duration=clip.duration)
+        zoomed.make_frame = lambda t: resizer(clip.get_frame(t), (scale(t) * width, scale(t) * height))
+        zoomed.size = (int(scale(0) * width), int(scale(0) * height))
+        return zoomed
+
+    def _moviepy_encoder_options(self):
+        """Translates the encoder profile into write_videofile arguments."""
+        profile = self.encoder_profile
+        x26x = self.video_codec in ("libx264", "libx265")
+        use_crf = x26x and profile.get("crf") is not None
+        ffmpeg_params = []
+        if x26x and profile.get("tune"):
+            ffmpeg_params += ["-tune", profile["tune"]]
+        if use_crf:
+            ffmpeg_params += ["-crf", str(profile["crf"])]
+        return {
+            "bitrate": None if use_crf else self.video_bitrate,
+            # MoviePy always passes a preset; medium is libx264's own default
+            "preset": profile.get("preset") or "medium",
+            "threads": profile.get("threads"),
+            "ffmpeg_params": ffmpeg_params or None,
+        }
+
+    def _create_frame_loader(self, video_resolution, stats):
+        """
+        Returns the loader that prepares source frames for the numpy and segments engines: threads,
+        or with frame_loader = processes a process pool that hands frames over in shared memory.
+        """
+        if self.frame_loader == "processes":
+            return ProcessFrameLoader(video_resolution, max_workers=self.frame_workers, frame_cache=self.frame_cache, stats=stats)
+        return FrameLoader(video_resolution, max_workers=self.frame_workers, frame_cache=self.frame_cache, stats=stats)
+
+    def _output(self, path, video_resolution, codec, bitrate, encoder_profile, variant=False):
+        """Describes one video file for _render_numpy_outputs to write."""
+        return {"path": path, "resolution": video_resolution, "codec": codec, "bitrate": bitrate, "encoder_profile": encoder_profile,
+                "variant": variant}
+
+    def _create_slideshow_numpy(self, photo_paths, output_path, stats, rng, progress, day=None, variant_outputs=()):
+        """
+        Renders the slideshow by cutting precomputed pan/zoom windows out of oversized
+        source frames and streaming the raw frames straight into ffmpeg. Variant outputs
+        are rendered in the same pass.
+        """
+        outputs = [self._output(output_path, self.video_resolution, self.video_codec, self.video_bitrate, self.encoder_profile)]
+        if not self._render_numpy_outputs(photo_paths, outputs + list(variant_outputs), stats, rng, progress, day):
+            return None
+        return output_path
+
+    def _render_numpy_outputs(self, photo_paths, outputs, stats, rng, progress, day=None):
+        """
+        Writes every output from one pass over the photos: each photo is decoded once into
+        a source frame per output resolution, and every output's frames are cut on a thread
+        of their own and streamed into their own ffmpeg, so the encoders run side by side.
+        A variant whose encoder fails is dropped and marked failed while the others carry on.
+        Returns False if no photo could be loaded.
+        """
+        source_resolutions = [oversized_resolution(output["resolution"]) for output in outputs]
+        frame_count = max(1, int(round(self.photo_display_seconds * self.video_fps)))
+        frame_loader = self._create_frame_loader(source_resolutions[0], stats)
+
+        writers = None
+        executor = ThreadPoolExecutor(max_workers=len(outputs)) if len(outputs) > 1 else None
+        try:
+            for done, (photo_path, sources, error) in enumerate(frame_loader.load_frame_sets(photo_paths, source_resolutions), 1):
+                if error is not None:
+                    print(f"Error processing image {photo_path}: {error}")
+                    progress(done, len(photo_paths))
+                    continue
+                if writers is None:
+                    # The track is cut for every photo; if some fail to load, ffmpeg ends it with the video
+                    audio_path = self._get_audio_track(len(photo_paths) * frame_count / self.video_fps, stats, day)
+                    writers = []
+                    for output in outputs:
+                        writers.append(FfmpegWriter(output["path"], output["resolution"], self.video_fps, output["codec"],
+                                                    bitrate=output["bitrate"], audio_path=audio_path, copy_audio=True,
+                                                    encoder_profile=output["encoder_profile"]))
+                animation_type = rng.choice(ANIMATION_TYPES)
+                if executor is None:
+                    try:
+                        self._write_animated_photo(writers[0], sources[0], animation_type, frame_count, stats, outputs[0]["resolution"])
+                    except Exception as e:
+                        self._drop_output(outputs, writers, 0, e)
+                else:
+                    futures = {index: executor.submit(self._write_animated_photo, writer, sources[index], animation_type, frame_count,
+                                                      stats, outputs[index]["resolution"])
+                               for index, writer in enumerate(writers) if writer is not None}
+                    # Let every output finish the photo before an error from the main one aborts them all
+                    wait(futures.values())
+                    for index, future in futures.items():
+                        try:
+                            future.result()
+                        except Exception as e:
+                            self._drop_output(outputs, writers, index, e)
+                progress(done, len(photo_paths))
+                if not any(writers):
+                    break
+
+            if writers is None:
+                print("No valid clips to create slideshow.")
+                return False
+            # The audio is muxed while encoding; closing waits for ffmpeg, so its CPU time is counted here
+            with stats.stage("encode"):
+                for index, writer in enumerate(writers):
+                    if writer is not None:
+                        try:
+                            writer.close()
+                        except Exception as e:
+                            self._drop_output(outputs, writers, index, e)
+        except Exception:
+            for writer in writers or ():
+                if writer is not None:
+                    writer.abort()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return True
+
+    def _drop_output(self, outputs, writers, index, error):
+        """Stops writing a variant whose encoder failed; an error of the main output is raised."""
+        if not outputs[index]["variant"]:
+            raise error
+        writers[index].abort()
+        writers[index] = None
+        outputs[index]["failed"] = True
+        print(f"Could not render the output variant {outputs[index]['path']}, skipping it: {error}")
+
+    def _write_animated_photo(self, writer, source, animation_type, frame_count, stats, video_resolution=None):
+        """Synthesizes one photo's animated frames from its oversized source and feeds them to writer."""
+        video_resolution = video_resolution or self.video_resolution
+        started = clock()
+        source_resolution = (source.shape[1], source.shape[0])
+        windows = crop_windows(animation_type, frame_count, source_resolution, video_resolution)
+        started = stats.record("animation_setup", started)
+        for frame in synthesize_frames(source, windows, video_resolution):
+            started = stats.record("frame_synthesis", started)
+            writer.write_frame(frame)
+            started = stats.record("encode", started)
+
+    def _create_slideshow_segments(self, photo_paths, output_path, stats, rng, progress, day=None):
+        """
+        Renders every photo's animated segment to its own cached file, encoding only the
+        segments that are not cached yet, then joins them with a stream copy and muxes the audio.
+        """
+        source_resolution = oversized_resolution(self.video_resolution)
+        frame_count = max(1, int(round(self.photo_display_seconds * self.video_fps)))
+        profile = ",".join(f"{key}={value}" for key, value in sorted(self.encoder_profile.items()) if key != "name")
+        settings = f"{self.video_resolution[0]}x{self.video_resolution[1]}|{self.video_fps}|{frame_count}|{self.video_codec}|{self.video_bitrate}|{profile}"
+
+        planned = []
+        for photo_path in photo_paths:
+            animation_type = rng.choice(ANIMATION_TYPES)
+            try:
+                planned.append((photo_path, animation_type, self.segment_cache.make_key(photo_path, animation_type, settings)))
+            except OSError as e:
+                print(f"Error processing image {photo_path}: {e}")
+
+        missing = [segment for segment in planned if not self.segment_cache.contains(segment[2])]
+        done = len(planned) - len(missing)
+        progress(done, len(planned))
+        failed = set()
+        frame_loader = self._create_frame_loader(source_resolution, stats)
+        loaded = frame_loader.load_frames([photo_path for photo_path, _, _ in missing])
+        for (photo_path, animation_type, key), (_, source, error) in zip(missing, loaded):
+            if error is not None:
+                print(f"Error processing image {photo_path}: {error}")
+                failed.add(key)
+                done += 1
+                progress(done, len(planned))
+                continue
+            writer = FfmpegWriter(self.segment_cache.segment_path(key), self.video_resolution, self.video_fps,
+                                  self.video_codec, bitrate=self.video_bitrate, encoder_profile=self.encoder_profile)
+            try:
+                self._write_animated_photo(writer, source, animation_type, frame_count, stats)
+                with stats.stage("encode"):
+                    writer.close()
+            except Exception:
+                writer.abort()
+                raise
+            done += 1
+            progress(done, len(planned))
+
+        segment_paths = [self.segment_cache.segment_path(key) for _, _, key in planned if key not in failed]
+        if not segment_paths:
+            print("No valid clips to create slideshow.")
+            return None
+        print(f"Segments: {len(planned) - len(missing)} reused, {len(missing) - len(failed)} encoded.")
 
-        final_clip.write_videofile(output_path, fps=self.video_fps, codec=self.video_codec, audio_codec="aac", bitrate=self.video_bitrate, logger=None)
-        print(f"Slideshow created at: {output_path}")
+        segment_bytes = sum(os.path.getsize(segment_path) for segment_path in segment_paths)
+        duration = len(segment_paths) * frame_count / self.video_fps
+        audio_path = self._get_audio_track(duration, stats, day)
+        with stats.stage("audio_mux", segment_bytes):
+            concat_segments(segment_paths, output_path, duration, audio_path=audio_path, copy_audio=True)
+        self.segment_cache.evict()
+        return output_path
 
 
 # Example Usage (for testing)
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Modules whose import cost matters for startup, measured each in a fresh interpreter
+TARGET_MODULES = [
+    "config_manager",
+    "main",
+    "photo_index",
+    "frame_loader",
+    "frame_engine",
+    "slideshow_generator",
+    "render_pool",
+    "gui",
+    "numpy",
+    "PIL.Image",
+    "moviepy.editor",
+    "PyQt5.QtWidgets",
+    "pkg_resources",
+]
+
+# What the scheduled --run-slideshow task imports before it starts working
+HEADLESS_IMPORTS = "import main, slideshow_generator, render_pool"
+HEAVY_MODULES = ["moviepy", "PyQt5", "pkg_resources", "gui"]
+
+def measure_import(statement):
+    """
+    Runs an import statement in a fresh interpreter with -X importtime.
+    Returns (wall_seconds, {module: cumulative_seconds}, loaded heavy modules), or None if the import failed.
+    """
+    check = f"import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{statement}; {check}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        return None
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative[parts[2].strip()] = int(parts[1]) / 1_000_000
+        except ValueError:
+            continue
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return wall_seconds, cumulative, loaded
+
+def run_benchmark():
+    results = {"python": sys.version.split()[0], "modules": {}, "headless": None}
+    for module in TARGET_MODULES:
+        measured = measure_import(f"import {module}")
+        if measured is None:
+            results["modules"][module] = None
+            continue
+        wall_seconds, cumulative, _ = measured
+        results["modules"][module] = {"import_seconds": cumulative.get(module), "process_seconds": wall_seconds}
+
+    measured = measure_import(HEADLESS_IMPORTS)
+    if measured is not None:
+        wall_seconds, cumulative, loaded = measured
+        slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:10]
+        results["headless"] = {"process_seconds": wall_seconds, "heavy_modules_loaded": loaded,
+                               "slowest_imports": dict(slowest)}
+    return results
+
+def print_report(results):
+    print(f"Import times (Python {results['python']}, fresh interpreter per module):")
+    for module, timing in results["modules"].items():
+        if timing is None:
+            print(f"  {module:<22} not importable")
+        else:
+            print(f"  {module:<22} {timing['import_seconds'] * 1000:8.1f} ms import, {timing['process_seconds'] * 1000:8.1f} ms process")
+    headless = results["headless"]
+    if headless is not None:
+        print(f"Headless --run-slideshow imports: {headless['process_seconds'] * 1000:.1f} ms process")
+        print(f"  Heavy modules loaded: {', '.join(headless['heavy_modules_loaded']) or 'none'}")
+        for module, seconds in headless["slowest_imports"].items():
+            print(f"  {module:<40} {seconds * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure module import times of the Memories App entry points.")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmark()
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,96 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from backfill import BackfillJournal, plan_backfill, run_backfill
+
+class FakeGenerator:
+    """A generator that renders nothing and fails the slideshows of the days in fail_days."""
+
+    def __init__(self, temp_dir, years_back):
+        self.moviepy_temp_dir = temp_dir
+        self.years_back = years_back
+        self.fail_days = set()
+        self.rendered = []
+
+    def select_photos_for_year(self, year_offset, day=None):
+        return [f"{day.year - year_offset}-{day:%m-%d}.jpg"]
+
+    def slideshow_filename(self, year_offset):
+        return f"{year_offset}.mp4"
+
+    def slideshow_seed(self, year_offset, day):
+        return 0
+
+    def is_slideshow_up_to_date(self, photos, output_filename, seed, day):
+        return False
+
+    def estimate_render_memory(self, photo_count):
+        return 0
+
+    def create_slideshow(self, photos, output_filename=None, stats=None, seed=None, day=None):
+        if day in self.fail_days:
+            raise RuntimeError("render failed")
+        self.rendered.append((day, output_filename))
+        return output_filename
+
+class BackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.journal_path = os.path.join(self.folder, "backfill", "journal.jsonl")
+
+    def test_plan_covers_every_day_and_offset(self):
+        jobs = plan_backfill(datetime.date(2024, 2, 28), datetime.date(2024, 3, 1), [1, 5])
+        self.assertEqual(jobs, [(datetime.date(2024, 2, 28), 1), (datetime.date(2024, 2, 28), 5),
+                                (datetime.date(2024, 2, 29), 1), (datetime.date(2024, 2, 29), 5),
+                                (datetime.date(2024, 3, 1), 1), (datetime.date(2024, 3, 1), 5)])
+
+    def test_journal_is_read_back_and_ignores_a_cut_line(self):
+        day = datetime.date(2024, 10, 18)
+        journal = BackfillJournal(self.journal_path)
+        journal.record(day, 1, "rendered", 1.5)
+        journal.record(day, 2, "failed", 0.5)
+        journal.record(day, 3, "up_to_date")
+        with open(self.journal_path, "a") as f:
+            f.write('{"date": "2024-10-18", "year_of')
+
+        journal = BackfillJournal(self.journal_path)
+        self.assertTrue(journal.is_finished(day, 1))
+        self.assertFalse(journal.is_finished(day, 2))
+        self.assertFalse(journal.is_finished(day, 3))
+        self.assertFalse(journal.is_finished(day, 4))
+
+    def test_resume_skips_the_rendered_jobs(self):
+        start = datetime.date(2024, 10, 18)
+        end = datetime.date(2024, 10, 19)
+        generator = FakeGenerator(self.folder, [1, 2])
+        generator.fail_days.add(end)
+        run_backfill(generator, "memories.ini", start, end)
+        self.assertEqual(generator.rendered, [(start, "1.mp4"), (start, "2.mp4")])
+
+        # The failed jobs run again, the rendered ones do not
+        generator.fail_days.clear()
+        generator.rendered = []
+        run_backfill(generator, "memories.ini", start, end)
+        self.assertEqual(generator.rendered, [(end, "1.mp4"), (end, "2.mp4")])
+
+        # Every job succeeded, so the journal is gone and a new run checks every day again
+        generator.rendered = []
+        run_backfill(generator, "memories.ini", start, end)
+        self.assertEqual(len(generator.rendered), 4)
+
+    def test_force_renders_finished_jobs_again(self):
+        start = datetime.date(2024, 10, 18)
+        generator = FakeGenerator(self.folder, [1])
+        generator.fail_days.add(start + datetime.timedelta(days=1))
+        run_backfill(generator, "memories.ini", start, start + datetime.timedelta(days=1))
+        generator.rendered = []
+        run_backfill(generator, "memories.ini", start, start + datetime.timedelta(days=1), force=True)
+        self.assertEqual(generator.rendered, [(start, "1.mp4")])
+
+if __name__ == "__main__":
+    unittest.main()
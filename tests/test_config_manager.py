@@ -0,0 +1,105 @@
+import configparser
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from config_manager import ConfigManager, ConfigSnapshot, load_config
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config.ini")
+
+class ConfigSnapshotTest(unittest.TestCase):
+
+    def _snapshot(self, changes=None):
+        """Returns the snapshot of the default config.ini with changes as {(section, key): value}."""
+        parser = configparser.ConfigParser()
+        parser.read(DEFAULT_CONFIG)
+        for (section, key), value in (changes or {}).items():
+            if not parser.has_section(section):
+                parser.add_section(section)
+            parser.set(section, key, value)
+        return ConfigSnapshot(parser, "config.ini")
+
+    def _assert_invalid(self, section, key, value, message):
+        with self.assertRaises(ValueError) as raised:
+            self._snapshot({(section, key): value})
+        self.assertIn(message, str(raised.exception))
+
+    def test_default_config_is_valid(self):
+        snapshot = self._snapshot()
+        self.assertEqual(snapshot.years_back, [1, 2, 3, 5, 10, 15, 16, 20])
+        self.assertEqual(snapshot.video_resolution, (1080, 1920))
+        self.assertEqual(snapshot.schedule_time, datetime.time(18, 0))
+        self.assertTrue(snapshot.enable_scheduling)
+        self.assertIsNone(snapshot.frame_workers)
+        self.assertEqual(snapshot.output_variants, [])
+
+    def test_invalid_values_name_the_setting(self):
+        self._assert_invalid("AppConfig", "random_photos_limit", "ten", "Invalid random_photos_limit in [AppConfig]")
+        self._assert_invalid("AppConfig", "photo_display_seconds", "0", "a number of at least 1")
+        self._assert_invalid("AppConfig", "years_back", "1,two", "comma-separated whole numbers")
+        self._assert_invalid("AppConfig", "years_back", "1,0", "numbers of at least 1")
+        self._assert_invalid("AppConfig", "schedule_time", "6pm", "a time as HH:MM")
+        self._assert_invalid("AppConfig", "enable_scheduling", "maybe", "True or False")
+        self._assert_invalid("VideoConfig", "video_resolution", "1080", "WIDTHxHEIGHT")
+        self._assert_invalid("VideoConfig", "video_resolution", "1x1920", "a width and height of at least 2")
+        self._assert_invalid("VideoConfig", "render_engine", "ffmpeg", "moviepy, numpy or segments")
+        self._assert_invalid("VideoConfig", "frame_loader", "fibers", "threads or processes")
+        self._assert_invalid("AppConfig", "photo_folder_path", "", "Missing setting photo_folder_path in [AppConfig] of config.ini")
+
+    def test_output_variants_follow_video_config(self):
+        snapshot = self._snapshot({("OutputVariant web", "resolution"): "720x1280", ("OutputVariant web", "format"): "webm"})
+        variant, = snapshot.output_variants
+        self.assertEqual(variant["name"], "web")
+        self.assertEqual(variant["resolution"], (720, 1280))
+        self.assertEqual(variant["format"], "webm")
+        self.assertEqual(variant["codec"], "libx264")
+        self.assertIsNone(variant["encoder_profile"])
+
+        with self.assertRaises(ValueError):
+            self._snapshot({("OutputVariant web/1", "resolution"): "720x1280"})
+
+class ConfigManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.config_path = os.path.join(self.folder, "config.ini")
+        shutil.copy(DEFAULT_CONFIG, self.config_path)
+        self.manager = ConfigManager(self.config_path)
+
+    def _read(self):
+        with open(self.config_path) as f:
+            return f.read()
+
+    def test_batch_writes_once_at_the_end(self):
+        before = self._read()
+        with self.manager.batch():
+            self.manager.set_config("AppConfig", "random_photos_limit", "20")
+            self.assertEqual(self._read(), before)
+            self.manager.set_config("AppConfig", "photo_display_seconds", "4")
+        snapshot = load_config(self.config_path)
+        self.assertEqual(snapshot.random_photos_limit, 20)
+        self.assertEqual(snapshot.photo_display_seconds, 4)
+
+    def test_batch_leaves_the_file_untouched_when_validation_fails(self):
+        before = self._read()
+        with self.assertRaises(ValueError):
+            with self.manager.batch():
+                self.manager.set_config("AppConfig", "random_photos_limit", "20")
+                self.manager.set_config("VideoConfig", "video_fps", "fast")
+                ConfigSnapshot(self.manager.config, self.config_path)
+        self.assertEqual(self._read(), before)
+        self.assertEqual(self.manager.get_config("AppConfig", "random_photos_limit"), "10")
+        self.assertEqual(self.manager.get_config("VideoConfig", "video_fps"), "24")
+        self.assertEqual(os.listdir(self.folder), ["config.ini"])
+
+    def test_load_config_reads_the_file_again_after_a_write(self):
+        self.assertEqual(load_config(self.config_path).random_photos_limit, 10)
+        self.assertIs(load_config(self.config_path), load_config(self.config_path))
+        self.manager.set_config("AppConfig", "random_photos_limit", "12")
+        self.assertEqual(load_config(self.config_path).random_photos_limit, 12)
+
+if __name__ == "__main__":
+    unittest.main()
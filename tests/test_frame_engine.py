@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from frame_engine import ANIMATION_TYPES, crop_windows, oversized_resolution, synthesize_frames
+
+class CropWindowsTest(unittest.TestCase):
+
+    def test_windows_stay_inside_the_source(self):
+        for video_resolution in ((1080, 1920), (1920, 1080), (1366, 768), (2, 2)):
+            source_size = oversized_resolution(video_resolution)
+            for animation_type in ANIMATION_TYPES:
+                for frame_count in (1, 2, 72):
+                    with self.subTest(video_resolution=video_resolution, animation_type=animation_type, frame_count=frame_count):
+                        windows = crop_windows(animation_type, frame_count, source_size, video_resolution)
+                        self.assertEqual(windows.shape, (frame_count, 4))
+                        lefts, tops, widths, heights = windows.T
+                        self.assertTrue(np.all(lefts >= 0) and np.all(tops >= 0))
+                        self.assertTrue(np.all(lefts + widths <= source_size[0] + 1e-6))
+                        self.assertTrue(np.all(tops + heights <= source_size[1] + 1e-6))
+                        self.assertTrue(np.all(widths >= video_resolution[0] - 1e-6))
+                        self.assertTrue(np.all(heights >= video_resolution[1] - 1e-6))
+
+    def test_zooms_run_between_the_whole_source_and_a_smaller_window(self):
+        source_size = oversized_resolution((1080, 1920))
+        zoom_in = crop_windows("zoom_in", 48, source_size, (1080, 1920))
+        zoom_out = crop_windows("zoom_out", 48, source_size, (1080, 1920))
+        np.testing.assert_allclose(zoom_in[0], [0, 0, source_size[0], source_size[1]])
+        np.testing.assert_allclose(zoom_out[-1], zoom_in[0])
+        np.testing.assert_allclose(zoom_out[0], zoom_in[-1])
+        np.testing.assert_allclose(zoom_in[-1, 2:], [1080, 1920])
+        self.assertTrue(np.all(np.diff(zoom_in[:, 2]) < 0))
+
+    def test_pans_cross_the_whole_margin(self):
+        video_resolution = (1080, 1920)
+        source_size = oversized_resolution(video_resolution)
+        margin = (source_size[0] - video_resolution[0], source_size[1] - video_resolution[1])
+        self.assertEqual(crop_windows("pan_left", 24, source_size, video_resolution)[[0, -1], 0].tolist(), [0, margin[0]])
+        self.assertEqual(crop_windows("pan_right", 24, source_size, video_resolution)[[0, -1], 0].tolist(), [margin[0], 0])
+        self.assertEqual(crop_windows("pan_up", 24, source_size, video_resolution)[[0, -1], 1].tolist(), [0, margin[1]])
+        self.assertEqual(crop_windows("pan_down", 24, source_size, video_resolution)[[0, -1], 1].tolist(), [margin[1], 0])
+
+    def test_every_frame_has_the_even_video_size(self):
+        # yuv420p needs both sides even, so frames must come out at exactly the requested size
+        for video_resolution in ((360, 640), (100, 50)):
+            source_size = oversized_resolution(video_resolution)
+            source = np.zeros((source_size[1], source_size[0], 3), dtype=np.uint8)
+            for animation_type in ANIMATION_TYPES:
+                with self.subTest(video_resolution=video_resolution, animation_type=animation_type):
+                    windows = crop_windows(animation_type, 12, source_size, video_resolution)
+                    for frame in synthesize_frames(source, windows, video_resolution):
+                        self.assertEqual(frame.shape, (video_resolution[1], video_resolution[0], 3))
+                        self.assertEqual(frame.dtype, np.uint8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from photo_index import PhotoIndex
+
+def _timestamp(date):
+    return time.mktime(datetime.datetime(date.year, date.month, date.day, 12).timetuple())
+
+class PhotoIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.photos = os.path.join(self.folder, "photos")
+        os.makedirs(os.path.join(self.photos, "2023"))
+        os.makedirs(os.path.join(self.photos, "2024"))
+        self.index = PhotoIndex(self.photos, os.path.join(self.folder, "index.sqlite3"), metadata_workers=1, scan_workers=2)
+        self.addCleanup(self.index.close)
+
+    def _add_photo(self, name, date=None):
+        """Writes an empty photo, dated by its file name or else by its mtime on date."""
+        path = os.path.join(self.photos, name)
+        with open(path, "wb") as f:
+            f.write(b"not really a photo")
+        if date is not None:
+            os.utime(path, (_timestamp(date), _timestamp(date)))
+        return path
+
+    def _counts(self):
+        return {datetime.date.fromordinal(ordinal): count for ordinal, count in self.index.day_counts().items()}
+
+    def test_refresh_picks_up_added_and_deleted_photos(self):
+        self._add_photo("2023/IMG_20231018.jpg")
+        self._add_photo("2024/IMG_20241018.jpg")
+        self.assertEqual(self.index.refresh(), 2)
+        self.assertTrue(self.index.changed)
+
+        self.assertEqual(self.index.refresh(), 2)
+        self.assertFalse(self.index.changed)
+
+        added = self._add_photo("2024/IMG_20241019.jpg")
+        self.assertEqual(self.index.refresh(), 3)
+        self.assertTrue(self.index.changed)
+        self.assertEqual(self.index.removed_photos, 0)
+
+        os.remove(added)
+        self.assertEqual(self.index.refresh(), 2)
+        self.assertTrue(self.index.changed)
+        self.assertEqual(self.index.removed_photos, 1)
+
+        shutil.rmtree(os.path.join(self.photos, "2023"))
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self.index.removed_photos, 1)
+        self.assertNotIn(os.path.join(self.photos, "2023"), self.index.directories())
+
+    def test_directory_with_unchanged_mtime_is_not_listed_unless_dirty(self):
+        self._add_photo("2024/IMG_20241018.jpg")
+        self.index.refresh()
+        directory = os.path.join(self.photos, "2024")
+        mtime = os.stat(directory).st_mtime
+
+        self._add_photo("2024/IMG_20241019.jpg")
+        os.utime(directory, (mtime, mtime))
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertFalse(self.index.changed)
+
+        self.assertEqual(self.index.refresh(dirty_directories=[directory]), 2)
+        self.assertTrue(self.index.changed)
+
+    def test_only_dirty_refresh_lists_only_reported_directories(self):
+        self._add_photo("2023/IMG_20231018.jpg")
+        self._add_photo("2024/IMG_20241018.jpg")
+        self.index.refresh()
+
+        # Not reported, so not seen until a full refresh
+        self._add_photo("2023/IMG_20231019.jpg")
+        os.makedirs(os.path.join(self.photos, "2024", "trip", "day1"))
+        self._add_photo("2024/trip/day1/IMG_20241020.jpg")
+        self.assertEqual(self.index.refresh(dirty_directories=[os.path.join(self.photos, "2024")], only_dirty=True), 3)
+        self.assertTrue(self.index.changed)
+        self.assertIn(os.path.join(self.photos, "2024", "trip", "day1"), self.index.directories())
+
+        shutil.rmtree(os.path.join(self.photos, "2024", "trip"))
+        dirty = [os.path.join(self.photos, "2024"), os.path.join(self.photos, "2024", "trip")]
+        self.assertEqual(self.index.refresh(dirty_directories=dirty, only_dirty=True), 2)
+        self.assertEqual(self.index.removed_photos, 1)
+        self.assertNotIn(os.path.join(self.photos, "2024", "trip", "day1"), self.index.directories())
+
+        self.assertEqual(self.index.refresh(), 3)
+
+    def test_latest_photos_in_window_across_year_and_leap_day(self):
+        for name in ("2023/IMG_20231231.jpg", "2024/IMG_20240101.jpg", "2024/IMG_20240101_2.jpg",
+                     "2024/IMG_20240228.jpg", "2024/IMG_20240229.jpg", "2023/IMG_20230228.jpg"):
+            self._add_photo(name)
+        self.index.refresh()
+        date_index = self.index.load_date_index()
+
+        def latest(start, end):
+            names = sorted(os.path.basename(path) for path in self.index.latest_photos_in_window(start, end))
+            self.assertEqual(sorted(os.path.basename(path) for path in date_index.latest_photos_in_window(start, end)), names)
+            return names
+
+        self.assertEqual(latest(datetime.date(2023, 12, 30), datetime.date(2024, 1, 2)),
+                         ["IMG_20240101.jpg", "IMG_20240101_2.jpg"])
+        self.assertEqual(latest(datetime.date(2023, 12, 25), datetime.date(2023, 12, 31)), ["IMG_20231231.jpg"])
+        self.assertEqual(latest(datetime.date(2024, 2, 27), datetime.date(2024, 3, 1)), ["IMG_20240229.jpg"])
+        self.assertEqual(latest(datetime.date(2024, 2, 27), datetime.date(2024, 2, 28)), ["IMG_20240228.jpg"])
+        self.assertEqual(latest(datetime.date(2023, 3, 1), datetime.date(2023, 3, 31)), [])
+        self.assertEqual(latest(datetime.date(2023, 2, 1), datetime.date(2023, 3, 31)), ["IMG_20230228.jpg"])
+        self.assertEqual([os.path.basename(path) for path in date_index.photos_on_month_day(2, 29)], ["IMG_20240229.jpg"])
+
+    def test_day_counts_follow_inserts_updates_and_deletes(self):
+        first = datetime.date(2024, 10, 18)
+        second = datetime.date(2024, 10, 19)
+        self._add_photo("2024/IMG_20241018.jpg")
+        holiday = self._add_photo("2024/holiday.jpg", first)
+        self.index.refresh()
+        self.assertEqual(self._counts(), {first: 2})
+
+        # Modified in place, so only the watcher would report its folder
+        os.utime(holiday, (_timestamp(second), _timestamp(second)))
+        self.index.refresh(dirty_directories=[os.path.dirname(holiday)])
+        self.assertEqual(self._counts(), {first: 1, second: 1})
+
+        os.remove(holiday)
+        self.index.refresh()
+        self.assertEqual(self._counts(), {first: 1})
+
+        self.index.refresh(rebuild=True)
+        self.assertEqual(self._counts(), {first: 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import socket
+import threading
+import unittest
+
+from render_farm import MessageReader, RenderCoordinator, RenderWorker, connect, send_message, submit_jobs
+
+def _job_specs(count):
+    return [{"config_path": "memories.ini", "date": "2024-10-18", "year_offset": offset} for offset in range(1, count + 1)]
+
+class FakeWorker(RenderWorker):
+    """A worker that reports every job as rendered without rendering anything."""
+
+    def render(self, job):
+        return {"status": "rendered", "seconds": 0.0, "output_paths": [f"{job['date']}_{job['year_offset']}.mp4"],
+                "error": None, "stages": {}}
+
+class RenderFarmTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coordinator = RenderCoordinator("127.0.0.1:0")
+        host, port = self.coordinator.listen()
+        self.address = f"{host}:{port}"
+        threading.Thread(target=self.coordinator.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.coordinator.close()
+
+    def _start_worker(self, name):
+        worker = FakeWorker(self.address, name)
+        connection = connect(self.address)
+        self.addCleanup(connection.close)
+        threading.Thread(target=self._serve, args=(worker, connection), daemon=True).start()
+
+    def _serve(self, worker, connection):
+        try:
+            worker._serve(connection)
+        except (OSError, ValueError):
+            pass
+
+    def test_jobs_are_handed_out_and_results_returned(self):
+        self._start_worker("one")
+        self._start_worker("two")
+        jobs = submit_jobs(self.address, _job_specs(4))
+        self.assertEqual([job["status"] for job in jobs], ["rendered"] * 4)
+        self.assertEqual([job["output_paths"] for job in jobs], [[f"2024-10-18_{offset}.mp4"] for offset in range(1, 5)])
+        for job in jobs:
+            self.assertIn(job["worker"], ("one", "two"))
+            self.assertEqual(job["attempts"], 1)
+            self.assertLessEqual(job["queued_at"], job["started_at"])
+            self.assertLessEqual(job["started_at"], job["finished_at"])
+
+    def test_job_of_a_dead_worker_is_queued_again(self):
+        # A worker that takes a job, starts it and disconnects
+        connection = connect(self.address)
+        reader = MessageReader(connection)
+        send_message(connection, {"type": "worker", "name": "dead"})
+        job_ids = submit_jobs(self.address, _job_specs(1), wait=False)
+        message = reader.read(timeout=10)
+        while message["type"] != "job":
+            message = reader.read(timeout=10)
+        self.assertEqual(message["job"]["id"], job_ids[0])
+        send_message(connection, {"type": "started", "job_id": job_ids[0]})
+        connection.shutdown(socket.SHUT_RDWR)
+        connection.close()
+
+        self._start_worker("alive")
+        job, = self.coordinator.wait(job_ids)
+        self.assertEqual(job["status"], "rendered")
+        self.assertEqual(job["worker"], "alive")
+        self.assertEqual(job["attempts"], 2)
+
+    def test_job_fails_after_max_attempts(self):
+        self.coordinator.max_attempts = 1
+        connection = connect(self.address)
+        reader = MessageReader(connection)
+        send_message(connection, {"type": "worker", "name": "dead"})
+        job_ids = submit_jobs(self.address, _job_specs(1), wait=False)
+        while reader.read(timeout=10)["type"] != "job":
+            pass
+        send_message(connection, {"type": "started", "job_id": job_ids[0]})
+        connection.close()
+
+        job, = self.coordinator.wait(job_ids)
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("worker lost", job["error"])
+
+    def test_invalid_job_is_rejected(self):
+        with self.assertRaises(ValueError):
+            submit_jobs(self.address, [{"config_path": "memories.ini", "date": "not a date", "year_offset": 1}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from render_manifest import build_manifest, is_up_to_date, manifest_path, write_manifest
+
+class RenderManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.photos = [self._write("photo_1.jpg", b"one"), self._write("photo_2.jpg", b"two")]
+        self.settings = {"video_codec": "libx264", "video_resolution": [1080, 1920]}
+        self.output_path = self._write("slideshow.mp4", b"video")
+        write_manifest(self.output_path, build_manifest(self.photos, 42, self.settings))
+
+    def _write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_same_inputs_are_up_to_date(self):
+        self.assertTrue(is_up_to_date(self.output_path, build_manifest(self.photos, 42, self.settings)))
+
+    def test_changed_inputs_are_stale(self):
+        self.assertFalse(is_up_to_date(self.output_path, build_manifest(self.photos, 43, self.settings)))
+        self.assertFalse(is_up_to_date(self.output_path, build_manifest(self.photos[:1], 42, self.settings)))
+        self.assertFalse(is_up_to_date(self.output_path, build_manifest(self.photos, 42, dict(self.settings, video_codec="libx265"))))
+
+        self._write("photo_2.jpg", b"edited")
+        self.assertFalse(is_up_to_date(self.output_path, build_manifest(self.photos, 42, self.settings)))
+
+    def test_replaced_or_missing_output_is_stale(self):
+        manifest = build_manifest(self.photos, 42, self.settings)
+        self._write("slideshow.mp4", b"truncated")
+        self.assertFalse(is_up_to_date(self.output_path, manifest))
+
+        write_manifest(self.output_path, manifest)
+        self.assertTrue(is_up_to_date(self.output_path, manifest))
+        os.remove(self.output_path)
+        self.assertFalse(is_up_to_date(self.output_path, manifest))
+
+    def test_missing_or_corrupt_manifest_is_stale(self):
+        manifest = build_manifest(self.photos, 42, self.settings)
+        with open(manifest_path(self.output_path), "w") as f:
+            f.write("{not json")
+        self.assertFalse(is_up_to_date(self.output_path, manifest))
+        os.remove(manifest_path(self.output_path))
+        self.assertFalse(is_up_to_date(self.output_path, manifest))
+
+    def test_missing_photo_raises(self):
+        os.remove(self.photos[0])
+        with self.assertRaises(OSError):
+            build_manifest(self.photos, 42, self.settings)
+
+if __name__ == "__main__":
+    unittest.main()